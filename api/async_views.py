@@ -0,0 +1,146 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .conditional import conditional_response, set_validators
+from .instrumentation import stage
+from .models import Period, PeriodShare, Purchase
+from .pagination import PurchasePagination
+from .responses import ERROR_MESSAGES
+from .serializers import PurchaseSerializer
+from .snapshots import snapshot_response
+from .utils import aget_period_detail, get_purchase_queryset
+
+
+def _render(data, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    """renders the data with the first of the configured renderers, the JSON one."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    with stage("render"):
+        content = renderer.render(data)
+    return HttpResponse(content, status=status_code, content_type=renderer.media_type)
+
+
+def _error(exc: exceptions.APIException, request: Request) -> HttpResponse:
+    response = _render({"detail": exc.detail}, exc.status_code)
+    if isinstance(exc, exceptions.NotAuthenticated):
+        authenticate_header = api_settings.DEFAULT_AUTHENTICATION_CLASSES[
+            0
+        ]().authenticate_header(request)
+        if authenticate_header:
+            response["WWW-Authenticate"] = authenticate_header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+    if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+        response["Retry-After"] = str(int(exc.wait))
+    return response
+
+
+async def _initial(request: Request, authenticated: bool) -> None:
+    """runs the configured authentication and throttle classes like :meth:`APIView.initial` does."""
+    user, auth = AnonymousUser(), None
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = await sync_to_async(authentication_class().authenticate)(request)
+        if result is not None:
+            user, auth = result
+            break
+    request.user, request.auth = user, auth
+    if authenticated and not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not await sync_to_async(throttle.allow_request)(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+def async_api_view(authenticated: bool = True):
+    """
+    Turns a coroutine function into an async read only API view. DRF views are synchronous, so the configured
+    authentication and throttles are run here and errors are answered the way DRF answers them.
+
+    Args:
+        authenticated (bool): Whether anonymous requests are refused.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(request)
+            try:
+                if request.method != "GET":
+                    raise exceptions.MethodNotAllowed(request.method)
+                await _initial(request, authenticated)
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return _error(exceptions.NotFound(), request)
+            except exceptions.APIException as exc:
+                return _error(exc, request)
+
+        return wrapper
+
+    return decorator
+
+
+async def _get_period(pk: str, owner) -> Period:
+    try:
+        return await Period.objects.aget(pk=pk, owner=owner)
+    except Period.DoesNotExist:
+        raise Http404
+
+
+@async_api_view()
+async def period_detail(request: Request, pk: str) -> HttpResponse:
+    """async version of :meth:`api.views.PeriodViewSet.retrieve`, only the owner can see the period."""
+    period = await _get_period(pk, request.user)
+    not_modified = conditional_response(request, period)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(_render(await aget_period_detail(period)), period)
+
+
+@async_api_view(authenticated=False)
+async def period_share_detail(request: Request, pk: str) -> HttpResponse:
+    """async version of :meth:`api.views.PeriodShareViewSetRetrieve.retrieve`."""
+    try:
+        instance = await PeriodShare.objects.select_related("period").aget(
+            sharing_id=pk
+        )
+        if instance.is_expired():
+            raise PeriodShare.DoesNotExist
+    except PeriodShare.DoesNotExist:
+        return _render(
+            {"detail": ERROR_MESSAGES["invalid_sharing_link"]},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    if instance.is_snapshot and instance.snapshot_at is not None:
+        return snapshot_response(request, instance)
+    not_modified = conditional_response(request, instance.period)
+    if not_modified is not None:
+        return not_modified
+    data = await aget_period_detail(instance.period)
+    return set_validators(_render(data), instance.period)
+
+
+@async_api_view()
+async def period_purchases(request: Request, pk: str) -> HttpResponse:
+    """async version of :meth:`api.views.RetrievePurchaseViewSet.retrieve`."""
+    period = await _get_period(pk, request.user)
+    not_modified = conditional_response(request, period)
+    if not_modified is not None:
+        return not_modified
+    paginator = PurchasePagination()
+    purchases = await paginator.apaginate_queryset(
+        get_purchase_queryset(Purchase.objects.filter(period=period)), request
+    )
+
+    def serialize():
+        with stage("serialize"):
+            return PurchaseSerializer(purchases, many=True).data
+
+    results = await sync_to_async(serialize)()
+    data = {"next": paginator.get_next_link(), "results": results}
+    return set_validators(_render(data), period)
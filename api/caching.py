@@ -0,0 +1,135 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from config.settings import PERIOD_DETAIL_CACHE_ALIAS
+
+from . import metrics
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[PERIOD_DETAIL_CACHE_ALIAS]
+
+
+def _version_key(period_id: str) -> str:
+    return f"period-detail:{period_id}:version"
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+    metrics.cache_lookup(name == "hits")
+
+
+def cache_stats() -> dict[str, int]:
+    """returns the hit and miss counters of the period detail cache in this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats() -> None:
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def get_period_version(period_id: str) -> int:
+    """
+    returns the current version of the period's cached detail. versions start from the current time rather than
+    1, so a version key that got evicted never comes back with a value an older payload was stored under.
+    """
+    cache = _cache()
+    key = _version_key(period_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_period_version(period_id: str) -> int:
+    """async version of :func:`get_period_version`."""
+    cache = _cache()
+    key = _version_key(period_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_period_version(period_id: str) -> None:
+    cache = _cache()
+    key = _version_key(period_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+async def abump_period_version(period_id: str) -> None:
+    """async version of :func:`bump_period_version`."""
+    cache = _cache()
+    key = _version_key(period_id)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, time.time_ns(), timeout=None)
+
+
+def invalidate_period(period_id: str) -> None:
+    """
+    drops the cached detail of the period once the current transaction commits, so no request can cache the
+    data of the transaction before it is visible to everyone.
+    """
+    transaction.on_commit(lambda: bump_period_version(period_id))
+
+
+def get_cached_period_detail(period, calculate) -> dict:
+    """
+    Returns the detail of the period from the cache, or calculates and caches it.
+
+    Args:
+        period (Period): The period to get the detail of.
+        calculate (Callable): Calculates the detail of the period on a cache miss.
+
+    Returns:
+        dict: The period detail.
+    """
+    cache = _cache()
+    key = f"period-detail:{period.pk}:{get_period_version(period.pk)}"
+    data = cache.get(key)
+    if data is not None:
+        _count("hits")
+        return data
+    _count("misses")
+    data = calculate(period)
+    cache.set(key, data)
+    return data
+
+
+async def aget_cached_period_detail(period, calculate) -> dict:
+    """
+    async version of :func:`get_cached_period_detail`.
+
+    Args:
+        period (Period): The period to get the detail of.
+        calculate (Callable): Coroutine function that calculates the detail of the period on a cache miss.
+
+    Returns:
+        dict: The period detail.
+    """
+    cache = _cache()
+    key = f"period-detail:{period.pk}:{await aget_period_version(period.pk)}"
+    data = await cache.aget(key)
+    if data is not None:
+        _count("hits")
+        return data
+    _count("misses")
+    data = await calculate(period)
+    await cache.aset(key, data)
+    return data
@@ -0,0 +1,122 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import caching
+from .models import Period, Purchase
+
+_local = threading.local()
+
+
+def touch_periods(period_ids) -> None:
+    """marks the given periods as modified, so clients holding their old ETag download them again."""
+    Period.objects.filter(pk__in=period_ids).update(modified_at=timezone.now())
+
+
+def touch_purchases(purchase_ids) -> None:
+    Purchase.objects.filter(pk__in=purchase_ids).update(modified_at=timezone.now())
+
+
+def purchases_changed(purchase_ids) -> None:
+    """marks the purchases and their periods as modified and drops the cached detail of the periods."""
+    touch_purchases(purchase_ids)
+    period_ids = set(
+        Purchase.objects.filter(pk__in=purchase_ids).values_list("period_id", flat=True)
+    )
+    touch_periods(period_ids)
+    for period_id in period_ids:
+        caching.invalidate_period(period_id)
+
+
+def touch_purchase(purchase_id: str) -> None:
+    """
+    calls :func:`purchases_changed` for a purchase whose memberships changed. inside a :func:`deferred_touch`
+    block the update is postponed to the end of the block, so a purchase saved with many memberships is only
+    updated once.
+    """
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        purchases_changed([purchase_id])
+    else:
+        pending.add(purchase_id)
+
+
+@contextmanager
+def deferred_touch():
+    """collects the purchases touched inside the block and updates them together when the block exits."""
+    if getattr(_local, "pending", None) is not None:
+        yield
+        return
+    _local.pending = set()
+    try:
+        yield
+        if _local.pending:
+            purchases_changed(_local.pending)
+    finally:
+        _local.pending = None
+
+
+def touch_person(person) -> None:
+    """marks every period and purchase that shows the given person as modified."""
+    touch_periods(
+        Period.objects.filter(
+            Q(persons=person)
+            | Q(purchase__buyer=person)
+            | Q(purchase__purchased_for_users__person=person)
+        ).values("pk")
+    )
+    touch_purchases(
+        Purchase.objects.filter(
+            Q(buyer=person) | Q(purchased_for_users__person=person)
+        ).values("pk")
+    )
+
+
+def get_validators(instance) -> tuple[str, int]:
+    """
+    Returns the validators of an object that tracks its modification time, and of its period for a purchase.
+
+    Args:
+        instance (Period | Purchase): The object the response is built from.
+
+    Returns:
+        tuple[str, int]: The quoted ETag and the last modified time as a timestamp.
+    """
+    modified_at = instance.modified_at
+    if isinstance(instance, Purchase):
+        # a purchase is rendered with its period, whose changes do not touch the purchase.
+        modified_at = max(modified_at, instance.period.modified_at)
+    etag = quote_etag(f"{instance.pk}-{int(modified_at.timestamp() * 1_000_000)}")
+    return etag, int(modified_at.timestamp())
+
+
+def set_validators(response, instance):
+    """sets the ETag and Last-Modified headers of the response and returns it."""
+    etag, last_modified = get_validators(instance)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def conditional_response(request, instance) -> HttpResponse | None:
+    """
+    Answers If-None-Match/If-Modified-Since (and If-Match/If-Unmodified-Since) requests for the given object
+    without building the response body.
+
+    Args:
+        request (Request): The incoming request.
+        instance (Period | Purchase): The object the response would be built from.
+
+    Returns:
+        HttpResponse | None: A 304 (or 412) response, or None if the full response has to be sent.
+    """
+    etag, last_modified = get_validators(instance)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, instance)
+    return response
@@ -0,0 +1,156 @@
+import csv
+import json
+from typing import Iterator
+
+from config.settings import EXPORT_CHUNK_SIZE
+
+from .models import Person, Purchase
+from .settlement import apportion, split_purchase
+
+EXPORT_FIELDS = (
+    "type",
+    "purchase_id",
+    "purchase_name",
+    "date_and_time",
+    "expense",
+    "buyer_id",
+    "person_id",
+    "person_name",
+    "coefficient",
+    "direct_cost",
+    "final_cost",
+    "balance",
+)
+
+
+class _PeriodPersons(dict):
+    """persons of the period by id, fetching the ones that are no longer members when a purchase refers to them."""
+
+    def __missing__(self, person_id):
+        person = self[person_id] = Person.objects.get(pk=person_id)
+        return person
+
+
+def export_records(period, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yields the purchases of a period, each followed by its memberships, and then the final balance of every person.
+    rows are read with a server side cursor in chunks and the balances are accumulated on the way, so memory use
+    does not grow with the number of purchases.
+
+    Args:
+        period (Period): The period to export.
+        chunk_size (int): Number of rows fetched from the database at once.
+
+    Returns:
+        Iterator[dict]: Records with a "type" of "purchase", "membership" or "balance" and the matching
+            :data:`EXPORT_FIELDS`.
+    """
+    persons = _PeriodPersons((person.pk, person) for person in period.persons.all())
+    totals: dict[str, list] = {}
+
+    def settle_purchase(buyer_id, expense, memberships):
+        buyer = persons[buyer_id]
+        members = [
+            (persons[person_id], coefficient) for person_id, coefficient in memberships
+        ]
+        buyer_share, shares = split_purchase(buyer, expense, members)
+        total = totals.setdefault(buyer_id, [0, 0, 0])
+        total[0] += expense
+        total[1] += buyer_share or 0
+        for person, share in shares:
+            totals.setdefault(person.pk, [0, 0, 0])[1] += share
+        if memberships:
+            total[2] += expense
+            # same order as api.settlement.person_balances uses.
+            memberships = sorted(memberships)
+            amounts = apportion(
+                expense, [coefficient for _, coefficient in memberships]
+            )
+            for (person_id, _), amount in zip(memberships, amounts):
+                totals.setdefault(person_id, [0, 0, 0])[2] -= amount
+
+    rows = (
+        Purchase.objects.filter(period=period)
+        .order_by("date_and_time", "id", "purchased_for_users__id")
+        .values_list(
+            "id",
+            "name",
+            "date_and_time",
+            "expense",
+            "buyer_id",
+            "purchased_for_users__person_id",
+            "purchased_for_users__coefficient",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    current = None
+    memberships: list[tuple[str, int]] = []
+    for (
+        purchase_id,
+        name,
+        date_and_time,
+        expense,
+        buyer_id,
+        person_id,
+        coefficient,
+    ) in rows:
+        if purchase_id != current:
+            if current is not None:
+                settle_purchase(*purchase, memberships)
+            current = purchase_id
+            purchase = (buyer_id, expense)
+            memberships = []
+            yield {
+                "type": "purchase",
+                "purchase_id": purchase_id,
+                "purchase_name": name,
+                "date_and_time": date_and_time.isoformat(),
+                "expense": expense,
+                "buyer_id": buyer_id,
+            }
+        if person_id is not None:
+            memberships.append((person_id, coefficient))
+            yield {
+                "type": "membership",
+                "purchase_id": purchase_id,
+                "person_id": person_id,
+                "person_name": persons[person_id].name,
+                "coefficient": coefficient,
+            }
+    if current is not None:
+        settle_purchase(*purchase, memberships)
+
+    for person_id, (direct_cost, final_cost, balance) in totals.items():
+        yield {
+            "type": "balance",
+            "person_id": person_id,
+            "person_name": persons[person_id].name,
+            "direct_cost": direct_cost,
+            "final_cost": final_cost,
+            "balance": balance,
+        }
+
+
+class _Echo:
+    """file like object that returns what is written to it, so csv.writer can produce lines one by one."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(records: Iterator[dict]) -> Iterator[str]:
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writerow(dict(zip(EXPORT_FIELDS, EXPORT_FIELDS)))
+    for record in records:
+        yield writer.writerow(record)
+
+
+def ndjson_lines(records: Iterator[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (csv_lines, "text/csv"),
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+}
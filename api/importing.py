@@ -0,0 +1,219 @@
+import csv
+import json
+from itertools import islice
+from typing import Callable, Iterator, TextIO
+
+from config.settings import BULK_PURCHASE_LIMIT, IMPORT_ERROR_LIMIT
+
+from .serializers import BulkPurchaseSerializer
+
+IMPORT_FIELDS = ("name", "date_and_time", "expense", "buyer", "purchased_for")
+
+
+class RowError(ValueError):
+    pass
+
+
+class MalformedFile(RowError):
+    """the file can not be read past this row, it is the last row of the stream."""
+
+
+def csv_rows(stream: TextIO) -> Iterator[dict]:
+    """reads purchases from a CSV file with an :data:`IMPORT_FIELDS` header, one purchase per line."""
+    try:
+        yield from csv.DictReader(stream)
+    except (csv.Error, UnicodeDecodeError) as error:
+        yield MalformedFile(f"malformed CSV: {error}")
+
+
+def ndjson_rows(stream: TextIO) -> Iterator[dict]:
+    """reads purchases from a JSON lines file, one purchase object per line. blank lines are skipped."""
+    try:
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield RowError(f"invalid JSON: {error}")
+                continue
+            if not isinstance(row, dict):
+                row = RowError("line is not a JSON object.")
+            yield row
+    except UnicodeDecodeError as error:
+        yield MalformedFile(f"malformed file: {error}")
+
+
+IMPORT_FORMATS = {"csv": csv_rows, "ndjson": ndjson_rows}
+
+
+def merge_export_records(rows: Iterator) -> Iterator:
+    """
+    turns the records of an export (see :func:`api.export.export_records`) back into import rows, a "purchase"
+    record and the "membership" records after it make one purchase and "balance" records are skipped. rows without
+    a type pass through as they are.
+    """
+    purchase = purchase_id = None
+    for row in rows:
+        kind = row.get("type") if isinstance(row, dict) else None
+        if kind == "membership" and purchase is not None:
+            if row.get("purchase_id") == purchase_id:
+                purchase["purchased_for"].append(
+                    {
+                        "person": row.get("person_id"),
+                        "coefficient": row.get("coefficient") or 1,
+                    }
+                )
+                continue
+        if purchase is not None:
+            yield purchase
+            purchase = None
+        if kind == "purchase":
+            purchase_id = row.get("purchase_id")
+            purchase = {
+                "name": row.get("purchase_name"),
+                "date_and_time": row.get("date_and_time"),
+                "expense": row.get("expense"),
+                "buyer": row.get("buyer_id"),
+                "purchased_for": [],
+            }
+        elif kind == "membership":
+            yield RowError("membership record without its purchase record.")
+        elif kind in (None, ""):
+            yield row
+        elif kind != "balance":
+            yield RowError(f"unknown record type {kind}.")
+    if purchase is not None:
+        yield purchase
+
+
+def parse_members(value) -> list[dict]:
+    """
+    Parses the persons a purchase is made for.
+
+    Args:
+        value (str | list): "name:coefficient" pairs separated by ";" (the coefficient defaults to 1), or a list of
+            {"person": name, "coefficient": coefficient} objects.
+
+    Returns:
+        list[dict]: {"person": name, "coefficient": coefficient} of each person.
+    """
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        raise RowError("purchased_for is required.")
+    members = []
+    for member in value.split(";"):
+        person, _, coefficient = member.strip().partition(":")
+        try:
+            members.append(
+                {"person": person.strip(), "coefficient": int(coefficient or 1)}
+            )
+        except ValueError:
+            raise RowError(f"invalid coefficient for {person.strip()}.")
+    return members
+
+
+class PurchaseImporter:
+    """
+    Imports purchases into a period from a stream of rows, a batch at a time. persons are referred to by name or id
+    and resolved with a single map of the period members. an export of a period is imported back as well, its
+    persons are referred to by id and its rows are counted by purchase. every batch is validated and inserted through
+    :class:`api.serializers.BulkPurchaseSerializer`, so the rules are the same as for the bulk endpoint and each
+    batch is committed on its own. only the current batch is kept in memory.
+    """
+
+    def __init__(
+        self,
+        period,
+        batch_size: int = BULK_PURCHASE_LIMIT,
+        progress: Callable[["PurchaseImporter"], None] | None = None,
+    ):
+        self.period = period
+        self.batch_size = min(batch_size, BULK_PURCHASE_LIMIT)
+        self.progress = progress
+        self.members: dict[str, str] = {}
+        for person in period.persons.all():
+            self.members[person.pk] = person.pk
+            self.members.setdefault(person.name, person.pk)
+        self.rows = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors: list[dict] = []
+        self.malformed = False
+
+    def add_error(self, row: int, errors) -> None:
+        self.error_count += 1
+        if len(self.errors) < IMPORT_ERROR_LIMIT:
+            self.errors.append({"row": row, "errors": errors})
+
+    def resolve(self, person):
+        return self.members.get(person, person) if isinstance(person, str) else person
+
+    def to_item(self, row: dict) -> dict:
+        members = parse_members(row.get("purchased_for"))
+        item = {
+            "name": row.get("name"),
+            "expense": row.get("expense"),
+            "buyer": self.resolve(row.get("buyer")),
+            "purchased_for_users": [
+                {
+                    "person": self.resolve(member.get("person")),
+                    "coefficient": member.get("coefficient", 1),
+                }
+                for member in members
+                if isinstance(member, dict)
+            ],
+        }
+        if row.get("date_and_time"):
+            item["date_and_time"] = row["date_and_time"]
+        return item
+
+    def import_batch(self, batch: list[tuple[int, dict]]) -> None:
+        if not batch:
+            return
+        serializer = BulkPurchaseSerializer(
+            data={"purchases": [item for _, item in batch], "partial": True},
+            context={"period": self.period},
+        )
+        serializer.is_valid(raise_exception=True)
+        for error in serializer.validated_data["errors"]:
+            self.add_error(batch[error["index"]][0], error["errors"])
+        self.created += len(serializer.save())
+
+    def run(self, rows: Iterator) -> dict:
+        """
+        Imports the rows and returns the summary. a malformed file stops the import at the row it can not be read
+        past, the rows before it are still imported and :attr:`malformed` is set.
+
+        Args:
+            rows (Iterator): Rows as produced by one of :data:`IMPORT_FORMATS`.
+
+        Returns:
+            dict: the number of rows read, purchases created and invalid rows, and the first invalid rows.
+        """
+        rows = merge_export_records(rows)
+        while chunk := list(islice(rows, self.batch_size)):
+            batch = []
+            for row in chunk:
+                self.rows += 1
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    batch.append((self.rows, self.to_item(row)))
+                except RowError as error:
+                    if isinstance(error, MalformedFile):
+                        self.malformed = True
+                    self.add_error(self.rows, str(error))
+            self.import_batch(batch)
+            if self.progress is not None:
+                self.progress(self)
+        return self.summary()
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
@@ -0,0 +1,209 @@
+import cProfile
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from config.settings import (
+    REQUEST_PROFILE_DIR,
+    REQUEST_PROFILE_SAMPLE_RATE,
+    REQUEST_PROFILE_THRESHOLD_MS,
+    SERVER_TIMING,
+)
+
+logger = logging.getLogger(__name__)
+
+_timings: ContextVar["RequestTimings | None"] = ContextVar("timings", default=None)
+
+
+class RequestTimings:
+    """
+    the time a request spends in the database and in each instrumented stage. the time a stage spends in the
+    database is only counted as database time, so the stages, the database and the rest add up to the total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.stages: dict[str, float] = {}
+
+    def execute(self, execute, sql, params, many, context):
+        """database execute wrapper, see :meth:`django.db.backends.base.base.BaseDatabaseWrapper.execute_wrapper`."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def fields(self) -> dict[str, float | int]:
+        """the timings in milliseconds, "compute" is the time spent outside the database and the stages."""
+        total = time.perf_counter() - self.started
+        fields: dict[str, float | int] = {
+            "total": total,
+            "db": self.db,
+            **self.stages,
+            "compute": max(total - self.db - sum(self.stages.values()), 0.0),
+        }
+        fields = {name: round(seconds * 1000, 3) for name, seconds in fields.items()}
+        fields["queries"] = self.queries
+        return fields
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    # installed on every connection. the timings are looked up per query, since
+    # the async ORM runs the queries of all requests on one shared thread.
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.execute(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_execute_wrapper(sender, connection, **kwargs) -> None:
+    # first in the list, so it stays when connection.execute_wrapper() blocks pop
+    # their wrapper after opening the connection.
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute_wrapper)
+
+
+def current_timings() -> RequestTimings | None:
+    """the timings of the request being handled, None outside :class:`ServerTimingMiddleware`."""
+    return _timings.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    records the time spent inside the block, minus its database time, as the given stage of the current request.
+    does nothing outside a request handled by :class:`ServerTimingMiddleware`.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started, db = time.perf_counter(), timings.db
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started - (timings.db - db))
+
+
+def server_timing(fields: dict[str, float | int]) -> str:
+    """formats the timings as a ``Server-Timing`` header value."""
+    metrics = [
+        f'db;dur={fields["db"]};desc="{fields["queries"]} queries"',
+        *(
+            f"{name};dur={value}"
+            for name, value in fields.items()
+            if name not in ("db", "queries")
+        ),
+    ]
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Measures the query count, database time, instrumented stages (see :func:`stage`), rendering time and total
+    time of every request. they are sent in the ``Server-Timing`` header when ``SERVER_TIMING`` is on and logged
+    as the extra fields of an "api.instrumentation" log record.
+
+    with ``REQUEST_PROFILE_SAMPLE_RATE`` above 0 that share of the requests runs under cProfile, and the profile of
+    the ones slower than ``REQUEST_PROFILE_THRESHOLD_MS`` is written to ``REQUEST_PROFILE_DIR``. cProfile only sees
+    the thread it runs on, so async requests are not profiled.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        profiler = None
+        if random.random() < REQUEST_PROFILE_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                with profiler:
+                    response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        fields = timings.fields()
+        if profiler is not None and fields["total"] >= REQUEST_PROFILE_THRESHOLD_MS:
+            self.dump_profile(profiler, request, fields["total"])
+        return self.finish(request, response, fields)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings.fields())
+
+    def finish(self, request, response, fields: dict):
+        if SERVER_TIMING:
+            response["Server-Timing"] = server_timing(fields)
+        logger.info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                **fields,
+            },
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns.
+        started = time.perf_counter()
+        timings = _timings.get()
+
+        def rendered(response):
+            if timings is not None:
+                timings.add("render", time.perf_counter() - started)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def dump_profile(self, profiler: cProfile.Profile, request, total: float) -> None:
+        directory = Path(REQUEST_PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = request.path.strip("/").replace("/", "_") or "root"
+        path = directory / f"{time.time_ns()}-{request.method}-{name}.prof"
+        profiler.dump_stats(path)
+        logger.warning(
+            "%s %s took %s ms, profile written to %s",
+            request.method,
+            request.path,
+            total,
+            path,
+            extra={"profile": str(path)},
+        )
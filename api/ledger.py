@@ -0,0 +1,337 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import (
+    Period,
+    PeriodBalance,
+    PeriodDebt,
+    Purchase,
+    PurchaseLedgerEntry,
+    PurchaseMembership,
+)
+from .settlement import net_balances, new_balance, split_purchase
+
+_local = threading.local()
+
+
+def _pending() -> dict | None:
+    return getattr(_local, "pending", None)
+
+
+def _deleting(name: str) -> set:
+    """ids of the objects of the current thread that are in the middle of a cascade delete."""
+    if not hasattr(_local, name):
+        setattr(_local, name, set())
+    return getattr(_local, name)
+
+
+def purchase_entries(purchase: Purchase, memberships: list[tuple[object, int]]) -> list:
+    """
+    Generates the ledger entries a purchase adds to its period.
+
+    Args:
+        purchase (Purchase): The purchase to generate the entries for.
+        memberships (list[tuple[Person, int]]): (person, coefficient) of the persons the purchase is made for.
+
+    Returns:
+        list: Unsaved :model:`api.PurchaseLedgerEntry` objects, the other members first and the buyer last.
+    """
+    buyer_share, shares = split_purchase(purchase.buyer, purchase.expense, memberships)
+    entries = [
+        PurchaseLedgerEntry(
+            purchase_id=purchase.pk,
+            period_id=purchase.period_id,
+            person_id=person.pk,
+            creditor_id=purchase.buyer_id,
+            final_cost=share,
+        )
+        for person, share in shares
+    ]
+    entries.append(
+        PurchaseLedgerEntry(
+            purchase_id=purchase.pk,
+            period_id=purchase.period_id,
+            person_id=purchase.buyer_id,
+            direct_cost=purchase.expense,
+            final_cost=buyer_share or 0,
+        )
+    )
+    return entries
+
+
+def _apply(entries: list, sign: int, balance_deltas: dict, debt_deltas: dict) -> None:
+    for entry in entries:
+        delta = balance_deltas.setdefault((entry.period_id, entry.person_id), [0, 0, 0])
+        delta[0] += sign * entry.direct_cost
+        delta[1] += sign * entry.final_cost
+        delta[2] += sign
+        if entry.creditor_id is not None:
+            delta = debt_deltas.setdefault(
+                (entry.period_id, entry.person_id, entry.creditor_id), [0, 0]
+            )
+            delta[0] += sign * entry.final_cost
+            delta[1] += sign
+
+
+def _write_deltas(balance_deltas: dict, debt_deltas: dict) -> None:
+    """applies the collected deltas to the balance and debt rows, creating and removing rows as needed."""
+    period_ids = {period_id for period_id, _ in balance_deltas}
+    balances = {
+        (balance.period_id, balance.person_id): balance
+        for balance in PeriodBalance.objects.select_for_update().filter(
+            period_id__in=period_ids,
+            person_id__in={person_id for _, person_id in balance_deltas},
+        )
+    }
+    debts = {
+        (debt.period_id, debt.debtor_id, debt.creditor_id): debt
+        for debt in PeriodDebt.objects.select_for_update().filter(
+            period_id__in=period_ids,
+            debtor_id__in={debtor_id for _, debtor_id, _ in debt_deltas},
+            creditor_id__in={creditor_id for _, _, creditor_id in debt_deltas},
+        )
+    }
+    created, updated, removed = [], [], []
+    for (period_id, person_id), (
+        direct_cost,
+        final_cost,
+        count,
+    ) in balance_deltas.items():
+        balance = balances.get((period_id, person_id))
+        if balance is None:
+            if count <= 0:
+                continue
+            balance = PeriodBalance(period_id=period_id, person_id=person_id)
+            created.append(balance)
+        elif balance.entry_count + count <= 0:
+            removed.append(balance.pk)
+            continue
+        else:
+            updated.append(balance)
+        balance.direct_cost += direct_cost
+        balance.final_cost += final_cost
+        balance.entry_count += count
+    PeriodBalance.objects.bulk_create(created)
+    PeriodBalance.objects.bulk_update(
+        updated, ["direct_cost", "final_cost", "entry_count"]
+    )
+    PeriodBalance.objects.filter(pk__in=removed).delete()
+
+    created, updated, removed = [], [], []
+    for (period_id, debtor_id, creditor_id), (amount, count) in debt_deltas.items():
+        debt = debts.get((period_id, debtor_id, creditor_id))
+        if debt is None:
+            if count <= 0:
+                continue
+            debt = PeriodDebt(
+                period_id=period_id, debtor_id=debtor_id, creditor_id=creditor_id
+            )
+            created.append(debt)
+        elif debt.entry_count + count <= 0:
+            removed.append(debt.pk)
+            continue
+        else:
+            updated.append(debt)
+        debt.amount += amount
+        debt.entry_count += count
+    PeriodDebt.objects.bulk_create(created)
+    PeriodDebt.objects.bulk_update(updated, ["amount", "entry_count"])
+    PeriodDebt.objects.filter(pk__in=removed).delete()
+
+
+def sync_purchases(purchase_ids: list[str]) -> None:
+    """
+    Replaces what the given purchases previously added to the ledger with their current contribution. purchases
+    that no longer exist are only reverted.
+
+    Args:
+        purchase_ids (list[str]): Ids of the purchases to sync.
+    """
+    with transaction.atomic():
+        old_entries = list(
+            PurchaseLedgerEntry.objects.filter(purchase_id__in=purchase_ids).order_by(
+                "id"
+            )
+        )
+        new_entries = []
+        for purchase in (
+            Purchase.objects.filter(pk__in=purchase_ids)
+            .select_related("buyer")
+            .prefetch_related(
+                Prefetch(
+                    "purchased_for_users",
+                    queryset=PurchaseMembership.objects.select_related("person"),
+                )
+            )
+        ):
+            memberships = [
+                (membership.person, membership.coefficient)
+                for membership in purchase.purchased_for_users.all()
+            ]
+            new_entries += purchase_entries(purchase, memberships)
+        balance_deltas: dict = {}
+        debt_deltas: dict = {}
+        _apply(old_entries, -1, balance_deltas, debt_deltas)
+        _apply(new_entries, 1, balance_deltas, debt_deltas)
+        PurchaseLedgerEntry.objects.filter(
+            pk__in=[entry.pk for entry in old_entries]
+        ).delete()
+        PurchaseLedgerEntry.objects.bulk_create(new_entries)
+        _write_deltas(balance_deltas, debt_deltas)
+
+
+def purchase_changed(purchase_id: str) -> None:
+    """
+    syncs the ledger of a created, updated or deleted purchase. inside a :func:`deferred_sync` block the sync is
+    postponed to the end of the block, so a purchase that changes several times is synced once.
+    """
+    if purchase_id in _deleting("purchases"):
+        return
+    pending = _pending()
+    if pending is None:
+        sync_purchases([purchase_id])
+    else:
+        pending[purchase_id] = None
+
+
+@contextmanager
+def deferred_sync():
+    """
+    collects the purchases changed inside the block and syncs each of them once when the block exits.
+    use it inside ``transaction.atomic()`` so the ledger is written in the same transaction as the purchases.
+    """
+    if _pending() is not None:
+        yield
+        return
+    _local.pending = {}
+    try:
+        yield
+        if _local.pending:
+            sync_purchases(list(_local.pending))
+    finally:
+        _local.pending = None
+
+
+def purchase_deleting(purchase: Purchase) -> None:
+    """memberships deleted in cascade with the purchase should not sync the purchase one by one."""
+    _deleting("purchases").add(purchase.pk)
+
+
+def is_purchase_deleting(purchase_id: str) -> bool:
+    return purchase_id in _deleting("purchases")
+
+
+def purchase_deleted(purchase: Purchase) -> None:
+    _deleting("purchases").discard(purchase.pk)
+    if purchase.period_id not in _deleting("periods"):
+        purchase_changed(purchase.pk)
+
+
+def period_deleting(period: Period) -> None:
+    """the ledger rows of a deleted period are deleted in cascade, there is nothing to revert."""
+    _deleting("periods").add(period.pk)
+
+
+def period_deleted(period: Period) -> None:
+    _deleting("periods").discard(period.pk)
+
+
+def person_deleting(person, period_ids: list[str]) -> None:
+    """
+    the ledger entries of a person are deleted in cascade before the purchases they belong to get the chance to
+    revert them, so the periods the person took part in are rebuilt once the person is gone.
+    """
+    if not hasattr(_local, "person_periods"):
+        _local.person_periods = {}
+    _local.person_periods[person.pk] = period_ids
+
+
+def person_deleted(person) -> None:
+    period_ids = getattr(_local, "person_periods", {}).pop(person.pk, [])
+    for period in Period.objects.filter(pk__in=period_ids):
+        rebuild_period(period)
+
+
+def period_ledger_detail(period: Period) -> list[dict]:
+    """
+    Reads the period detail from the ledger, in the same format as :func:`api.settlement.settle` returns.
+
+    Args:
+        period (Period): The period to read the detail of.
+
+    Returns:
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+    """
+    balances: dict[str, dict] = {}
+    for row in period.balances.select_related("person").order_by("id"):
+        balance = balances[row.person_id] = new_balance(row.person)
+        balance["direct_cost"] = row.direct_cost
+        balance["final_cost"] = row.final_cost
+    for debtor_id, creditor_id, amount in period.debts.order_by("id").values_list(
+        "debtor_id", "creditor_id", "amount"
+    ):
+        balances[debtor_id]["owe_to"][creditor_id] = amount
+        balances[creditor_id]["creditor_of"][debtor_id] = amount
+    return net_balances(balances)
+
+
+def rebuild_period(period: Period) -> None:
+    """
+    Drops the ledger of a period and records all of its purchases again.
+
+    Args:
+        period (Period): The period to rebuild the ledger of.
+    """
+    from .utils import get_period_purchases
+
+    with transaction.atomic():
+        period.ledger_entries.all().delete()
+        period.debts.all().delete()
+        period.balances.all().delete()
+        entries = []
+        for purchase in get_period_purchases(period):
+            memberships = [
+                (membership.person, membership.coefficient)
+                for membership in purchase.purchased_for_users.all()
+            ]
+            entries += purchase_entries(purchase, memberships)
+        balance_deltas: dict = {}
+        debt_deltas: dict = {}
+        _apply(entries, 1, balance_deltas, debt_deltas)
+        PurchaseLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+        PeriodBalance.objects.bulk_create(
+            [
+                PeriodBalance(
+                    period_id=period_id,
+                    person_id=person_id,
+                    direct_cost=direct_cost,
+                    final_cost=final_cost,
+                    entry_count=count,
+                )
+                for (period_id, person_id), (
+                    direct_cost,
+                    final_cost,
+                    count,
+                ) in balance_deltas.items()
+            ],
+            batch_size=1000,
+        )
+        PeriodDebt.objects.bulk_create(
+            [
+                PeriodDebt(
+                    period_id=period_id,
+                    debtor_id=debtor_id,
+                    creditor_id=creditor_id,
+                    amount=amount,
+                    entry_count=count,
+                )
+                for (period_id, debtor_id, creditor_id), (
+                    amount,
+                    count,
+                ) in debt_deltas.items()
+            ],
+            batch_size=1000,
+        )
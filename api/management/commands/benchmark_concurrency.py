@@ -0,0 +1,133 @@
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from api.caching import (
+    abump_period_version,
+    bump_period_version,
+    cache_stats,
+    reset_cache_stats,
+)
+from api.models import PeriodShare
+from api.synthetic import create_period
+
+
+def _address(index: int) -> str:
+    # every request comes from another viewer, so the anon throttle does not kick in.
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+class Command(BaseCommand):
+    help = (
+        "compare how many concurrent share link viewers the sync view served by a thread pool (the WSGI model) "
+        "and the async view served by a single event loop (the ASGI model) handle. the requests run in process "
+        "against a generated period, which is deleted at the end. cold runs drop the cached period detail before "
+        "every request, warm runs are served from the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purchases", type=int, default=1000)
+        parser.add_argument("--persons", type=int, default=40)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--concurrency",
+            default="1,10,50",
+            help="comma separated numbers of requests in flight at once.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def run_sync(
+        self, path: str, requests: int, concurrency: int, period_id: str | None
+    ) -> list:
+        def request(index: int):
+            if period_id is not None:
+                bump_period_version(period_id)
+            started = time.perf_counter()
+            response = Client(REMOTE_ADDR=_address(index)).get(path)
+            return time.perf_counter() - started, response.status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(request, range(requests)))
+
+    async def run_async(
+        self, path: str, requests: int, concurrency: int, period_id: str | None
+    ) -> list:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(index: int):
+            async with semaphore:
+                if period_id is not None:
+                    await abump_period_version(period_id)
+                started = time.perf_counter()
+                client = AsyncClient(client=[_address(index), 0])
+                response = await client.get(path)
+                return time.perf_counter() - started, response.status_code
+
+        return await asyncio.gather(*(request(index) for index in range(requests)))
+
+    def report(
+        self, mode: str, cache: str, concurrency: int, elapsed: float, results: list
+    ):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(status_code != 200 for _, status_code in results)
+        percentile = statistics.quantiles(latencies, n=100)
+        stats = cache_stats()
+        self.stdout.write(
+            f"{mode:<5} {cache:<4} concurrency={concurrency:<4} "
+            f"requests/s={len(results) / elapsed:8.1f} "
+            f"p50={percentile[49] * 1000:7.1f} ms p95={percentile[94] * 1000:7.1f} ms "
+            f"p99={percentile[98] * 1000:7.1f} ms errors={errors} "
+            f"cache hits={stats['hits']} misses={stats['misses']}"
+        )
+
+    def handle(self, *args, **options):
+        owner = get_user_model().objects.create(
+            username="concurrency-benchmark", email="concurrency-benchmark@example.com"
+        )
+        try:
+            period = create_period(
+                random.Random(options["seed"]),
+                owner,
+                "concurrency benchmark",
+                persons=options["persons"],
+                purchases=options["purchases"],
+            )
+            share = PeriodShare.objects.create(
+                period=period, expires_at=timezone.now() + timedelta(hours=1)
+            )
+            requests = options["requests"]
+            for concurrency in options["concurrency"].split(","):
+                concurrency = int(concurrency)
+                for cache, period_id in (("cold", period.pk), ("warm", None)):
+                    reset_cache_stats()
+                    started = time.perf_counter()
+                    results = self.run_sync(
+                        f"/v1/api/share/{share.sharing_id}/",
+                        requests,
+                        concurrency,
+                        period_id,
+                    )
+                    elapsed = time.perf_counter() - started
+                    self.report("sync", cache, concurrency, elapsed, results)
+                    reset_cache_stats()
+                    started = time.perf_counter()
+                    results = asyncio.run(
+                        self.run_async(
+                            f"/v1/api/async/share/{share.sharing_id}/",
+                            requests,
+                            concurrency,
+                            period_id,
+                        )
+                    )
+                    elapsed = time.perf_counter() - started
+                    self.report("async", cache, concurrency, elapsed, results)
+        finally:
+            owner.delete()
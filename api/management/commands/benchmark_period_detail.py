@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.synthetic import create_period
+from api.utils import calculate_period_detail, serialize_period_detail
+
+
+class Command(BaseCommand):
+    help = (
+        "compare the flat read path of the period detail with the nested serializers on generated periods. "
+        "the data is created in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000",
+            help="comma separated purchase counts to run the benchmark with.",
+        )
+        parser.add_argument("--persons", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="runs per size, the best one is reported.",
+        )
+
+    def measure(self, calculate, period, repeat: int) -> tuple[float, bytes]:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rendered = JSONRenderer().render(calculate(period))
+            best = min(best, time.perf_counter() - started)
+        return best, rendered
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        with transaction.atomic():
+            owner = get_user_model().objects.create(
+                username="period-detail-benchmark",
+                email="period-detail-benchmark@example.com",
+            )
+            for size in [int(size) for size in options["sizes"].split(",")]:
+                # uniform buyers and coefficients from 1 to 4, like the earlier runs of this benchmark.
+                period = create_period(
+                    rnd,
+                    owner,
+                    f"benchmark {size}",
+                    persons=options["persons"],
+                    purchases=size,
+                    max_coefficient=4,
+                    skew=0,
+                )
+                serializers_time, expected = self.measure(
+                    serialize_period_detail, period, options["repeat"]
+                )
+                flat_time, rendered = self.measure(
+                    calculate_period_detail, period, options["repeat"]
+                )
+                if rendered != expected:
+                    raise CommandError(
+                        f"{size} purchases: the flat read path does not match the serializers."
+                    )
+                self.stdout.write(
+                    f"{size:>8} purchases  serializers {serializers_time * 1000:9.1f} ms  "
+                    f"flat {flat_time * 1000:9.1f} ms  speedup {serializers_time / flat_time:5.1f}x  "
+                    f"identical=True ({len(rendered)} bytes)"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,94 @@
+import io
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+
+
+def _person(index: int) -> dict:
+    return {
+        "id": f"person-{index}",
+        "name": f"person {index}",
+        "user": None,
+        "owner": "owner",
+    }
+
+
+class Command(BaseCommand):
+    help = "compare the orjson renderer and parser with DRF's JSON classes on period detail shaped payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000",
+            help="comma separated purchase counts of the generated payloads.",
+        )
+        parser.add_argument("--persons", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def payload(self, rnd: random.Random, size: int, person_count: int) -> dict:
+        persons = [_person(index) for index in range(person_count)]
+        started = timezone.now()
+        return {
+            "period": {
+                "id": "period",
+                "name": "period",
+                "start_date": started,
+                "owner": "owner",
+                "persons": persons,
+            },
+            "all_purchases": [
+                {
+                    "id": f"purchase-{index}",
+                    "buyer": rnd.choice(persons),
+                    "name": f"purchase {index}",
+                    "expense": rnd.randint(1, 1_000_000),
+                    "date_and_time": started + timedelta(minutes=index),
+                    "purchased_for_users": [
+                        {"coefficient": rnd.randint(1, 4), "person": person}
+                        for person in rnd.sample(persons, rnd.randint(1, 8))
+                    ],
+                }
+                for index in range(size)
+            ],
+        }
+
+    def best(self, function, repeat: int) -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            data = self.payload(rnd, size, options["persons"])
+            rendered = JSONRenderer().render(data)
+            identical = ORJSONRenderer().render(data) == rendered
+            render = self.best(lambda: JSONRenderer().render(data), options["repeat"])
+            orjson_render = self.best(
+                lambda: ORJSONRenderer().render(data), options["repeat"]
+            )
+            parse = self.best(
+                lambda: JSONParser().parse(io.BytesIO(rendered)), options["repeat"]
+            )
+            orjson_parse = self.best(
+                lambda: ORJSONParser().parse(io.BytesIO(rendered)), options["repeat"]
+            )
+            self.stdout.write(
+                f"{size:>8} purchases ({len(rendered)} bytes)  "
+                f"render {render * 1000:8.1f} ms -> {orjson_render * 1000:7.1f} ms "
+                f"({render / orjson_render:4.1f}x)  "
+                f"parse {parse * 1000:8.1f} ms -> {orjson_parse * 1000:7.1f} ms "
+                f"({parse / orjson_parse:4.1f}x)  identical={identical}"
+            )
@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import Person
+from api.settlement import settle
+from api.vectorized import settle_rows
+
+
+class Command(BaseCommand):
+    help = "measure how the settlement backends scale with the number of purchases in a period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="comma separated purchase counts to run the benchmark with.",
+        )
+        parser.add_argument("--persons", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--backend",
+            choices=["python", "numpy", "both"],
+            default="python",
+            help='"both" runs the Python and the numpy backend on the same data and compares the results.',
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        persons = [
+            Person(id=f"person-{index}", name=f"person {index}")
+            for index in range(options["persons"])
+        ]
+        persons_by_id = {person.pk: person for person in persons}
+        backends = (
+            ["python", "numpy"]
+            if options["backend"] == "both"
+            else [options["backend"]]
+        )
+        previous: dict[str, float] = {}
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            purchases = [
+                (
+                    rnd.choice(persons),
+                    rnd.randint(1, 10_000_000),
+                    [
+                        (person, rnd.randint(1, 5))
+                        for person in rnd.sample(persons, rnd.randint(1, len(persons)))
+                    ],
+                )
+                for _ in range(size)
+            ]
+            rows = [
+                (f"purchase-{index}", buyer.pk, expense, person.pk, coefficient)
+                for index, (buyer, expense, memberships) in enumerate(purchases)
+                for person, coefficient in memberships
+            ]
+            results = {}
+            for backend in backends:
+                started = time.perf_counter()
+                if backend == "numpy":
+                    results[backend] = settle_rows(rows, persons_by_id)
+                else:
+                    results[backend] = settle(purchases)
+                elapsed = time.perf_counter() - started
+                growth = (
+                    f"{elapsed / previous[backend]:.1f}x"
+                    if backend in previous
+                    else "-"
+                )
+                previous[backend] = elapsed
+                self.stdout.write(
+                    f"backend={backend} purchases={size} persons={len(persons)} "
+                    f"seconds={elapsed:.4f} per_purchase_us={elapsed / size * 1e6:.2f} "
+                    f"growth={growth}"
+                )
+            if len(results) == 2:
+                identical = results["python"] == results["numpy"]
+                self.stdout.write(
+                    f"purchases={size} speedup={previous['python'] / previous['numpy']:.1f}x "
+                    f"identical={identical}"
+                )
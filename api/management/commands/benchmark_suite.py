@@ -0,0 +1,225 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.ledger import period_ledger_detail
+from api.models import Period, Purchase, PurchaseMembership
+from api.serializers import PurchaseSerializer
+from api.synthetic import create_period
+from api.utils import (
+    calculate_period_detail,
+    calculate_period_settlement,
+    get_period_purchases,
+    get_purchase_queryset,
+    purchase_detail_calculator,
+    serialize_period_detail,
+    settle_purchases,
+)
+from api.vectorized import np, settle_period
+from config.settings import BASE_DIR
+
+
+def _purchase_details(period, sample: int) -> None:
+    for purchase in Purchase.objects.filter(period=period).order_by(
+        "date_and_time", "id"
+    )[:sample]:
+        purchase_detail_calculator(purchase)
+
+
+def _purchase_list(period, sample: int) -> bytes:
+    # the whole period, serialized the way a page of RetrievePurchaseViewSet is.
+    purchases = get_purchase_queryset(Purchase.objects.filter(period=period))
+    return JSONRenderer().render(
+        PurchaseSerializer(purchases.order_by("date_and_time", "id"), many=True).data
+    )
+
+
+STAGES = {
+    "purchase_detail": _purchase_details,
+    "settle_python": lambda period, sample: settle_purchases(
+        get_period_purchases(period)
+    ),
+    "settle_numpy": lambda period, sample: settle_period(period),
+    "settle_ledger": lambda period, sample: period_ledger_detail(period),
+    "settlement_transfers": lambda period, sample: calculate_period_settlement(period),
+    "period_detail_serializers": lambda period, sample: JSONRenderer().render(
+        serialize_period_detail(period)
+    ),
+    "period_detail_flat": lambda period, sample: JSONRenderer().render(
+        calculate_period_detail(period)
+    ),
+    "purchase_list": _purchase_list,
+}
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "measure wall time, query count and peak memory of each settlement and serialization stage on synthetic "
+        "periods and print the results as JSON. the data is created in a transaction that is rolled back at the end, "
+        "unless --period is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000,10000",
+            help="comma separated purchase counts of the generated periods.",
+        )
+        parser.add_argument("--persons", type=int, default=40)
+        parser.add_argument("--max-members", type=int, default=8)
+        parser.add_argument("--max-coefficient", type=int, default=5)
+        parser.add_argument("--skew", type=float, default=1.2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--period",
+            action="append",
+            default=[],
+            help="id of an existing period to measure instead of generated ones, can be repeated.",
+        )
+        parser.add_argument(
+            "--stages",
+            default=",".join(STAGES),
+            help="comma separated stages to run.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="timed runs per stage, the minimum and the median are reported.",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=100,
+            help="purchases the purchase_detail stage calculates one by one.",
+        )
+        parser.add_argument(
+            "--output", help="file to write the JSON to instead of the standard output."
+        )
+
+    def measure(self, stage, period_id: str, sample: int, repeat: int) -> dict:
+        # a fresh period per run, so no run reuses the relations another one loaded.
+        def run():
+            stage(Period.objects.get(pk=period_id), sample)
+
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return {
+            "seconds_min": min(timings),
+            "seconds_median": statistics.median(timings),
+            "queries": len(queries),
+            "peak_memory_bytes": peak,
+        }
+
+    def describe(self, period: Period) -> dict:
+        return {
+            "period": period.pk,
+            "persons": period.persons.count(),
+            "purchases": Purchase.objects.filter(period=period).count(),
+            "memberships": PurchaseMembership.objects.filter(
+                purchase__period=period
+            ).count(),
+        }
+
+    def handle(self, *args, **options):
+        stages = options["stages"].split(",")
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"unknown stages: {', '.join(sorted(unknown))}")
+        if np is None and "settle_numpy" in stages:
+            stages.remove("settle_numpy")
+        results = []
+        with transaction.atomic():
+            if options["period"]:
+                periods = list(Period.objects.filter(pk__in=options["period"]))
+            else:
+                rnd = random.Random(options["seed"])
+                owner = get_user_model().objects.create(
+                    username="benchmark-suite", email="benchmark-suite@example.com"
+                )
+                periods = [
+                    create_period(
+                        rnd,
+                        owner,
+                        f"benchmark {size}",
+                        persons=options["persons"],
+                        purchases=int(size),
+                        max_members=options["max_members"],
+                        max_coefficient=options["max_coefficient"],
+                        skew=options["skew"],
+                    )
+                    for size in options["sizes"].split(",")
+                ]
+            for period in periods:
+                description = self.describe(period)
+                for name in stages:
+                    results.append(
+                        {
+                            **description,
+                            "stage": name,
+                            **self.measure(
+                                STAGES[name],
+                                period.pk,
+                                options["sample"],
+                                options["repeat"],
+                            ),
+                        }
+                    )
+            transaction.set_rollback(True)
+        report = json.dumps(
+            {
+                "meta": {
+                    "commit": current_commit(),
+                    "created_at": timezone.now().isoformat(),
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "database": connection.vendor,
+                    "seed": options["seed"],
+                    "skew": options["skew"],
+                    "repeat": options["repeat"],
+                },
+                "results": results,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+        else:
+            self.stdout.write(report)
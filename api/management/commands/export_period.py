@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import EXPORT_FORMATS, export_records
+from api.models import Period
+from config.settings import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "stream the purchases, memberships and final balances of a period as CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("period", help="id of the period to export.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default="csv",
+            dest="export_format",
+        )
+        parser.add_argument(
+            "--output",
+            help="file to write the export to. defaults to the standard output.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            period = Period.objects.get(pk=options["period"])
+        except Period.DoesNotExist:
+            raise CommandError(f"period {options['period']} does not exist.")
+        lines, _ = EXPORT_FORMATS[options["export_format"]]
+        records = export_records(period, chunk_size=options["chunk_size"])
+        if options["output"] is None:
+            for line in lines(records):
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", newline="") as output:
+            output.writelines(lines(records))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from api.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "create a reproducible synthetic dataset: owners with periods, persons, purchases and memberships. "
+        "coefficients and buyers follow a Zipf like distribution set by --skew."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owners", type=int, default=1)
+        parser.add_argument("--periods", type=int, default=1, help="periods per owner.")
+        parser.add_argument(
+            "--persons", type=int, default=40, help="persons per period."
+        )
+        parser.add_argument(
+            "--purchases", type=int, default=1000, help="purchases per period."
+        )
+        parser.add_argument(
+            "--max-members",
+            type=int,
+            default=8,
+            help="upper bound of the persons a purchase is made for.",
+        )
+        parser.add_argument("--max-coefficient", type=int, default=5)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.2,
+            help="0 draws coefficients and buyers uniformly, larger values skew them towards a few values.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix",
+            default="synthetic",
+            help="usernames and period names start with it, the same prefix and seed can only be created once.",
+        )
+
+    def handle(self, *args, **options):
+        periods = generate_dataset(
+            owners=options["owners"],
+            periods=options["periods"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            persons=options["persons"],
+            purchases=options["purchases"],
+            max_members=options["max_members"],
+            max_coefficient=options["max_coefficient"],
+            skew=options["skew"],
+        )
+        for period in periods:
+            self.stdout.write(f"{period.pk} {period.name}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"created {len(periods)} periods with {options['purchases']} purchases each."
+            )
+        )
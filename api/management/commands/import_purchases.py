@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importing import IMPORT_FORMATS, PurchaseImporter
+from api.models import Period
+from config.settings import BULK_PURCHASE_LIMIT
+
+
+class Command(BaseCommand):
+    help = "import purchases into a period from a CSV or JSON lines file, one purchase per row."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "period", help="id of the period to import the purchases into."
+        )
+        parser.add_argument("file", help="path of the file to import.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(IMPORT_FORMATS),
+            dest="import_format",
+            help="format of the file. defaults to the file extension.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BULK_PURCHASE_LIMIT)
+
+    def progress(self, importer: PurchaseImporter) -> None:
+        self.stdout.write(
+            f"{importer.rows} rows read, {importer.created} purchases created, {importer.error_count} invalid rows."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            period = Period.objects.prefetch_related("persons").get(
+                pk=options["period"]
+            )
+        except Period.DoesNotExist:
+            raise CommandError(f"period {options['period']} does not exist.")
+        import_format = options["import_format"] or options["file"].rpartition(".")[2]
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError("can not tell the format of the file, use --format.")
+        importer = PurchaseImporter(
+            period, batch_size=options["batch_size"], progress=self.progress
+        )
+        with open(options["file"], encoding="utf-8-sig", newline="") as stream:
+            summary = importer.run(IMPORT_FORMATS[import_format](stream))
+        for error in summary["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if summary["error_count"] > len(summary["errors"]):
+            self.stderr.write(
+                f"{summary['error_count'] - len(summary['errors'])} more invalid rows."
+            )
+        if importer.malformed:
+            raise CommandError(
+                f"the file is malformed, stopped at row {summary['rows']} after importing {summary['created']} "
+                "purchases."
+            )
+        self.stdout.write(
+            f"done, {summary['created']} of {summary['rows']} purchases imported."
+        )
@@ -0,0 +1,75 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ledger import period_ledger_detail, rebuild_period
+from api.models import Period
+from api.utils import get_period_purchases, settle_purchases
+
+
+def _detail_by_person(detail: list[dict]) -> dict:
+    return {
+        row["person"].pk: (
+            row["direct_cost"],
+            row["final_cost"],
+            {owe["person"].pk: owe["amount"] for owe in row["owe_to"]},
+            {credit["person"].pk: credit["amount"] for credit in row["creditor_of"]},
+        )
+        for row in detail
+    }
+
+
+def _amounts_match(ledger_amounts: dict, expected_amounts: dict) -> bool:
+    return ledger_amounts.keys() == expected_amounts.keys() and all(
+        math.isclose(amount, expected_amounts[key], abs_tol=1e-6)
+        for key, amount in ledger_amounts.items()
+    )
+
+
+class Command(BaseCommand):
+    help = "rebuild the balance ledger of periods from their purchases and check it against the settlement calculation."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            action="append",
+            dest="periods",
+            help="id of a period to rebuild, can be given more than once. defaults to all periods.",
+        )
+        parser.add_argument(
+            "--check-only",
+            action="store_true",
+            help="only compare the current ledger against the calculation, without rebuilding it.",
+        )
+
+    def handle(self, *args, **options):
+        periods = Period.objects.all()
+        if options["periods"]:
+            periods = periods.filter(pk__in=options["periods"])
+        mismatches = 0
+        for period in periods.iterator():
+            if not options["check_only"]:
+                rebuild_period(period)
+            expected = _detail_by_person(settle_purchases(get_period_purchases(period)))
+            recorded = _detail_by_person(period_ledger_detail(period))
+            differing = [
+                person_id
+                for person_id in expected.keys() | recorded.keys()
+                if person_id not in expected
+                or person_id not in recorded
+                or expected[person_id][0] != recorded[person_id][0]
+                or not math.isclose(
+                    expected[person_id][1], recorded[person_id][1], abs_tol=1e-6
+                )
+                or not _amounts_match(recorded[person_id][2], expected[person_id][2])
+                or not _amounts_match(recorded[person_id][3], expected[person_id][3])
+            ]
+            if differing:
+                mismatches += 1
+                self.stderr.write(
+                    f"period {period.pk}: ledger does not match for persons {', '.join(sorted(differing))}"
+                )
+            else:
+                self.stdout.write(f"period {period.pk}: ok")
+        if mismatches:
+            raise CommandError(f"{mismatches} period(s) have a mismatching ledger.")
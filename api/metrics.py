@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from config.settings import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+from .instrumentation import current_timings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name: (type, help) of every metric, in the order they are exposed.
+METRICS = {
+    "dangdong_http_requests_total": (
+        "counter",
+        "Requests handled, by route, method and status.",
+    ),
+    "dangdong_http_request_duration_seconds": (
+        "histogram",
+        "Time spent handling a request, by route, method and status.",
+    ),
+    "dangdong_http_request_queries": (
+        "histogram",
+        "Database queries made by a request, by route and method.",
+    ),
+    "dangdong_period_detail_cache_requests_total": (
+        "counter",
+        "Period detail cache lookups, by result.",
+    ),
+    "dangdong_period_detail_cache_hit_ratio": (
+        "gauge",
+        "Share of the period detail cache lookups that were hits.",
+    ),
+}
+
+
+class MetricsStore:
+    """
+    Counters and histograms of this process. they are written to a file of their own in ``METRICS_DIR`` at most
+    every ``METRICS_FLUSH_INTERVAL`` seconds, and :meth:`collect` adds up the files of all worker processes, so
+    every worker can answer the metrics endpoint for all of them.
+
+    the files are never removed, counters of restarted workers must keep counting. empty the directory when all
+    workers are restarted, as with any Prometheus multiprocess setup.
+    """
+
+    def __init__(self, directory: str, flush_interval: float):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.counters: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list] = {}
+        self.flushed_at = 0.0
+
+    def _check_fork(self) -> None:
+        # a forked worker starts with the values of its parent, which the parent
+        # already reports.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name: str, labels: dict, value: float = 1) -> None:
+        with self.lock:
+            self._check_fork()
+            key = (name, tuple(labels.items()))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float, buckets: tuple) -> None:
+        with self.lock:
+            self._check_fork()
+            key = (name, tuple(labels.items()))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [list(buckets), [0] * len(buckets), 0, 0]
+                self.histograms[key] = histogram
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[1][index] += 1
+            histogram[2] += value
+            histogram[3] += 1
+
+    def flush(self, force: bool = False) -> None:
+        """writes the values of this process to its file, unless it was written less than the interval ago."""
+        with self.lock:
+            self._check_fork()
+            now = time.monotonic()
+            if not force and now - self.flushed_at < self.flush_interval:
+                return
+            self.flushed_at = now
+            data = {
+                "counters": [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, labels, *histogram]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.pid}.json"
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, path)
+
+    def collect(self) -> tuple[dict, dict]:
+        """
+        Adds up the values of every worker process.
+
+        Returns:
+            tuple[dict, dict]: The counters and the histograms, keyed by (name, labels).
+        """
+        self.flush(force=True)
+        counters: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, counts, total, count in data["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = histograms.setdefault(
+                    key, [buckets, [0] * len(buckets), 0, 0]
+                )
+                histogram[1] = [a + b for a, b in zip(histogram[1], counts)]
+                histogram[2] += total
+                histogram[3] += count
+        return counters, histograms
+
+
+store = MetricsStore(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(labels, **extra) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """the metrics of all worker processes in the Prometheus text exposition format."""
+    counters, histograms = store.collect()
+    cache = {
+        dict(labels).get("result"): value
+        for (name, labels), value in counters.items()
+        if name == "dangdong_period_detail_cache_requests_total"
+    }
+    lookups = cache.get("hit", 0) + cache.get("miss", 0)
+    gauges = {
+        ("dangdong_period_detail_cache_hit_ratio", ()): (
+            cache.get("hit", 0) / lookups if lookups else 0.0
+        )
+    }
+    lines = []
+    for metric, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (name, labels), value in sorted({**counters, **gauges}.items()):
+            if name == metric:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), (buckets, counts, total, count) in sorted(
+            histograms.items()
+        ):
+            if name != metric:
+                continue
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(
+                    f"{name}_bucket{_labels(labels, le=_number(bound))} {bucket_count}"
+                )
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_lookup(hit: bool) -> None:
+    store.inc(
+        "dangdong_period_detail_cache_requests_total",
+        {"result": "hit" if hit else "miss"},
+    )
+
+
+class MetricsMiddleware:
+    """
+    counts the requests and records their latency per route name, method and status. the query count comes from
+    :class:`api.instrumentation.ServerTimingMiddleware`, which has to come before this middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, duration: float) -> None:
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match is not None else "unmatched"
+        labels = {
+            "route": route,
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        store.inc("dangdong_http_requests_total", labels)
+        store.observe(
+            "dangdong_http_request_duration_seconds", labels, duration, LATENCY_BUCKETS
+        )
+        timings = current_timings()
+        if timings is not None:
+            store.observe(
+                "dangdong_http_request_queries",
+                {"route": route, "method": request.method},
+                timings.queries,
+                QUERY_BUCKETS,
+            )
+        store.flush()
@@ -43,6 +43,11 @@ class Person(models.Model):
         related_name="owner_set",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "name", "id"], name="person_owner_name_idx")
+        ]
+
     def __str__(self):
         return self.name
 
@@ -56,6 +61,7 @@ class Period(models.Model):
         start_date (DateTimeField): The start date of the period.
         owner (ForeignKey): The :model:`customauth.User` who owns the period.
         persons (ManyToManyField): :model:`api.Person` associated with the period.
+        modified_at (DateTimeField): Last time the period or anything shown in its detail changed.
     """
 
     id = models.SlugField(
@@ -77,6 +83,18 @@ class Period(models.Model):
         editable=False,
     )
     persons = models.ManyToManyField(Person, verbose_name=_("Person"), blank=True)
+    modified_at = models.DateTimeField(
+        verbose_name=_("Modified At"), default=timezone.now, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "start_date", "id"],
+                name="period_owner_start_date_idx",
+            ),
+            models.Index(fields=["owner", "name"], name="period_owner_name_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -96,6 +114,16 @@ class PeriodShare(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_("Period"),
     )
+    # copy of the owner of the period, so the shares of a user are listed from a single index. nullable so it can be
+    # added to existing shares, see the README for the backfill.
+    owner = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        null=True,
+        verbose_name=_("Owner"),
+        editable=False,
+        related_name="+",
+    )
     sharing_id = models.CharField(
         unique=True,
         default=generate_period_sharing_id,
@@ -104,6 +132,23 @@ class PeriodShare(models.Model):
         max_length=256,
     )
     expires_at = models.DateTimeField(verbose_name=_("Expires At"))
+    modified_at = models.DateTimeField(
+        verbose_name=_("Modified At"), default=timezone.now, editable=False
+    )
+    # in snapshot mode visitors get the period detail as it was when the snapshot was taken, see api.snapshots.
+    is_snapshot = models.BooleanField(verbose_name=_("Is Snapshot"), default=False)
+    snapshot = models.BinaryField(verbose_name=_("Snapshot"), null=True, editable=False)
+    snapshot_at = models.DateTimeField(
+        verbose_name=_("Snapshot At"), null=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "expires_at", "id"],
+                name="period_share_owner_expires_idx",
+            )
+        ]
 
     def __str__(self) -> str:
         return str(self.period.name)
@@ -122,6 +167,7 @@ class Purchase(models.Model):
         expense (PositiveBigIntegerField): Amount spent on the purchase.
         buyer (ForeignKey): :model:`api.Person` who made the purchase.
         period (ForeignKey): :model:`api.Period` in which the purchase was made.
+        modified_at (DateTimeField): Last time the purchase, its memberships or its persons changed.
     """
 
     id = models.SlugField(
@@ -145,6 +191,17 @@ class Purchase(models.Model):
     period = models.ForeignKey(
         Period, on_delete=models.CASCADE, verbose_name=_("Period")
     )
+    modified_at = models.DateTimeField(
+        verbose_name=_("Modified At"), default=timezone.now, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["period", "date_and_time", "id"],
+                name="purchase_period_date_idx",
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -184,10 +241,129 @@ class PurchaseMembership(models.Model):
     # direct_cost = models.PositiveBigIntegerField(default=0)
     # final_cost = models.PositiveBigIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["purchase", "person"], name="unique_purchase_membership"
+            )
+        ]
+
     def __str__(self) -> str:
         return str(self.coefficient)
 
 
+class PeriodBalance(models.Model):
+    """
+    This model represents the materialized totals of a person in a period. rows are maintained by :mod:`api.ledger`
+    whenever a purchase or a purchase membership changes, so the period detail does not have to replay the purchases.
+    Attributes:
+        period (ForeignKey): The :model:`api.Period` the totals belong to.
+        person (ForeignKey): The :model:`api.Person` the totals belong to.
+        direct_cost (PositiveBigIntegerField): Sum of the expenses the person paid for.
+        final_cost (FloatField): Sum of the person's shares of the purchases.
+        entry_count (PositiveIntegerField): Number of ledger entries that make up these totals.
+    """
+
+    period = models.ForeignKey(
+        Period,
+        on_delete=models.CASCADE,
+        related_name="balances",
+        verbose_name=_("Period"),
+    )
+    person = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="+", verbose_name=_("Person")
+    )
+    direct_cost = models.PositiveBigIntegerField(
+        verbose_name=_("Direct Cost"), default=0
+    )
+    final_cost = models.FloatField(verbose_name=_("Final Cost"), default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "person"], name="unique_period_balance"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return str(self.final_cost)
+
+
+class PeriodDebt(models.Model):
+    """
+    This model represents the gross amount a person owes to another person in a period, before netting the two
+    directions against each other. rows are maintained by :mod:`api.ledger`.
+    Attributes:
+        period (ForeignKey): The :model:`api.Period` the debt belongs to.
+        debtor (ForeignKey): The :model:`api.Person` who owes the amount.
+        creditor (ForeignKey): The :model:`api.Person` the amount is owed to.
+        amount (FloatField): The owed amount.
+        entry_count (PositiveIntegerField): Number of ledger entries that make up the amount.
+    """
+
+    period = models.ForeignKey(
+        Period, on_delete=models.CASCADE, related_name="debts", verbose_name=_("Period")
+    )
+    debtor = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="+", verbose_name=_("Debtor")
+    )
+    creditor = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="+", verbose_name=_("Creditor")
+    )
+    amount = models.FloatField(verbose_name=_("Amount"), default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "debtor", "creditor"], name="unique_period_debt"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return str(self.amount)
+
+
+class PurchaseLedgerEntry(models.Model):
+    """
+    This model represents what a single purchase added to the ledger of its period, so the contribution can be
+    reverted exactly when the purchase changes or is deleted. the purchase is kept as a plain id, entries have to
+    outlive the purchase row until they are reverted.
+    Attributes:
+        purchase_id (SlugField): Id of the :model:`api.Purchase` the entry was recorded for.
+        period (ForeignKey): The :model:`api.Period` of the purchase.
+        person (ForeignKey): The :model:`api.Person` the entry is recorded for.
+        creditor (ForeignKey): The buyer the person owes the share to, empty for the buyer's own entry.
+        direct_cost (PositiveBigIntegerField): The expense, for the buyer's entry.
+        final_cost (FloatField): The person's share of the purchase.
+    """
+
+    purchase_id = models.SlugField(db_index=True)
+    period = models.ForeignKey(
+        Period,
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+        verbose_name=_("Period"),
+    )
+    person = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="+", verbose_name=_("Person")
+    )
+    creditor = models.ForeignKey(
+        Person,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+        verbose_name=_("Creditor"),
+    )
+    direct_cost = models.PositiveBigIntegerField(default=0)
+    final_cost = models.FloatField(default=0)
+
+    def __str__(self) -> str:
+        return str(self.final_cost)
+
+
 # class OweAndCredit(models.Model):
 #     CHOICES = (
 #         ("owe_to", "Owe To"),
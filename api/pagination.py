@@ -0,0 +1,134 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from config.settings import LIST_PAGE_SIZE, LIST_PAGE_SIZE_LIMIT
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset by the values of its ordering fields instead of an offset. the cursor holds the ordering
+    values of the last object of the page and the next page is filtered to the objects after it, so every page costs
+    the same no matter how deep the client is, and objects added meanwhile never shift the pages.
+
+    the last field of ``ordering`` has to be unique, fields prefixed with "-" are descending.
+    """
+
+    ordering: tuple[str, ...] = ("id",)
+    page_size = LIST_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = LIST_PAGE_SIZE_LIMIT
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, instance) -> str:
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip("-"))
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            values.append(value)
+        return b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, model) -> list | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(b64decode(encoded.encode(), validate=True))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def after(self, values: list) -> Q:
+        """builds the filter of the objects that come after the given ordering values."""
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): value
+                for previous, value in zip(self.ordering[:index], values)
+            }
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": values[index]}))
+        return reduce(or_, conditions)
+
+    def get_page_queryset(self, queryset, request):
+        """the objects of the requested page, plus the first object of the next page if there is one."""
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+        values = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+        return queryset[: self.current_page_size + 1]
+
+    def get_page(self, page: list) -> list:
+        page_size = self.current_page_size
+        self.next_cursor = (
+            self.encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+        )
+        return page[:page_size]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request) -> list:
+        """async version of :meth:`paginate_queryset`."""
+        queryset = self.get_page_queryset(queryset, request)
+        return self.get_page([instance async for instance in queryset])
+
+    def get_next_link(self) -> str | None:
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PurchasePagination(KeysetPagination):
+    ordering = ("date_and_time", "id")
+
+
+class PeriodPagination(KeysetPagination):
+    ordering = ("start_date", "id")
+
+
+class PersonPagination(KeysetPagination):
+    ordering = ("name", "id")
+
+
+class PeriodSharePagination(KeysetPagination):
+    ordering = ("expires_at", "id")
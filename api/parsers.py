@@ -0,0 +1,44 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import json
+
+from config.settings import DEFAULT_CHARSET
+
+from .renderers import ORJSONRenderer
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    JSON parser built on orjson. bodies orjson rejects are parsed again with the standard library, so invalid
+    bodies get the same error messages and integers over 64 bits are still accepted.
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured(
+                "orjson has to be installed to use api.parsers.ORJSONParser."
+            )
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", DEFAULT_CHARSET)
+        if encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read() if stream is not None else b""
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(body.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -9,16 +9,17 @@ class IsOwner(permissions.BasePermission):
     """checks if owner of the object is the authenticated user or not."""
 
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 
 class IsThroughPeriodRelatedOwner(permissions.BasePermission):
     """purchase object does not have owner field. this permission checks if
     purchases related periods owner is authenticated user or not.
+    the period has to be loaded with the object, see the get_queryset of the viewsets.
     """
 
     def has_object_permission(self, request, view, obj):
-        return obj.period.owner == request.user
+        return obj.period.owner_id == request.user.pk
 
 
 class IsAuthorizedUser(permissions.BasePermission):
@@ -0,0 +1,223 @@
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+
+from config.settings import SETTLEMENT_BACKEND
+
+from .instrumentation import stage
+from .ledger import period_ledger_detail
+from .models import Person, PurchaseMembership
+from .settlement import settle
+from .vectorized import settle_period
+
+_datetime_field = serializers.DateTimeField()
+
+PERSON_FIELDS = ("id", "name", "user_id", "owner_id")
+PURCHASE_FIELDS = ("id", "buyer_id", "name", "expense", "date_and_time")
+MEMBERSHIP_FIELDS = ("purchase_id", "person_id", "coefficient")
+
+
+class PersonRef:
+    """stands in for a :model:`api.Person` in the settlement calculation, which only needs the primary key."""
+
+    __slots__ = ("pk",)
+
+    def __init__(self, pk: str):
+        self.pk = pk
+
+
+class PersonTable(dict):
+    """
+    the representation of each person by id, built once per response and shared by every place the person shows
+    up in. persons that are not members of the period any more are loaded on first use.
+    """
+
+    def __missing__(self, person_id: str) -> dict:
+        self.load([person_id])
+        return self[person_id]
+
+    def load(self, person_ids) -> None:
+        for row in Person.objects.filter(pk__in=person_ids).values(*PERSON_FIELDS):
+            self.add(row)
+
+    def add(self, row: dict) -> dict:
+        representation = self[row["id"]] = {
+            "id": row["id"],
+            "name": row["name"],
+            "user": row["user_id"],
+            "owner": row["owner_id"],
+        }
+        return representation
+
+
+def _relations(persons: PersonTable, relations: list[dict]) -> list[dict]:
+    return [
+        {"person": persons[relation["person"].pk], "amount": int(relation["amount"])}
+        for relation in relations
+    ]
+
+
+def _missing_persons(
+    persons: PersonTable, purchases: list[dict], memberships: dict
+) -> set:
+    """ids of the buyers and members that are not members of the period any more."""
+    return {
+        person_id
+        for purchase in purchases
+        for person_id in [
+            purchase["buyer_id"],
+            *(person_id for person_id, _ in memberships[purchase["id"]]),
+        ]
+        if person_id not in persons
+    }
+
+
+def _settle(persons: PersonTable, purchases: list[dict], memberships: dict) -> list:
+    """the "python" settlement backend on the loaded rows, it does not touch the database."""
+    refs = {person_id: PersonRef(person_id) for person_id in persons}
+    with stage("settlement"):
+        return settle(
+            (
+                refs[purchase["buyer_id"]],
+                purchase["expense"],
+                [
+                    (refs[person_id], coefficient)
+                    for person_id, coefficient in memberships[purchase["id"]]
+                ],
+            )
+            for purchase in purchases
+        )
+
+
+def _build_period_detail(
+    period,
+    persons: PersonTable,
+    period_persons: list[dict],
+    purchases: list[dict],
+    memberships: dict,
+    period_detail: list,
+) -> dict:
+    to_datetime = _datetime_field.to_representation
+    total_expenses = sum(purchase["expense"] for purchase in purchases)
+    person_count = len(period_persons)
+    with stage("serialize"):
+        return {
+            "period": {
+                "id": period.pk,
+                "name": period.name,
+                "start_date": to_datetime(period.start_date),
+                "owner": period.owner_id,
+                "persons": period_persons,
+            },
+            "general_information": {
+                "person_count": person_count,
+                "total_expenses": total_expenses,
+                "average_cost_per_person": int(total_expenses / person_count),
+                "purchase_count": len(purchases),
+            },
+            "all_purchases": [
+                {
+                    "id": purchase["id"],
+                    "buyer": persons[purchase["buyer_id"]],
+                    "name": purchase["name"],
+                    "expense": purchase["expense"],
+                    "date_and_time": to_datetime(purchase["date_and_time"]),
+                    "purchased_for_users": [
+                        {"coefficient": coefficient, "person": persons[person_id]}
+                        for person_id, coefficient in memberships[purchase["id"]]
+                    ],
+                }
+                for purchase in purchases
+            ],
+            "detail": [
+                {
+                    "person": persons[row["person"].pk],
+                    "owe_to": _relations(persons, row["owe_to"]),
+                    "direct_cost": int(row["direct_cost"]),
+                    "final_cost": int(row["final_cost"]),
+                    "creditor_of": _relations(persons, row["creditor_of"]),
+                }
+                for row in period_detail
+            ],
+        }
+
+
+def render_period_detail(period) -> dict:
+    """
+    Builds the period detail straight from ``.values()`` rows instead of the nested model serializers. the output
+    is the same as :func:`api.utils.serialize_period_detail` returns, key for key and in the same order, so both
+    render to the same JSON.
+
+    Args:
+        period (Period): The period to build the detail of.
+
+    Returns:
+        dict: The period detail.
+    """
+    persons = PersonTable()
+    period_persons = [persons.add(row) for row in period.persons.values(*PERSON_FIELDS)]
+    purchases = list(period.purchase_set.values(*PURCHASE_FIELDS))
+    memberships: dict[str, list[tuple[str, int]]] = {
+        purchase["id"]: [] for purchase in purchases
+    }
+    for purchase_id, person_id, coefficient in PurchaseMembership.objects.filter(
+        purchase_id__in=list(memberships)
+    ).values_list(*MEMBERSHIP_FIELDS):
+        memberships[purchase_id].append((person_id, coefficient))
+    missing = _missing_persons(persons, purchases, memberships)
+    if missing:
+        persons.load(missing)
+
+    if SETTLEMENT_BACKEND == "ledger":
+        with stage("settlement"):
+            period_detail = period_ledger_detail(period)
+    elif SETTLEMENT_BACKEND == "numpy":
+        with stage("settlement"):
+            period_detail = settle_period(period)
+    else:
+        period_detail = _settle(persons, purchases, memberships)
+    return _build_period_detail(
+        period, persons, period_persons, purchases, memberships, period_detail
+    )
+
+
+async def arender_period_detail(period) -> dict:
+    """
+    async version of :func:`render_period_detail`. the rows are loaded with the async ORM and the settlement and
+    building the response, which do not touch the database with the "python" backend, run in a worker thread so
+    they do not block the event loop.
+
+    Args:
+        period (Period): The period to build the detail of.
+
+    Returns:
+        dict: The period detail.
+    """
+    persons = PersonTable()
+    period_persons = [
+        persons.add(row) async for row in period.persons.values(*PERSON_FIELDS)
+    ]
+    purchases = [row async for row in period.purchase_set.values(*PURCHASE_FIELDS)]
+    memberships: dict[str, list[tuple[str, int]]] = {
+        purchase["id"]: [] for purchase in purchases
+    }
+    async for purchase_id, person_id, coefficient in PurchaseMembership.objects.filter(
+        purchase_id__in=list(memberships)
+    ).values_list(*MEMBERSHIP_FIELDS):
+        memberships[purchase_id].append((person_id, coefficient))
+    missing = _missing_persons(persons, purchases, memberships)
+    async for row in Person.objects.filter(pk__in=missing).values(*PERSON_FIELDS):
+        persons.add(row)
+
+    if SETTLEMENT_BACKEND == "ledger":
+        with stage("settlement"):
+            period_detail = await sync_to_async(period_ledger_detail)(period)
+    elif SETTLEMENT_BACKEND == "numpy":
+        with stage("settlement"):
+            period_detail = await sync_to_async(settle_period)(period)
+    else:
+        period_detail = await sync_to_async(_settle, thread_sensitive=False)(
+            persons, purchases, memberships
+        )
+    return await sync_to_async(_build_period_detail, thread_sensitive=False)(
+        period, persons, period_persons, purchases, memberships, period_detail
+    )
@@ -0,0 +1,52 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    """encodes what orjson does not know, or encodes differently, the same way DRF's encoder does."""
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSON renderer built on orjson, producing the same bytes as :class:`rest_framework.renderers.JSONRenderer` for
+    the compact output of the API's payloads, except for floats in exponent notation, written as 1e-7 instead of
+    1e-07, and NaN and Infinity, rendered as null instead of being rejected. datetimes are passed to DRF's encoder so they keep the "Z" suffix, lazy translation strings and
+    Decimals are encoded like DRF does, and anything orjson can not encode (integers over 64 bits, indented output)
+    falls back to the standard renderer.
+    """
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured(
+                "orjson has to be installed to use api.renderers.ORJSONRenderer."
+            )
+        self.options = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping of the line and paragraph separators as DRF, to stay a strict javascript subset.
+        return rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
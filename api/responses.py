@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 ERROR_MESSAGES = {
     "unique_field": _("This field should be unique."),
     "not_period_member": _("Persons should be a member of this period first."),
+    "duplicate_member": _("Each person can only be added to a purchase once."),
     "required_field": _("This field is required."),
     "permission_denied": _("You do not have permission to perform this action."),
     "person_object_protected": _(
@@ -21,6 +22,12 @@ ERROR_MESSAGES = {
         "You asked for a login link recently, Please wait after you can get new one!"
     ),
     "invalid_sharing_link": _("Sharing Link is invalid or expired."),
+    "bulk_item_invalid": _(
+        "Some of the purchases are invalid, nothing is created. send partial as true to create the valid ones."
+    ),
+    "malformed_import_file": _(
+        "The file is malformed, the rows after the reported one were not imported."
+    ),
 }
 
 RESPONSE_MESSAGES = {
@@ -1,13 +1,37 @@
 from typing import Any
 
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import exceptions, serializers
 
-from config.settings import PERIOD_OBJECT_LIMIT
+from config.settings import BULK_PURCHASE_LIMIT, PERIOD_OBJECT_LIMIT
 
+from . import caching, conditional, ledger
 from .models import Period, PeriodShare, Person, Purchase, PurchaseMembership
 from .responses import ERROR_MESSAGES
 
 
+def memoized_representation(context: dict, serializer_class, instance) -> Any:
+    """
+    Returns the representation of an object, serializing every object only once per serializer context. a list
+    serializer shares its context with its children, so the period and the persons repeated across the purchases
+    of a response are serialized once instead of once per purchase.
+
+    Args:
+        context (dict): The context of the serializer building the response.
+        serializer_class (type[Serializer]): The serializer used for the object.
+        instance (Model): The object to represent.
+
+    Returns:
+        Any: The representation built by the serializer.
+    """
+    representations = context.setdefault("representations", {})
+    key = (serializer_class, instance.pk)
+    if key not in representations:
+        representations[key] = serializer_class(instance, context=context).data
+    return representations[key]
+
+
 class PersonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Person
@@ -38,7 +62,14 @@ class PurchaseSerializerForRead(serializers.ModelSerializer):
 
     class Meta:
         model = Purchase
-        fields = ("id", "buyer", "name", "expense", "date_and_time", "purchased_for_users")
+        fields = (
+            "id",
+            "buyer",
+            "name",
+            "expense",
+            "date_and_time",
+            "purchased_for_users",
+        )
 
 
 class PeriodSerializer(serializers.ModelSerializer):
@@ -101,17 +132,48 @@ class PeriodSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        person_serializer = PersonSerializer(instance.persons.all(), many=True)
-        representation["persons"] = person_serializer.data
+        representation["persons"] = [
+            memoized_representation(self.context, PersonSerializer, person)
+            for person in instance.persons.all()
+        ]
         return representation
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """primary key field that looks the object up in ``preloaded`` before falling back to a query."""
+
+    def __init__(self, **kwargs):
+        self.preloaded: dict = {}
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        instance = self.preloaded.get(data) if isinstance(data, str) else None
+        if instance is not None:
+            return instance
+        return super().to_internal_value(data)
+
+
+class PurchaseMembershipListSerializer(serializers.ListSerializer):
+    """loads the persons of all memberships with one query instead of one query per membership."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            person_ids = [
+                item.get("person")
+                for item in data
+                if isinstance(item, dict) and isinstance(item.get("person"), str)
+            ]
+            self.child.fields["person"].preloaded = Person.objects.in_bulk(person_ids)
+        return super().to_internal_value(data)
+
+
 class PurchaseMemberShipSerializer(serializers.ModelSerializer):
+    person = PreloadedPrimaryKeyRelatedField(queryset=Person.objects.all())
+
     class Meta:
         model = PurchaseMembership
         fields = ("id", "coefficient", "person")
-
-
+        list_serializer_class = PurchaseMembershipListSerializer
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
@@ -140,20 +202,23 @@ class PurchaseSerializer(serializers.ModelSerializer):
 
     def validate_buyer(self, value):
         request = self.context["request"]
-        if value.owner != request.user:
+        if value.owner_id != request.user.pk:
             raise exceptions.PermissionDenied()
         return value
 
     def validate_purchased_for_users(self, value):
         request = self.context["request"]
         for person_data in value:
-            if person_data.get("person").owner != request.user:
+            if person_data.get("person").owner_id != request.user.pk:
                 raise exceptions.PermissionDenied()
+        person_ids = [person_data.get("person").pk for person_data in value]
+        if len(set(person_ids)) != len(person_ids):
+            raise serializers.ValidationError(ERROR_MESSAGES["duplicate_member"])
         return value
 
     def validate_period(self, value):
         request = self.context["request"]
-        if value.owner != request.user:
+        if value.owner_id != request.user.pk:
             raise exceptions.PermissionDenied()
         return value
 
@@ -180,27 +245,54 @@ class PurchaseSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         purchased_for_users = validated_data.pop("purchased_for_users")
-        purchase = Purchase.objects.create(**validated_data)
-        for person_data in purchased_for_users:
-            membership = PurchaseMembership(
-                coefficient=person_data.get("coefficient", 1),
-                purchase=purchase,
-                person=person_data.get("person"),
+        with transaction.atomic(), ledger.deferred_sync(), conditional.deferred_touch():
+            purchase = Purchase.objects.create(**validated_data)
+            PurchaseMembership.objects.bulk_create(
+                PurchaseMembership(
+                    coefficient=person_data.get("coefficient", 1),
+                    purchase=purchase,
+                    person=person_data.get("person"),
+                )
+                for person_data in purchased_for_users
             )
-            membership.save()
+            # bulk_create does not send the save signals of the memberships.
+            ledger.purchase_changed(purchase.pk)
+            conditional.touch_purchase(purchase.pk)
         return purchase
 
     def to_representation(self, instance):
+        """
+        the buyer, period and membership persons are read from the relations loaded with
+        :func:`api.utils.get_purchase_queryset` and serialized once per response. a purchase that was just created
+        or updated has no memberships loaded, DRF drops them after an update, so they are loaded here with one
+        query.
+        """
+        if "purchased_for_users" not in getattr(
+            instance, "_prefetched_objects_cache", {}
+        ):
+            prefetch_related_objects(
+                [instance],
+                Prefetch(
+                    "purchased_for_users",
+                    queryset=PurchaseMembership.objects.select_related("person"),
+                ),
+            )
         representation = super().to_representation(instance)
-        buyer_serializer = PersonSerializer(instance.buyer)
-        period_serializer = PeriodSerializer(instance.period)
-        purchased_for_users_serializer = PurchaseMemberShipSerializerForRead(
-            instance.purchased_for_users.all(), many=True
+        representation["buyer"] = memoized_representation(
+            self.context, PersonSerializer, instance.buyer
         )
-        representation["buyer"] = buyer_serializer.data
-        representation["period"] = period_serializer.data
-        representation["purchased_for_users"] = purchased_for_users_serializer.data
-
+        representation["period"] = memoized_representation(
+            self.context, PeriodSerializer, instance.period
+        )
+        representation["purchased_for_users"] = [
+            {
+                "coefficient": membership.coefficient,
+                "person": memoized_representation(
+                    self.context, PersonSerializer, membership.person
+                ),
+            }
+            for membership in instance.purchased_for_users.all()
+        ]
         return representation
 
     def update(self, instance, validated_data):
@@ -210,21 +302,188 @@ class PurchaseSerializer(serializers.ModelSerializer):
         )
         instance.expense = validated_data.get("expense", instance.expense)
         instance.buyer = validated_data.get("buyer", instance.buyer)
-        for user_data in validated_data.get("purchased_for_users"):
+        with transaction.atomic(), ledger.deferred_sync(), conditional.deferred_touch():
+            purchased_for_users = validated_data.get("purchased_for_users")
+            if purchased_for_users is not None:
+                self.update_memberships(instance, purchased_for_users)
+            instance.save()
+        return instance
+
+    def update_memberships(self, instance, purchased_for_users):
+        """
+        Makes the memberships of the purchase match the given data. the existing memberships are loaded once and
+        the difference is written with one bulk create, one bulk update and one delete, so the number of queries
+        does not depend on the number of persons. persons missing from the data are removed from the purchase.
+
+        Args:
+            instance (Purchase): The purchase being updated.
+            purchased_for_users (list[dict]): The validated person and coefficient of each membership.
+        """
+        coefficients = {
+            user_data.get("person").pk: (
+                user_data.get("person"),
+                user_data.get("coefficient", 1),
+            )
+            for user_data in purchased_for_users
+        }
+        existing = {}
+        removed = []
+        for membership in instance.purchased_for_users.all():
+            if (
+                membership.person_id in coefficients
+                and membership.person_id not in existing
+            ):
+                existing[membership.person_id] = membership
+            else:
+                removed.append(membership.pk)
+        created, updated = [], []
+        for person_id, (person, coefficient) in coefficients.items():
+            membership = existing.get(person_id)
+            if membership is None:
+                created.append(
+                    PurchaseMembership(
+                        coefficient=coefficient, person=person, purchase=instance
+                    )
+                )
+            elif membership.coefficient != coefficient:
+                membership.coefficient = coefficient
+                updated.append(membership)
+        PurchaseMembership.objects.bulk_create(created)
+        PurchaseMembership.objects.bulk_update(updated, ["coefficient"])
+        if removed:
+            PurchaseMembership.objects.filter(pk__in=removed).delete()
+        # the bulk queries do not send the save signals of the memberships.
+        if created or updated:
+            ledger.purchase_changed(instance.pk)
+            conditional.touch_purchase(instance.pk)
+
+
+class BulkPurchaseMembershipSerializer(serializers.Serializer):
+    person = serializers.CharField()
+    coefficient = serializers.IntegerField(min_value=1, default=1)
+
+
+class BulkPurchaseItemSerializer(serializers.Serializer):
+    """
+    validates a single purchase of a bulk request. persons are looked up in the period members passed in the
+    context instead of one query per person.
+    """
+
+    name = serializers.CharField(max_length=100)
+    date_and_time = serializers.DateTimeField(required=False)
+    expense = serializers.IntegerField(min_value=0)
+    buyer = serializers.CharField()
+    purchased_for_users = BulkPurchaseMembershipSerializer(many=True, allow_empty=False)
+
+    def _member(self, person_id: str) -> Person:
+        person = self.context["members"].get(person_id)
+        if person is None:
+            raise serializers.ValidationError(ERROR_MESSAGES["not_period_member"])
+        if person.owner_id != self.context["period"].owner_id:
+            raise exceptions.PermissionDenied()
+        return person
+
+    def validate_buyer(self, value):
+        return self._member(value)
+
+    def validate_purchased_for_users(self, value):
+        for person_data in value:
+            person_data["person"] = self._member(person_data["person"])
+        if len({person_data["person"].pk for person_data in value}) != len(value):
+            raise serializers.ValidationError(ERROR_MESSAGES["duplicate_member"])
+        return value
+
+
+class BulkPurchaseSerializer(serializers.Serializer):
+    """
+    Creates many purchases of a period at once. every purchase is validated against the members of the period and
+    the purchase names already used in it, then all valid purchases and their memberships are inserted with
+    ``bulk_create`` in a single transaction.
+
+    invalid purchases are reported in ``validated_data["errors"]`` by their index. when ``partial`` is true the
+    valid purchases are still created, otherwise the caller should reject the whole request.
+    """
+
+    purchases = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=BULK_PURCHASE_LIMIT
+    )
+    partial = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        period = self.context["period"]
+        members = {person.pk: person for person in period.persons.all()}
+        names = {
+            item.get("name")
+            for item in attrs["purchases"]
+            if isinstance(item.get("name"), str)
+        }
+        used_names = set(
+            Purchase.objects.filter(period=period, name__in=names).values_list(
+                "name", flat=True
+            )
+        )
+        valid, errors = [], []
+        for index, item in enumerate(attrs["purchases"]):
+            serializer = BulkPurchaseItemSerializer(
+                data=item, context={**self.context, "members": members}
+            )
             try:
-                purchase_membership = PurchaseMembership.objects.get(
-                    purchase=instance, person=user_data.get("person")
+                serializer.is_valid(raise_exception=True)
+            except exceptions.PermissionDenied:
+                errors.append(
+                    {"index": index, "errors": ERROR_MESSAGES["permission_denied"]}
                 )
-                purchase_membership.coefficient = user_data.get("coefficient")
-                purchase_membership.save()
-            except PurchaseMembership.DoesNotExist:
-                purchase_membership = PurchaseMembership.objects.create(
-                    coefficient=user_data.get("coefficient"),
-                    person=user_data.get("person"),
-                    purchase=instance,
+                continue
+            except serializers.ValidationError as error:
+                errors.append({"index": index, "errors": error.detail})
+                continue
+            name = serializer.validated_data["name"]
+            if name in used_names:
+                errors.append(
+                    {
+                        "index": index,
+                        "errors": {"name": [ERROR_MESSAGES["unique_field"]]},
+                    }
                 )
-        instance.save()
-        return instance
+                continue
+            used_names.add(name)
+            valid.append(serializer.validated_data)
+        attrs["valid"] = valid
+        attrs["errors"] = errors
+        return attrs
+
+    def create(self, validated_data):
+        period = self.context["period"]
+        purchases, memberships = [], []
+        for item in validated_data["valid"]:
+            purchase = Purchase(
+                period=period,
+                **{
+                    field: value
+                    for field, value in item.items()
+                    if field != "purchased_for_users"
+                },
+            )
+            purchases.append(purchase)
+            memberships += [
+                PurchaseMembership(
+                    purchase=purchase,
+                    person=person_data["person"],
+                    coefficient=person_data["coefficient"],
+                )
+                for person_data in item["purchased_for_users"]
+            ]
+        with transaction.atomic():
+            Purchase.objects.bulk_create(purchases, batch_size=BULK_PURCHASE_LIMIT)
+            PurchaseMembership.objects.bulk_create(
+                memberships, batch_size=BULK_PURCHASE_LIMIT
+            )
+            # bulk_create does not send the save signals the ledger and the caches rely on.
+            if purchases:
+                ledger.sync_purchases([purchase.pk for purchase in purchases])
+                conditional.touch_periods([period.pk])
+                caching.invalidate_period(period.pk)
+        return purchases
 
 
 class InDebtAndCreditedSerializer(serializers.Serializer):
@@ -247,10 +506,29 @@ class GeneralInformationSerializer(serializers.Serializer):
     purchase_count = serializers.IntegerField()
 
 
+class PersonBalanceSerializer(serializers.Serializer):
+    person = PersonSerializer()
+    balance = serializers.IntegerField()
+
+
+class TransferSerializer(serializers.Serializer):
+    debtor = PersonSerializer()
+    creditor = PersonSerializer()
+    amount = serializers.IntegerField()
+
+
 class PeriodShareSerializer(serializers.ModelSerializer):
     class Meta:
         model = PeriodShare
-        fields = ("id", "period", "sharing_id", "expires_at", "is_expired")
+        fields = (
+            "id",
+            "period",
+            "sharing_id",
+            "expires_at",
+            "is_expired",
+            "is_snapshot",
+            "snapshot_at",
+        )
 
     def validate_period(self, value):
         request = self.context["request"]
@@ -264,5 +542,6 @@ class PeriodShareSerializer(serializers.ModelSerializer):
     def update(self, instance: Any, validated_data: Any) -> Any:
         instance.period = validated_data.get("period", instance.period)
         instance.expires_at = validated_data.get("expires_at", instance.expires_at)
+        instance.is_snapshot = validated_data.get("is_snapshot", instance.is_snapshot)
         instance.save()
         return instance
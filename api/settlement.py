@@ -0,0 +1,238 @@
+import heapq
+from typing import Iterable
+
+SettlementPurchase = tuple[object, int, list[tuple[object, int]]]
+
+
+def new_balance(person: object) -> dict:
+    """returns an empty balance accumulator for the given person."""
+    return {
+        "person": person,
+        "owe_to": {},
+        "direct_cost": 0,
+        "final_cost": 0,
+        "creditor_of": {},
+    }
+
+
+def split_purchase(
+    buyer: object, expense: int, memberships: list[tuple[object, int]]
+) -> tuple[float | None, list[tuple[object, float]]]:
+    """
+    Splits the expense of a purchase between the persons it is made for, based on their coefficients.
+
+    Args:
+        buyer (Person): The person who made the purchase.
+        expense (int): Amount spent on the purchase.
+        memberships (list[tuple[Person, int]]): (person, coefficient) of the persons the purchase is made for.
+
+    Returns:
+        tuple: The buyer's own share, or None if the buyer is not a member of the purchase, and a list of
+            (person, share) for the other members in membership order.
+    """
+    coefficient_sum = sum(coefficient for _, coefficient in memberships)
+    each_coefficient_share = expense / coefficient_sum if coefficient_sum else 0
+    buyer_id = buyer.pk
+    buyer_share = None
+    shares = []
+    for person, coefficient in memberships:
+        if person.pk == buyer_id:
+            if buyer_share is None:
+                buyer_share = each_coefficient_share * coefficient
+            continue
+        shares.append((person, each_coefficient_share * coefficient))
+    return buyer_share, shares
+
+
+def _net_pair(balance: dict, other: dict, person_id: str, other_id: str) -> None:
+    """
+    nets what two persons owe each other so only one direction of the debt remains.
+    both sides of the relation are updated, so each pair only has to be visited once.
+    """
+    owe = balance["owe_to"][other_id]
+    credit = balance["creditor_of"][other_id]
+    amount = credit - owe
+    if amount > 0:
+        del balance["owe_to"][other_id], other["creditor_of"][person_id]
+        balance["creditor_of"][other_id] = other["owe_to"][person_id] = amount
+    elif amount < 0:
+        del balance["creditor_of"][other_id], other["owe_to"][person_id]
+        balance["owe_to"][other_id] = other["creditor_of"][person_id] = -amount
+    else:
+        del balance["owe_to"][other_id], other["creditor_of"][person_id]
+        del balance["creditor_of"][other_id], other["owe_to"][person_id]
+
+
+def net_balances(balances: dict[str, dict]) -> list[dict]:
+    """
+    Nets the pairwise owe/credit relations of accumulated balances in one sweep and returns them as detail data.
+    relations that come down to zero, from members with a zero coefficient for example, are left out.
+
+    Args:
+        balances (dict[str, dict]): Balance accumulators (see :func:`new_balance`) keyed by person id, where owe_to
+            and creditor_of map the other person's id to the gross amount.
+
+    Returns:
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+    """
+    for person_id, balance in balances.items():
+        for other_id in [
+            other_id
+            for other_id in balance["owe_to"]
+            if other_id in balance["creditor_of"]
+        ]:
+            _net_pair(balance, balances[other_id], person_id, other_id)
+
+    return [
+        {
+            "person": balance["person"],
+            "owe_to": [
+                {"person": balances[other_id]["person"], "amount": amount}
+                for other_id, amount in balance["owe_to"].items()
+                if amount
+            ],
+            "direct_cost": balance["direct_cost"],
+            "final_cost": balance["final_cost"],
+            "creditor_of": [
+                {"person": balances[other_id]["person"], "amount": amount}
+                for other_id, amount in balance["creditor_of"].items()
+                if amount
+            ],
+        }
+        for balance in balances.values()
+    ]
+
+
+def settle(purchases: Iterable[SettlementPurchase]) -> list[dict]:
+    """
+    Calculates the expenses detail of a set of purchases in a single pass.
+
+    Balances are accumulated in dictionaries keyed by the person id, so each purchase membership is visited once
+    and the pairwise owe/credit relations are netted in one sweep afterwards. persons are listed in the order they
+    first appear in the purchases, same as the old list based calculation.
+
+    Args:
+        purchases (Iterable[SettlementPurchase]): (buyer, expense, memberships) tuples where memberships is a list of
+            (person, coefficient) tuples of the persons the purchase is made for.
+
+    Returns:
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+            format:
+                "person": person,
+                "owe_to": [{"person": person, "amount": amount}],
+                "direct_cost": direct_cost,
+                "final_cost": final_cost,
+                "creditor_of": [{"person": person, "amount": amount}]
+    """
+    balances: dict[str, dict] = {}
+
+    for buyer, expense, memberships in purchases:
+        buyer_id = buyer.pk
+        buyer_share, shares = split_purchase(buyer, expense, memberships)
+        for person, share in shares:
+            balance = balances.get(person.pk)
+            if balance is None:
+                balance = balances[person.pk] = new_balance(person)
+            balance["final_cost"] += share
+            owe_to = balance["owe_to"]
+            owe_to[buyer_id] = owe_to.get(buyer_id, 0) + share
+
+        balance = balances.get(buyer_id)
+        if balance is None:
+            balance = balances[buyer_id] = new_balance(buyer)
+        balance["direct_cost"] += expense
+        if buyer_share is not None:
+            balance["final_cost"] += buyer_share
+        creditor_of = balance["creditor_of"]
+        for person, share in shares:
+            creditor_of[person.pk] = creditor_of.get(person.pk, 0) + share
+
+    return net_balances(balances)
+
+
+def apportion(expense: int, coefficients: list[int]) -> list[int]:
+    """
+    Splits an expense into integer shares proportional to the coefficients, using the largest remainder method so
+    the shares always add up to exactly the expense.
+
+    Args:
+        expense (int): The amount to split.
+        coefficients (list[int]): The coefficient of each share.
+
+    Returns:
+        list[int]: The shares, in the order of the coefficients.
+    """
+    coefficient_sum = sum(coefficients)
+    if not coefficient_sum:
+        return [0] * len(coefficients)
+    shares = [expense * coefficient // coefficient_sum for coefficient in coefficients]
+    remainder = expense - sum(shares)
+    by_remainder = sorted(
+        range(len(coefficients)),
+        key=lambda index: -(expense * coefficients[index] % coefficient_sum),
+    )
+    for index in by_remainder[:remainder]:
+        shares[index] += 1
+    return shares
+
+
+def person_balances(purchases: Iterable[SettlementPurchase]) -> dict[str, dict]:
+    """
+    Calculates the exact net balance of each person over a set of purchases, positive when the person should get
+    money back and negative when the person owes money.
+
+    Args:
+        purchases (Iterable[SettlementPurchase]): (buyer, expense, memberships) tuples where memberships is a list of
+            (person, coefficient) tuples of the persons the purchase is made for.
+
+    Returns:
+        dict[str, dict]: {"person": person, "balance": balance} keyed by the person id, in order of appearance.
+    """
+    balances: dict[str, dict] = {}
+    for buyer, expense, memberships in purchases:
+        if buyer.pk not in balances:
+            balances[buyer.pk] = {"person": buyer, "balance": 0}
+        if not memberships:
+            continue
+        balances[buyer.pk]["balance"] += expense
+        # remainders are handed out by person id, so the result does not depend on the membership order.
+        memberships = sorted(memberships, key=lambda membership: membership[0].pk)
+        shares = apportion(expense, [coefficient for _, coefficient in memberships])
+        for (person, _), share in zip(memberships, shares):
+            if person.pk not in balances:
+                balances[person.pk] = {"person": person, "balance": 0}
+            balances[person.pk]["balance"] -= share
+    return balances
+
+
+def minimum_transfers(balances: dict[str, dict]) -> list[dict]:
+    """
+    Matches debtors with creditors greedily, always settling the largest debt against the largest credit, which
+    needs at most one transfer less than the number of persons with a non-zero balance and runs in O(N log N).
+
+    Args:
+        balances (dict[str, dict]): Exact balances as returned by :func:`person_balances`.
+
+    Returns:
+        list[dict]: {"debtor": person, "creditor": person, "amount": amount} transfers that settle every balance.
+    """
+    creditors = []
+    debtors = []
+    for order, balance in enumerate(balances.values()):
+        if balance["balance"] > 0:
+            creditors.append((-balance["balance"], order, balance["person"]))
+        elif balance["balance"] < 0:
+            debtors.append((balance["balance"], order, balance["person"]))
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers = []
+    while creditors and debtors:
+        credit, credit_order, creditor = heapq.heappop(creditors)
+        debt, debt_order, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append({"debtor": debtor, "creditor": creditor, "amount": amount})
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, credit_order, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debt_order, debtor))
+    return transfers
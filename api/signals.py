@@ -0,0 +1,144 @@
+from django.db.models import Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, conditional, ledger
+from .models import Period, PeriodShare, Person, Purchase, PurchaseMembership
+
+
+def period_changed(period_id: str) -> None:
+    conditional.touch_periods([period_id])
+    caching.invalidate_period(period_id)
+
+
+@receiver(pre_save, sender=Period)
+@receiver(pre_save, sender=PeriodShare)
+def modified(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.modified_at = timezone.now()
+
+
+@receiver(pre_save, sender=PeriodShare)
+def share_owner(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.owner_id = instance.period.owner_id
+
+
+@receiver(post_save, sender=Purchase)
+def purchase_saved(sender, instance, raw=False, **kwargs):
+    """keeps the period ledger in sync with purchases saved anywhere, including the admin."""
+    if not raw:
+        ledger.purchase_changed(instance.pk)
+        conditional.touch_periods([instance.period_id])
+    caching.invalidate_period(instance.period_id)
+
+
+@receiver(pre_save, sender=Purchase)
+def purchase_saving(sender, instance, raw=False, **kwargs):
+    """a purchase moved to another period changes the detail of the period it leaves as well."""
+    if raw:
+        return
+    instance.modified_at = timezone.now()
+    if instance._state.adding:
+        return
+    old_period_id = (
+        Purchase.objects.filter(pk=instance.pk)
+        .values_list("period_id", flat=True)
+        .first()
+    )
+    if old_period_id is not None and old_period_id != instance.period_id:
+        period_changed(old_period_id)
+
+
+@receiver(pre_delete, sender=Purchase)
+def purchase_deleting(sender, instance, **kwargs):
+    ledger.purchase_deleting(instance)
+
+
+@receiver(post_delete, sender=Purchase)
+def purchase_deleted(sender, instance, **kwargs):
+    ledger.purchase_deleted(instance)
+    period_changed(instance.period_id)
+
+
+@receiver(post_save, sender=PurchaseMembership)
+@receiver(post_delete, sender=PurchaseMembership)
+def purchase_membership_changed(sender, instance, raw=False, **kwargs):
+    if raw or ledger.is_purchase_deleting(instance.purchase_id):
+        return
+    ledger.purchase_changed(instance.purchase_id)
+    conditional.touch_purchase(instance.purchase_id)
+
+
+@receiver(pre_delete, sender=Period)
+def period_deleting(sender, instance, **kwargs):
+    ledger.period_deleting(instance)
+
+
+@receiver(post_delete, sender=Period)
+def period_deleted(sender, instance, **kwargs):
+    ledger.period_deleted(instance)
+    caching.invalidate_period(instance.pk)
+
+
+@receiver(post_save, sender=Period)
+def period_saved(sender, instance, **kwargs):
+    caching.invalidate_period(instance.pk)
+
+
+@receiver(m2m_changed, sender=Period.persons.through)
+def period_persons_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """the period detail lists its persons, so adding or removing one changes the period."""
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            period_changed(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        for period_id in pk_set:
+            period_changed(period_id)
+    elif action == "pre_clear":
+        for period_id in instance.period_set.values_list("pk", flat=True):
+            period_changed(period_id)
+
+
+def person_period_ids(person: Person) -> list[str]:
+    """ids of the periods the person is a member of, or takes part in a purchase of."""
+    return list(
+        Period.objects.filter(
+            Q(persons=person)
+            | Q(purchase__buyer=person)
+            | Q(purchase__purchased_for_users__person=person)
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_save, sender=Person)
+def person_changed(sender, instance, raw=False, created=False, **kwargs):
+    """persons are rendered by name in every period and purchase they take part in."""
+    if raw or created:
+        return
+    for period_id in person_period_ids(instance):
+        caching.invalidate_period(period_id)
+    conditional.touch_person(instance)
+
+
+@receiver(pre_delete, sender=Person)
+def person_deleting(sender, instance, **kwargs):
+    period_ids = person_period_ids(instance)
+    for period_id in period_ids:
+        caching.invalidate_period(period_id)
+    conditional.touch_person(instance)
+    ledger.person_deleting(instance, period_ids)
+
+
+@receiver(post_delete, sender=Person)
+def person_deleted(sender, instance, **kwargs):
+    ledger.person_deleted(instance)
@@ -0,0 +1,54 @@
+import gzip
+
+from django.http import HttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.settings import api_settings
+
+from .conditional import conditional_response, set_validators
+from .models import PeriodShare
+from .utils import get_period_detail
+
+
+def render_snapshot(period) -> bytes:
+    """the period detail rendered by the first of the configured renderers, the JSON one, and gzipped."""
+    content = api_settings.DEFAULT_RENDERER_CLASSES[0]().render(
+        get_period_detail(period)
+    )
+    return gzip.compress(content, mtime=0)
+
+
+def take_snapshot(share: PeriodShare) -> None:
+    """freezes the current detail of the period into the share and turns its snapshot mode on."""
+    share.is_snapshot = True
+    share.snapshot = render_snapshot(share.period)
+    share.snapshot_at = timezone.now()
+    # saving moves modified_at forward, which is the ETag of the snapshot.
+    share.save(update_fields=["is_snapshot", "snapshot", "snapshot_at", "modified_at"])
+
+
+def drop_snapshot(share: PeriodShare) -> None:
+    share.snapshot = None
+    share.snapshot_at = None
+    share.save(update_fields=["snapshot", "snapshot_at", "modified_at"])
+
+
+def snapshot_response(request, share: PeriodShare) -> HttpResponse:
+    """
+    Answers a visitor of a share in snapshot mode with the stored snapshot, without any query or settlement work.
+    clients that accept gzip get the compressed snapshot as it is stored.
+    """
+    not_modified = conditional_response(request, share)
+    if not_modified is not None:
+        return not_modified
+    content = bytes(share.snapshot)
+    if re_accepts_gzip.search(request.headers.get("Accept-Encoding", "")):
+        response = HttpResponse(content, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(
+            gzip.decompress(content), content_type="application/json"
+        )
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return set_validators(response, share)
@@ -0,0 +1,127 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .ledger import rebuild_period
+from .models import Period, Person, Purchase, PurchaseMembership
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """weights proportional to 1 / rank ** skew for ranks 1 to count."""
+    return [1 / rank**skew for rank in range(1, count + 1)]
+
+
+def create_period(
+    rnd: random.Random,
+    owner,
+    name: str,
+    persons: int = 40,
+    purchases: int = 1000,
+    max_members: int = 8,
+    max_coefficient: int = 5,
+    skew: float = 1.2,
+    batch_size: int = 1000,
+) -> Period:
+    """
+    Creates a period with generated persons, purchases and memberships and records its ledger. rows are written
+    with bulk inserts, so the signals that keep the ledger up to date do not run and the ledger is rebuilt once at
+    the end.
+
+    Args:
+        rnd (random.Random): The generator all random choices are drawn from.
+        owner (User): The owner of the period and its persons.
+        name (str): The name of the period, its persons and purchases are named after it.
+        persons (int): Persons in the period.
+        purchases (int): Purchases in the period.
+        max_members (int): Upper bound of the persons a purchase is made for.
+        max_coefficient (int): Coefficients are drawn from 1 to this value.
+        skew (float): Exponent of the Zipf like weights of the coefficients and the buyers. 0 draws them uniformly,
+            larger values make coefficient 1 and a few buyers increasingly common.
+        batch_size (int): Rows inserted per query.
+
+    Returns:
+        Period: The created period.
+    """
+    started = timezone.now() - timedelta(days=365)
+    period = Period.objects.create(name=name, owner=owner, start_date=started)
+    people = Person.objects.bulk_create(
+        [
+            Person(name=f"{name} person {index}", owner=owner)
+            for index in range(persons)
+        ],
+        batch_size=batch_size,
+    )
+    period.persons.set(people)
+    buyer_weights = zipf_weights(len(people), skew)
+    coefficients = range(1, max_coefficient + 1)
+    coefficient_weights = zipf_weights(max_coefficient, skew)
+    created = Purchase.objects.bulk_create(
+        [
+            Purchase(
+                name=f"{name} purchase {index}",
+                expense=rnd.randint(1, 1_000_000),
+                date_and_time=started + timedelta(seconds=rnd.randint(0, 365 * 86400)),
+                buyer=rnd.choices(people, buyer_weights)[0],
+                period=period,
+            )
+            for index in range(purchases)
+        ],
+        batch_size=batch_size,
+    )
+    members = min(max_members, len(people))
+    PurchaseMembership.objects.bulk_create(
+        [
+            PurchaseMembership(
+                purchase=purchase,
+                person=person,
+                coefficient=rnd.choices(coefficients, coefficient_weights)[0],
+            )
+            for purchase in created
+            for person in rnd.sample(people, rnd.randint(1, members))
+        ],
+        batch_size=batch_size,
+    )
+    rebuild_period(period)
+    return period
+
+
+def generate_dataset(
+    owners: int = 1,
+    periods: int = 1,
+    seed: int = 0,
+    prefix: str = "synthetic",
+    **options,
+) -> list[Period]:
+    """
+    Creates owners with generated periods. the same arguments always produce the same purchases, so datasets made
+    on different commits can be compared.
+
+    Args:
+        owners (int): Number of users owning the data.
+        periods (int): Periods of each owner.
+        seed (int): Seed of the random generator.
+        prefix (str): Usernames, emails and period names start with it, use a different one to create another
+            dataset in the same database.
+        **options: The shape of each period, passed on to :func:`create_period`.
+
+    Returns:
+        list[Period]: The created periods.
+    """
+    rnd = random.Random(seed)
+    created = []
+    with transaction.atomic():
+        for owner_index in range(owners):
+            username = f"{prefix}-{seed}-{owner_index}"
+            owner = get_user_model().objects.create(
+                username=username, email=f"{username}@example.com"
+            )
+            for period_index in range(periods):
+                created.append(
+                    create_period(
+                        rnd, owner, f"{username} period {period_index}", **options
+                    )
+                )
+    return created
@@ -1,3 +1,1636 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config.settings import PERIOD_DETAIL_CACHE_ALIAS
+from customauth.models import Verification
+
+from . import metrics, synthetic
+from .caching import cache_stats, get_period_version, reset_cache_stats
+from .conditional import get_validators
+from .ledger import period_ledger_detail, purchase_entries
+from .models import (
+    Period,
+    PeriodBalance,
+    PeriodDebt,
+    PeriodShare,
+    Person,
+    Purchase,
+    PurchaseLedgerEntry,
+    PurchaseMembership,
+)
+from .parsers import ORJSONParser
+from .read_serializers import arender_period_detail, render_period_detail
+from .renderers import ORJSONRenderer, orjson
+from .responses import ERROR_MESSAGES
+from .settlement import (
+    apportion,
+    minimum_transfers,
+    net_balances,
+    new_balance,
+    person_balances,
+    settle,
+)
+from .urls import router
+from .utils import get_period_purchases, serialize_period_detail, settle_purchases
+from .vectorized import np, settle_period
+from .views import PeriodShareViewSet, PeriodViewSet, PersonViewSet
+
+
+def detail_by_person(detail: list[dict]) -> dict:
+    """the amounts of a settlement result keyed by the person id, to compare results independent of their order."""
+    return {
+        item["person"].pk: (
+            item["direct_cost"],
+            item["final_cost"],
+            {owe["person"].pk: owe["amount"] for owe in item["owe_to"]},
+            {credit["person"].pk: credit["amount"] for credit in item["creditor_of"]},
+        )
+        for item in detail
+    }
+
+
+class QueryPlanTests(TestCase):
+    """
+    runs EXPLAIN on the hot queries of the api and fails when one of them has to scan a whole table or sort its
+    rows, which means the index it relies on is missing or can not be used.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(
+            username="owner", email="owner@example.com"
+        )
+        cls.person = Person.objects.create(name="person", owner=cls.user)
+        cls.period = Period.objects.create(name="period", owner=cls.user)
+        cls.purchase = Purchase.objects.create(
+            name="purchase", expense=1, buyer=cls.person, period=cls.period
+        )
+
+    def assertUsesIndexes(self, queryset, ordered=False, index=None):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plans are only checked on SQLite.")
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            # SQLite plan lines are "<id> <parent> <unused> <detail>".
+            detail = line.split(maxsplit=3)[-1]
+            self.assertFalse(
+                detail.startswith("SCAN ") and " USING " not in detail,
+                f"full table scan in the plan of:\n{queryset.query}\n{plan}",
+            )
+            if ordered:
+                self.assertNotIn(
+                    "TEMP B-TREE",
+                    detail,
+                    f"sort without an index in the plan of:\n{queryset.query}\n{plan}",
+                )
+        if index is not None:
+            self.assertIn(
+                f" INDEX {index} ",
+                plan,
+                f"{index} is not used in the plan of:\n{queryset.query}\n{plan}",
+            )
+
+    def test_period_purchases(self):
+        self.assertUsesIndexes(
+            Purchase.objects.filter(period=self.period).order_by("date_and_time", "id"),
+            ordered=True,
+            index="purchase_period_date_idx",
+        )
+        self.assertUsesIndexes(
+            Purchase.objects.filter(
+                period=self.period,
+                date_and_time__gt=timezone.now(),
+            ).order_by("date_and_time", "id"),
+            ordered=True,
+        )
+        self.assertUsesIndexes(
+            Purchase.objects.filter(name="purchase", period=self.period)
+        )
+
+    def test_purchase_memberships(self):
+        memberships = PurchaseMembership.objects.filter(
+            purchase=self.purchase, person=self.person
+        )
+        self.assertUsesIndexes(memberships)
+        # the unique (purchase, person) constraint is the index of this lookup.
+        self.assertIn("(purchase_id=? AND person_id=?)", memberships.explain())
+        self.assertUsesIndexes(
+            PurchaseMembership.objects.filter(purchase__in=[self.purchase.pk])
+        )
+
+    def test_owner_names(self):
+        self.assertUsesIndexes(
+            Person.objects.filter(name="person", owner=self.user),
+            index="person_owner_name_idx",
+        )
+        self.assertUsesIndexes(
+            Period.objects.filter(name="period", owner=self.user),
+            index="period_owner_name_idx",
+        )
+
+    def listing(self, viewset, cursor_from=None):
+        """the queryset of a page of the list view, the first one or the one after the given object."""
+        request = Request(APIRequestFactory().get("/"))
+        request.user = self.user
+        view = viewset(request=request, format_kwarg=None, action="list")
+        if cursor_from is not None:
+            cursor = view.paginator.encode_cursor(cursor_from)
+            request = Request(APIRequestFactory().get("/", {"cursor": cursor}))
+        return view.paginator.get_page_queryset(view.get_queryset(), request)
+
+    def test_owner_listings(self):
+        share = PeriodShare.objects.create(
+            period=self.period, expires_at=timezone.now() + timedelta(days=1)
+        )
+        for viewset, instance, index in (
+            (PersonViewSet, self.person, "person_owner_name_idx"),
+            (PeriodViewSet, self.period, "period_owner_start_date_idx"),
+            (PeriodShareViewSet, share, "period_share_owner_expires_idx"),
+        ):
+            for cursor_from in (None, instance):
+                self.assertUsesIndexes(
+                    self.listing(viewset, cursor_from), ordered=True, index=index
+                )
+
+    def test_verification(self):
+        self.assertUsesIndexes(
+            Verification.objects.filter(user=self.user, expire_at__gt=timezone.now()),
+            index="verification_user_expire_idx",
+        )
+        self.assertUsesIndexes(
+            Verification.objects.filter(expire_at__lt=timezone.now()),
+            index="verification_expire_idx",
+        )
+
+    def test_ledger(self):
+        self.assertUsesIndexes(PeriodBalance.objects.filter(period=self.period))
+        self.assertUsesIndexes(
+            PurchaseLedgerEntry.objects.filter(purchase_id__in=[self.purchase.pk])
+        )
+
+
+@skipIf(orjson is None, "orjson is not installed.")
+class ORJSONCompatibilityTests(SimpleTestCase):
+    """the orjson renderer and parser have to produce equivalent JSON to what the standard DRF classes produce."""
+
+    def assertSameRender(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_render(self):
+        self.assertSameRender(
+            {
+                "utc": datetime(2023, 9, 1, 10, 30, tzinfo=dt_timezone.utc),
+                "microseconds": datetime(
+                    2023, 9, 1, 10, 30, 5, 123456, tzinfo=dt_timezone.utc
+                ),
+                "offset": datetime(
+                    2023,
+                    9,
+                    1,
+                    10,
+                    30,
+                    tzinfo=dt_timezone(timedelta(hours=3, minutes=30)),
+                ),
+                "naive": datetime(2023, 9, 1, 10, 30),
+                "date": date(2023, 9, 1),
+                "time": time(10, 30, 1),
+                "duration": timedelta(hours=1),
+                "decimal": Decimal("12.50"),
+                "uuid": uuid.UUID(int=1),
+                "lazy": ERROR_MESSAGES["unique_field"],
+                "unicode": "دنگ و دونگ \u2028 \u2029",
+                "numbers": [0, -1, 2**63 - 1, 1.5, 0.1, 1234567.891],
+                "nested": [{"a": None, "b": True}, (), {1: "int key"}],
+            }
+        )
+
+    def test_render_exponent_floats(self):
+        # orjson writes 1e-7 where the standard library writes 1e-07, both decode to the same value.
+        data = {"numbers": [1e-7, 1e16, 1.5e300]}
+        self.assertEqual(
+            JSONParser().parse(io.BytesIO(ORJSONRenderer().render(data))), data
+        )
+
+    def test_render_non_finite_floats(self):
+        data = {"numbers": [float("nan"), float("inf"), -float("inf")]}
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+        self.assertEqual(ORJSONRenderer().render(data), b'{"numbers":[null,null,null]}')
+
+    def test_render_fallbacks(self):
+        self.assertSameRender({"big": 2**70})
+        self.assertSameRender({"a": [1, 2]}, "application/json; indent=4")
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_parse(self):
+        body = JSONRenderer().render(
+            {"name": "خرید", "expense": 2**70, "members": [{"coefficient": 2}]}
+        )
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body))
+        )
+
+    def test_parse_errors(self):
+        for body in (b"{", b'{"a": NaN}', b"[1,]"):
+            with self.assertRaises(ParseError) as expected:
+                JSONParser().parse(io.BytesIO(body))
+            with self.assertRaises(ParseError) as parsed:
+                ORJSONParser().parse(io.BytesIO(body))
+            self.assertEqual(str(parsed.exception), str(expected.exception))
+
+
+class OwnerAPITestCase(TestCase):
+    """
+    a user with an API client logged in as them. the caches are emptied first, the throttles and the cached period
+    details are kept in them.
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches[PERIOD_DETAIL_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create(
+            username="owner", email="owner@example.com"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_period(self, persons: int = 3, name: str = "period") -> Period:
+        period = Period.objects.create(name=name, owner=self.user)
+        period.persons.set(
+            [
+                Person.objects.create(name=f"{name} person {index}", owner=self.user)
+                for index in range(persons)
+            ]
+        )
+        return period
+
+    def purchase_data(self, period: Period, name: str = "purchase", **data) -> dict:
+        """the request data of a purchase made by the first person for every person of the period."""
+        persons = list(period.persons.order_by("name"))
+        return {
+            "name": name,
+            "expense": 1200,
+            "buyer": persons[0].pk,
+            "period": period.pk,
+            "purchased_for_users": [
+                {"person": person.pk, "coefficient": 1} for person in persons
+            ],
+            **data,
+        }
+
+    def count_queries(self, method: str, *args, **kwargs) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(*args, format="json", **kwargs)
+        self.assertLess(response.status_code, 300, response.data)
+        return len(queries)
+
+
+class PurchaseWriteQueryTests(OwnerAPITestCase):
+    """the queries of a purchase write, response included, do not depend on the number of its members."""
+
+    def test_create(self):
+        counts = [
+            self.count_queries(
+                "post",
+                "/v1/api/purchase/",
+                self.purchase_data(
+                    self.create_period(members, name=f"period {members}")
+                ),
+            )
+            for members in (3, 30)
+        ]
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_create(self):
+        counts = []
+        for purchases, members in ((2, 3), (10, 6)):
+            period = self.create_period(members, name=f"period {purchases}")
+            items = [
+                self.purchase_data(period, name=f"purchase {index}")
+                for index in range(purchases)
+            ]
+            # few enough rows for every bulk insert to fit in one query on SQLite.
+            counts.append(
+                self.count_queries(
+                    "post",
+                    f"/v1/api/period/{period.pk}/purchases/",
+                    {"purchases": items},
+                )
+            )
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update(self):
+        counts = []
+        for members in (3, 30):
+            period = self.create_period(members, name=f"period {members}")
+            response = self.client.post(
+                "/v1/api/purchase/", self.purchase_data(period), format="json"
+            )
+            data = self.purchase_data(period)
+            for membership in data["purchased_for_users"]:
+                membership["coefficient"] = 2
+            counts.append(
+                self.count_queries(
+                    "put", f"/v1/api/purchase/{response.data['id']}/", data
+                )
+            )
+        self.assertEqual(counts[0], counts[1])
+
+        for membership in data["purchased_for_users"]:
+            membership["coefficient"] = 3
+        with self.assertNumQueries(counts[1]):
+            response = self.client.put(
+                f"/v1/api/purchase/{response.data['id']}/", data, format="json"
+            )
+        self.assertEqual(len(response.data["purchased_for_users"]), 30)
+        self.assertEqual(response.data["purchased_for_users"][0]["coefficient"], 3)
+
+
+class PeriodDetailCacheTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_cache_stats()
+        self.period = self.create_period()
+        self.client.post(
+            "/v1/api/purchase/", self.purchase_data(self.period), format="json"
+        )
+        self.url = f"/v1/api/period/{self.period.pk}/"
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def assertWriteInvalidates(self, write):
+        missed, _ = self.get()
+        version = get_period_version(self.period.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertNotEqual(get_period_version(self.period.pk), version)
+
+        stats = cache_stats()
+        response, _ = self.get()
+        self.assertEqual(cache_stats()["misses"], stats["misses"] + 1)
+        self.assertNotEqual(response.content, missed.content)
+        return response
+
+    def test_second_read_is_a_hit(self):
+        response, uncached = self.get()
+        self.assertEqual(cache_stats(), {"hits": 0, "misses": 1})
+
+        cached_response, cached = self.get()
+        self.assertEqual(cache_stats(), {"hits": 1, "misses": 1})
+        self.assertLess(cached, uncached)
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_purchase_write_invalidates(self):
+        response = self.assertWriteInvalidates(
+            lambda: self.count_queries(
+                "post",
+                "/v1/api/purchase/",
+                self.purchase_data(self.period, name="another purchase"),
+            )
+        )
+        self.assertEqual(len(response.data["all_purchases"]), 2)
+
+    def test_person_write_invalidates(self):
+        # persons are renamed in the admin only.
+        person = self.period.persons.order_by("name").first()
+        person.name = "renamed"
+        response = self.assertWriteInvalidates(person.save)
+        self.assertIn("renamed", response.content.decode())
+
+    def test_period_write_invalidates(self):
+        data = {
+            "name": "renamed period",
+            "persons": list(self.period.persons.values_list("pk", flat=True)),
+        }
+        response = self.assertWriteInvalidates(
+            lambda: self.count_queries("put", self.url, data)
+        )
+        self.assertIn("renamed period", response.content.decode())
+
+
+class OwnerScopeTests(OwnerAPITestCase):
+    """the objects of another user are not found, whatever is asked of them."""
+
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period()
+        self.person = self.period.persons.order_by("name").first()
+        self.purchase_id = self.client.post(
+            "/v1/api/purchase/", self.purchase_data(self.period), format="json"
+        ).data["id"]
+        self.share = PeriodShare.objects.create(
+            period=self.period, expires_at=timezone.now() + timedelta(days=1)
+        )
+        self.other = APIClient()
+        self.other.force_authenticate(
+            get_user_model().objects.create(username="other", email="other@example.com")
+        )
+
+    def assertNotFound(self, method, url, data=None):
+        response = getattr(self.other, method)(url, data, format="json")
+        self.assertEqual(response.status_code, 404, url)
+
+    def test_period(self):
+        url = f"/v1/api/period/{self.period.pk}/"
+        self.assertNotFound("get", url)
+        self.assertNotFound("put", url, {"name": "taken", "persons": [self.person.pk]})
+        self.assertNotFound("delete", url)
+        for action in ("settle", "export/csv"):
+            self.assertNotFound("get", f"{url}{action}/")
+        self.assertNotFound("get", f"/v1/api/purchases/{self.period.pk}/")
+        self.assertEqual(Period.objects.get().name, "period")
+
+    def test_person(self):
+        url = f"/v1/api/person/{self.person.pk}/"
+        self.assertNotFound("get", url)
+        self.assertNotFound("delete", url)
+        self.assertTrue(Person.objects.filter(pk=self.person.pk).exists())
+
+    def test_purchase(self):
+        url = f"/v1/api/purchase/{self.purchase_id}/"
+        self.assertNotFound("get", url)
+        self.assertNotFound("put", url, self.purchase_data(self.period, name="taken"))
+        self.assertNotFound("delete", url)
+        self.assertEqual(Purchase.objects.get().name, "purchase")
+
+    def test_share(self):
+        url = f"/v1/api/share/period/{self.share.pk}/"
+        self.assertNotFound(
+            "put", url, {"period": self.period.pk, "expires_at": self.share.expires_at}
+        )
+        self.assertNotFound("delete", url)
+        self.assertNotFound("post", f"{url}snapshot/")
+        self.assertEqual(self.other.get("/v1/api/share/period/").data["results"], [])
+        self.assertTrue(PeriodShare.objects.filter(pk=self.share.pk).exists())
+
+    def test_owner_still_finds_them(self):
+        for url in (
+            f"/v1/api/period/{self.period.pk}/",
+            f"/v1/api/person/{self.person.pk}/",
+            f"/v1/api/purchase/{self.purchase_id}/",
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class KeysetPaginationTests(OwnerAPITestCase):
+    def walk(self, url: str, page_size: int) -> list[str]:
+        """follows the next links of a listing from its first page and returns the ids of every page."""
+        ids = []
+        response = self.client.get(url, {"page_size": page_size})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), page_size)
+            ids += [item["id"] for item in response.data["results"]]
+            if response.data["next"] is None:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_shares(self):
+        period = self.create_period()
+        expires_at = timezone.now() + timedelta(days=1)
+        # shares that expire at the same time are ordered by their id.
+        shares = [
+            PeriodShare.objects.create(
+                period=period, expires_at=expires_at + timedelta(hours=index % 3)
+            )
+            for index in range(7)
+        ]
+        other = get_user_model().objects.create(
+            username="other", email="other@example.com"
+        )
+        PeriodShare.objects.create(
+            period=Period.objects.create(name="period", owner=other),
+            expires_at=expires_at,
+        )
+        expected = [
+            share.pk
+            for share in sorted(shares, key=lambda share: (share.expires_at, share.pk))
+        ]
+        for page_size in (1, 2, 3, 7, 10):
+            self.assertEqual(
+                self.walk("/v1/api/share/period/", page_size), expected, page_size
+            )
+
+    def test_persons(self):
+        self.create_period(persons=5, name="first")
+        self.create_period(persons=4, name="second")
+        expected = list(
+            Person.objects.order_by("name", "id").values_list("pk", flat=True)
+        )
+        self.assertEqual(self.walk("/v1/api/person/", 2), expected)
+
+    def test_invalid_cursor(self):
+        # not base64, not JSON, too few values and a value that is not a date.
+        for cursor in (
+            "invalid",
+            "bm90IGpzb24=",
+            "WzFd",
+            "WyJub3QgYSBkYXRlIiwgIngiXQ==",
+        ):
+            response = self.client.get("/v1/api/share/period/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.data["detail"], "Invalid cursor")
+
+
+class LedgerTests(OwnerAPITestCase):
+    """
+    the ledger rows kept up to date on every write match what :func:`api.settlement.settle` calculates from the
+    purchases of the period. expenses split evenly between the coefficients, so both sides are exact.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period(4)
+        self.persons = list(self.period.persons.order_by("name"))
+
+    def post_purchase(self, buyer: int, expense: int, coefficients: dict) -> str:
+        response = self.client.post(
+            "/v1/api/purchase/",
+            self.purchase_data(
+                self.period,
+                name=f"purchase {Purchase.objects.count()}",
+                expense=expense,
+                buyer=self.persons[buyer].pk,
+                purchased_for_users=[
+                    {"person": self.persons[index].pk, "coefficient": coefficient}
+                    for index, coefficient in coefficients.items()
+                ],
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def assertLedgerMatches(self, period: Period):
+        purchases = [
+            (
+                purchase,
+                [
+                    (membership.person, membership.coefficient)
+                    for membership in purchase.purchased_for_users.all()
+                ],
+            )
+            for purchase in get_period_purchases(period)
+        ]
+        expected = settle(
+            (purchase.buyer, purchase.expense, memberships)
+            for purchase, memberships in purchases
+        )
+
+        self.assertEqual(
+            detail_by_person(period_ledger_detail(period)), detail_by_person(expected)
+        )
+        self.assertEqual(
+            {
+                balance.person_id: (balance.direct_cost, balance.final_cost)
+                for balance in PeriodBalance.objects.filter(period=period)
+            },
+            {
+                item["person"].pk: (item["direct_cost"], item["final_cost"])
+                for item in expected
+            },
+        )
+        entry_fields = (
+            "purchase_id",
+            "person_id",
+            "creditor_id",
+            "direct_cost",
+            "final_cost",
+        )
+        self.assertCountEqual(
+            PurchaseLedgerEntry.objects.filter(period=period).values_list(
+                *entry_fields
+            ),
+            [
+                tuple(getattr(entry, field) for field in entry_fields)
+                for purchase, memberships in purchases
+                for entry in purchase_entries(purchase, memberships)
+            ],
+        )
+        # the gross debts add up to what the entries owe.
+        for debt in PeriodDebt.objects.filter(period=period):
+            self.assertEqual(
+                debt.amount,
+                sum(
+                    PurchaseLedgerEntry.objects.filter(
+                        period=period, person=debt.debtor, creditor=debt.creditor
+                    ).values_list("final_cost", flat=True)
+                ),
+            )
+
+    def test_create(self):
+        self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        self.assertLedgerMatches(self.period)
+        self.post_purchase(1, 600, {0: 1, 1: 1, 3: 1})
+        self.post_purchase(3, 3000, {0: 1, 2: 1})
+        self.assertLedgerMatches(self.period)
+        self.assertEqual(PeriodDebt.objects.filter(period=self.period).count(), 6)
+
+    def test_update(self):
+        self.post_purchase(1, 600, {0: 1, 1: 1, 3: 1})
+        purchase_id = self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        response = self.client.put(
+            f"/v1/api/purchase/{purchase_id}/",
+            self.purchase_data(
+                self.period,
+                name="updated",
+                expense=2400,
+                buyer=self.persons[2].pk,
+                purchased_for_users=[
+                    {"person": self.persons[0].pk, "coefficient": 1},
+                    {"person": self.persons[1].pk, "coefficient": 2},
+                    {"person": self.persons[2].pk, "coefficient": 3},
+                ],
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertLedgerMatches(self.period)
+
+    def test_memberships(self):
+        purchase_id = self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        response = self.client.put(
+            f"/v1/api/purchase/{purchase_id}/",
+            self.purchase_data(
+                self.period,
+                name="updated",
+                expense=1200,
+                purchased_for_users=[
+                    {"person": self.persons[1].pk, "coefficient": 1},
+                    {"person": self.persons[3].pk, "coefficient": 2},
+                ],
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertLedgerMatches(self.period)
+
+        # memberships changed outside the api, the admin for example.
+        purchase = Purchase.objects.get(pk=purchase_id)
+        PurchaseMembership.objects.create(
+            purchase=purchase, person=self.persons[2], coefficient=3
+        )
+        self.assertLedgerMatches(self.period)
+        PurchaseMembership.objects.filter(
+            purchase=purchase, person=self.persons[1]
+        ).delete()
+        self.assertLedgerMatches(self.period)
+
+    def test_delete_purchase(self):
+        self.post_purchase(1, 600, {0: 1, 1: 1, 3: 1})
+        purchase_id = self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        response = self.client.delete(f"/v1/api/purchase/{purchase_id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertLedgerMatches(self.period)
+        self.assertFalse(
+            PurchaseLedgerEntry.objects.filter(purchase_id=purchase_id).exists()
+        )
+
+    def test_delete_person(self):
+        self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        self.post_purchase(1, 600, {0: 1, 1: 1, 3: 1})
+        self.post_purchase(3, 3000, {0: 1, 2: 1})
+        # a member of purchases, then the buyer of one.
+        self.persons[2].delete()
+        self.assertLedgerMatches(self.period)
+        self.persons[3].delete()
+        self.assertLedgerMatches(self.period)
+        self.assertEqual(Purchase.objects.filter(period=self.period).count(), 2)
+
+    def test_delete_period(self):
+        other = self.create_period(name="other")
+        other.persons.add(*self.persons)
+        self.post_purchase(0, 1200, {0: 1, 1: 2, 2: 3})
+        self.period, deleted = other, self.period
+        self.post_purchase(1, 600, {0: 1, 1: 1, 3: 1})
+
+        response = self.client.delete(f"/v1/api/period/{deleted.pk}/")
+        self.assertEqual(response.status_code, 204)
+        for model in (PeriodBalance, PeriodDebt, PurchaseLedgerEntry):
+            self.assertFalse(model.objects.filter(period_id=deleted.pk).exists())
+        self.assertLedgerMatches(other)
+
+
+class ConditionalRequestTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period()
+        self.client.post(
+            "/v1/api/purchase/", self.purchase_data(self.period), format="json"
+        )
+        self.url = f"/v1/api/period/{self.period.pk}/"
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.period.refresh_from_db()
+        self.assertEqual(response["ETag"], get_validators(self.period)[0])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], get_validators(self.period)[0])
+
+    def test_purchase_write_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        modified_at = Period.objects.get().modified_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/v1/api/purchase/",
+                self.purchase_data(self.period, name="another purchase"),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(Period.objects.get().modified_at, modified_at)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["all_purchases"]), 2)
+
+    def test_share_uses_period_validators(self):
+        share = PeriodShare.objects.create(
+            period=self.period, expires_at=timezone.now() + timedelta(days=1)
+        )
+        url = f"/v1/api/share/{share.sharing_id}/"
+        client = APIClient()
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.period.refresh_from_db()
+        etag, last_modified = get_validators(self.period)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response["Last-Modified"], http_date(last_modified))
+        self.assertEqual(response["ETag"], self.client.get(self.url)["ETag"])
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_period_write_changes_purchase_etag(self):
+        url = f"/v1/api/purchase/{Purchase.objects.get().pk}/"
+        etag = self.client.get(url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                self.url,
+                {
+                    "name": "renamed",
+                    "persons": list(self.period.persons.values_list("pk", flat=True)),
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(
+            response["ETag"],
+            get_validators(Purchase.objects.select_related("period").get())[0],
+        )
+
+    def test_stale_etags(self):
+        etag = self.client.get(self.url)["ETag"]
+        for stale in ('"stale"', 'W/"stale"', f'W/{etag[:-1]}0"'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=stale)
+            self.assertEqual(response.status_code, 200, stale)
+            self.assertEqual(response["ETag"], etag)
+
+
+class BulkPurchaseTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period()
+        self.url = f"/v1/api/period/{self.period.pk}/purchases/"
+        stranger = Person.objects.create(name="stranger", owner=self.user)
+        self.items = [
+            self.purchase_data(self.period, name="first"),
+            # the buyer is not a member of the period.
+            self.purchase_data(self.period, name="invalid", buyer=stranger.pk),
+            self.purchase_data(self.period, name="second"),
+        ]
+
+    def test_atomic(self):
+        response = self.client.post(self.url, {"purchases": self.items}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], ERROR_MESSAGES["bulk_item_invalid"])
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1])
+        self.assertFalse(Purchase.objects.exists())
+        self.assertFalse(PurchaseMembership.objects.exists())
+        self.assertFalse(PurchaseLedgerEntry.objects.exists())
+
+    def test_partial(self):
+        response = self.client.post(
+            self.url, {"purchases": self.items, "partial": True}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [purchase["name"] for purchase in response.data["created"]],
+            ["first", "second"],
+        )
+        self.assertEqual(len(response.data["errors"]), 1)
+        error = response.data["errors"][0]
+        self.assertEqual(error["index"], 1)
+        self.assertEqual(
+            error["errors"]["buyer"], [ERROR_MESSAGES["not_period_member"]]
+        )
+        self.assertCountEqual(
+            Purchase.objects.values_list("name", flat=True), ["first", "second"]
+        )
+        self.assertEqual(PurchaseMembership.objects.count(), 6)
+        self.assertEqual(
+            sum(PeriodBalance.objects.values_list("direct_cost", flat=True)), 2400
+        )
+
+    def test_partial_without_valid_items(self):
+        response = self.client.post(
+            self.url, {"purchases": self.items[1:2], "partial": True}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], [])
+        self.assertEqual(len(response.data["errors"]), 1)
+        self.assertFalse(Purchase.objects.exists())
+
+
+@skipIf(np is None, "numpy is not installed")
+class SettlementBackendTests(TestCase):
+    def test_numpy_matches_python(self):
+        owner = get_user_model().objects.create(
+            username="owner", email="owner@example.com"
+        )
+        for seed, skew in ((1, 0), (2, 1.2)):
+            period = synthetic.create_period(
+                random.Random(seed),
+                owner,
+                f"period {seed}",
+                persons=12,
+                purchases=300,
+                skew=skew,
+            )
+            # zero coefficients must not leave zero amount relations behind in either engine.
+            PurchaseMembership.objects.filter(
+                purchase__period=period, coefficient=1
+            ).update(coefficient=0)
+            python_detail = settle_purchases(get_period_purchases(period))
+            numpy_detail = settle_period(period)
+            self.assertEqual(
+                [item["person"].pk for item in numpy_detail],
+                [item["person"].pk for item in python_detail],
+            )
+            self.assertEqual(
+                detail_by_person(numpy_detail), detail_by_person(python_detail)
+            )
+
+
+class SettleTests(SimpleTestCase):
+    """hand computed results of :func:`api.settlement.settle`, keyed like :func:`detail_by_person` returns them."""
+
+    def setUp(self):
+        self.a, self.b, self.c = (Person(id=pk) for pk in "abc")
+
+    def settle(self, purchases: list) -> dict:
+        detail = settle(purchases)
+        for item in detail:
+            amounts = item["owe_to"] + item["creditor_of"]
+            self.assertTrue(all(amount["amount"] > 0 for amount in amounts), item)
+            owe_to = {owe["person"].pk for owe in item["owe_to"]}
+            creditor_of = {credit["person"].pk for credit in item["creditor_of"]}
+            self.assertFalse(owe_to & creditor_of, item)
+        return detail_by_person(detail)
+
+    def test_mutual_debts_cancel_partly(self):
+        detail = self.settle(
+            [(self.a, 300, [(self.b, 1)]), (self.b, 100, [(self.a, 1)])]
+        )
+        self.assertEqual(
+            detail,
+            {"a": (300, 100, {}, {"b": 200}), "b": (100, 300, {"a": 200}, {})},
+        )
+
+    def test_mutual_debts_cancel_fully(self):
+        detail = self.settle(
+            [(self.a, 100, [(self.b, 1)]), (self.b, 100, [(self.a, 1)])]
+        )
+        self.assertEqual(detail, {"a": (100, 100, {}, {}), "b": (100, 100, {}, {})})
+
+    def test_buyer_is_member(self):
+        detail = self.settle([(self.a, 600, [(self.a, 1), (self.b, 2), (self.c, 3)])])
+        self.assertEqual(
+            detail,
+            {
+                "a": (600, 100, {}, {"b": 200, "c": 300}),
+                "b": (0, 200, {"a": 200}, {}),
+                "c": (0, 300, {"a": 300}, {}),
+            },
+        )
+
+    def test_zero_coefficient(self):
+        detail = self.settle([(self.a, 300, [(self.b, 1), (self.c, 0)])])
+        self.assertEqual(
+            detail,
+            {
+                "a": (300, 0, {}, {"b": 300}),
+                "b": (0, 300, {"a": 300}, {}),
+                "c": (0, 0, {}, {}),
+            },
+        )
+        detail = self.settle([(self.a, 300, [(self.b, 0)])])
+        self.assertEqual(detail, {"a": (300, 0, {}, {}), "b": (0, 0, {}, {})})
+
+    def test_purchases_between_a_pair(self):
+        detail = self.settle(
+            [
+                (self.a, 100, [(self.b, 1)]),
+                (self.a, 50, [(self.a, 1), (self.b, 1)]),
+                (self.b, 30, [(self.a, 1)]),
+            ]
+        )
+        self.assertEqual(
+            detail,
+            {"a": (150, 55, {}, {"b": 95}), "b": (30, 125, {"a": 95}, {})},
+        )
+
+    def test_net_balances(self):
+        balances = {person.pk: new_balance(person) for person in (self.a, self.b)}
+        balances["a"]["owe_to"]["b"] = balances["b"]["creditor_of"]["a"] = 50
+        balances["a"]["creditor_of"]["b"] = balances["b"]["owe_to"]["a"] = 80
+        detail = detail_by_person(net_balances(balances))
+        self.assertEqual(
+            detail, {"a": (0, 0, {}, {"b": 30}), "b": (0, 0, {"a": 30}, {})}
+        )
+
+
+class MinimumTransfersTests(SimpleTestCase):
+    def random_purchases(self, rnd: random.Random, persons: list[Person]) -> list:
+        return [
+            (
+                rnd.choice(persons),
+                rnd.randint(1, 100_000),
+                [
+                    (person, rnd.randint(1, 5))
+                    for person in rnd.sample(persons, rnd.randint(1, len(persons)))
+                ],
+            )
+            for _ in range(50)
+        ]
+
+    def test_apportion(self):
+        self.assertEqual(apportion(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(apportion(10, [1, 2, 3]), [2, 3, 5])
+        self.assertEqual(apportion(7, [0, 1]), [0, 7])
+        self.assertEqual(apportion(7, [0, 0]), [0, 0])
+        rnd = random.Random(1)
+        for _ in range(200):
+            expense = rnd.randint(0, 1_000_000)
+            coefficients = [rnd.randint(1, 9) for _ in range(rnd.randint(1, 12))]
+            shares = apportion(expense, coefficients)
+            self.assertEqual(sum(shares), expense)
+            for share, coefficient in zip(shares, coefficients):
+                exact = expense * coefficient / sum(coefficients)
+                self.assertLess(abs(share - exact), 1)
+
+    def test_balances_and_transfers(self):
+        rnd = random.Random(2)
+        for size in (1, 2, 5, 20):
+            persons = [Person(id=f"person-{index}") for index in range(size)]
+            balances = person_balances(self.random_purchases(rnd, persons))
+            self.assertEqual(
+                sum(balance["balance"] for balance in balances.values()), 0
+            )
+            for balance in balances.values():
+                self.assertIsInstance(balance["balance"], int)
+
+            transfers = minimum_transfers(balances)
+            remaining = {pk: balance["balance"] for pk, balance in balances.items()}
+            for transfer in transfers:
+                self.assertGreater(transfer["amount"], 0)
+                remaining[transfer["debtor"].pk] += transfer["amount"]
+                remaining[transfer["creditor"].pk] -= transfer["amount"]
+            self.assertEqual(set(remaining.values()), {0})
+            unsettled = sum(1 for balance in balances.values() if balance["balance"])
+            self.assertLessEqual(len(transfers), max(unsettled - 1, 0))
+
+    def test_settled(self):
+        person = Person(id="person")
+        balances = person_balances([(person, 100, [(person, 1)])])
+        self.assertEqual(balances, {"person": {"person": person, "balance": 0}})
+        self.assertEqual(minimum_transfers(balances), [])
+
+
+class SettleRouteTests(OwnerAPITestCase):
+    def test_response(self):
+        period = self.create_period()
+        persons = list(period.persons.order_by("pk"))
+        with self.captureOnCommitCallbacks(execute=True):
+            for data in (
+                self.purchase_data(period, buyer=persons[0].pk),
+                self.purchase_data(
+                    period,
+                    name="another purchase",
+                    expense=300,
+                    buyer=persons[1].pk,
+                    purchased_for_users=[{"person": persons[2].pk, "coefficient": 1}],
+                ),
+            ):
+                response = self.client.post("/v1/api/purchase/", data, format="json")
+                self.assertEqual(response.status_code, 201, response.data)
+
+        def person(index):
+            return {
+                "id": persons[index].pk,
+                "name": persons[index].name,
+                "user": None,
+                "owner": self.user.pk,
+            }
+
+        response = self.client.get(f"/v1/api/period/{period.pk}/settle/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "balances": [
+                    {"person": person(0), "balance": 800},
+                    {"person": person(1), "balance": -100},
+                    {"person": person(2), "balance": -700},
+                ],
+                "transfers": [
+                    {"debtor": person(2), "creditor": person(0), "amount": 700},
+                    {"debtor": person(1), "creditor": person(0), "amount": 100},
+                ],
+            },
+        )
+
+
+class MetricsRouteTests(OwnerAPITestCase):
+    def test_url_names_are_unique(self):
+        names = [pattern.name for pattern in router.urls]
+        self.assertCountEqual(names, set(names))
+
+    def test_routes_are_labelled_apart(self):
+        period = self.create_period()
+        purchase = self.client.post(
+            "/v1/api/purchase/", self.purchase_data(period), format="json"
+        ).data
+        self.client.get(f"/v1/api/purchase/{purchase['id']}/")
+        self.client.get(f"/v1/api/purchases/{period.pk}/")
+
+        routes = {
+            dict(labels)["route"]
+            for name, labels in metrics.store.counters
+            if name == "dangdong_http_requests_total"
+        }
+        self.assertIn("api:purchase-detail", routes)
+        self.assertIn("api:period-purchases-detail", routes)
+
+
+class MetricsStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.store = metrics.MetricsStore(directory.name, 60)
+
+    def test_collect_sums_processes(self):
+        labels = [["route", "api:period-detail"], ["method", "GET"]]
+        for pid, (value, counts, total) in {
+            101: (2, [1, 2], 1.5),
+            102: (3, [0, 1], 4.0),
+        }.items():
+            (self.directory / f"{pid}.json").write_text(
+                json.dumps(
+                    {
+                        "counters": [["requests", labels, value]],
+                        "histograms": [["queries", labels, [1, 5], counts, total, 2]],
+                    }
+                )
+            )
+        self.store.inc("requests", dict(labels), 10)
+
+        counters, histograms = self.store.collect()
+        key = tuple(map(tuple, labels))
+        self.assertEqual(counters, {("requests", key): 15})
+        self.assertEqual(histograms, {("queries", key): [[1, 5], [1, 3], 5.5, 4]})
+        self.assertTrue((self.directory / f"{os.getpid()}.json").exists())
+
+    def test_render(self):
+        self.store.inc(
+            "dangdong_http_requests_total",
+            {"route": "api:period-detail", "method": "GET", "status": "200"},
+            2,
+        )
+        self.store.observe(
+            "dangdong_http_request_queries",
+            {"route": 'a "quoted"\nroute', "method": "GET"},
+            3,
+            (1, 5),
+        )
+        with mock.patch("api.metrics.store", self.store):
+            for hit in (True, True, True, False):
+                metrics.cache_lookup(hit)
+            text = metrics.render()
+
+        self.assertEqual(
+            text,
+            "# HELP dangdong_http_requests_total Requests handled, by route, method and status.\n"
+            "# TYPE dangdong_http_requests_total counter\n"
+            'dangdong_http_requests_total{route="api:period-detail",method="GET",status="200"} 2\n'
+            "# HELP dangdong_http_request_duration_seconds Time spent handling a request, by route, method and "
+            "status.\n"
+            "# TYPE dangdong_http_request_duration_seconds histogram\n"
+            "# HELP dangdong_http_request_queries Database queries made by a request, by route and method.\n"
+            "# TYPE dangdong_http_request_queries histogram\n"
+            'dangdong_http_request_queries_bucket{route="a \\"quoted\\"\\nroute",method="GET",le="1"} 0\n'
+            'dangdong_http_request_queries_bucket{route="a \\"quoted\\"\\nroute",method="GET",le="5"} 1\n'
+            'dangdong_http_request_queries_bucket{route="a \\"quoted\\"\\nroute",method="GET",le="+Inf"} 1\n'
+            'dangdong_http_request_queries_sum{route="a \\"quoted\\"\\nroute",method="GET"} 3\n'
+            'dangdong_http_request_queries_count{route="a \\"quoted\\"\\nroute",method="GET"} 1\n'
+            "# HELP dangdong_period_detail_cache_requests_total Period detail cache lookups, by result.\n"
+            "# TYPE dangdong_period_detail_cache_requests_total counter\n"
+            'dangdong_period_detail_cache_requests_total{result="hit"} 3\n'
+            'dangdong_period_detail_cache_requests_total{result="miss"} 1\n'
+            "# HELP dangdong_period_detail_cache_hit_ratio Share of the period detail cache lookups that were "
+            "hits.\n"
+            "# TYPE dangdong_period_detail_cache_hit_ratio gauge\n"
+            "dangdong_period_detail_cache_hit_ratio 0.75\n",
+        )
+
+
+class MetricsViewTests(OwnerAPITestCase):
+    url = "/v1/api/metrics/"
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response["Content-Type"].startswith("text/plain; version=0.0.4")
+        )
+        self.assertIn(
+            "# TYPE dangdong_http_requests_total counter", response.content.decode()
+        )
+
+
+class ServerTimingTests(OwnerAPITestCase):
+    def test_opt_in(self):
+        url = f"/v1/api/period/{self.create_period().pk}/"
+        self.assertNotIn("Server-Timing", self.client.get(url))
+
+        with mock.patch("api.instrumentation.SERVER_TIMING", True):
+            response = self.client.get(url)
+        self.assertIn("db;", response["Server-Timing"])
+
+
+class PurchaseImportTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period()
+        self.url = f"/v1/api/period/{self.period.pk}/import/csv/"
+        self.header = "name,date_and_time,expense,buyer,purchased_for\n"
+        self.row = "{},,1200,period person 0,period person 0;period person 1:2\n"
+
+    def post(self, content: bytes):
+        return self.client.post(
+            self.url,
+            {"file": SimpleUploadedFile("purchases.csv", content)},
+            format="multipart",
+        )
+
+    def test_import(self):
+        response = self.post(
+            (self.header + self.row.format("first") + self.row.format("")).encode()
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["rows"], 2)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+
+    def test_malformed_csv(self):
+        # a field over the field size limit of the csv module.
+        content = (
+            self.header + self.row.format("first") + self.row.format("x" * 200_000)
+        )
+        response = self.post(content.encode())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data["detail"], ERROR_MESSAGES["malformed_import_file"]
+        )
+        self.assertEqual(response.data["rows"], 2)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+        self.assertIn("malformed CSV", response.data["errors"][0]["errors"])
+
+    def test_not_utf8(self):
+        response = self.post((self.header + self.row.format("é")).encode("latin-1"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["row"], 1)
+        self.assertFalse(Purchase.objects.exists())
+
+
+class PeriodDetailQueryTests(OwnerAPITestCase):
+    """the queries of the period detail do not depend on the number of persons and purchases of the period."""
+
+    def assertFlatQueries(self, backend: str):
+        small, large = (
+            synthetic.create_period(
+                random.Random(persons),
+                self.user,
+                f"{backend} {persons}",
+                persons=persons,
+                purchases=purchases,
+            )
+            for persons, purchases in ((4, 10), (30, 300))
+        )
+        with mock.patch("api.read_serializers.SETTLEMENT_BACKEND", backend):
+            queries = self.count_queries("get", f"/v1/api/period/{small.pk}/")
+            with self.assertNumQueries(queries):
+                response = self.client.get(f"/v1/api/period/{large.pk}/")
+        self.assertEqual(response.data["general_information"]["purchase_count"], 300)
+
+    def test_python_backend(self):
+        self.assertFlatQueries("python")
+
+    def test_ledger_backend(self):
+        self.assertFlatQueries("ledger")
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_numpy_backend(self):
+        self.assertFlatQueries("numpy")
+
+
+class PeriodPurchasesQueryTests(OwnerAPITestCase):
+    """the queries of a page of period purchases do not depend on the number of purchases in it."""
+
+    def test_flat_queries(self):
+        small, large = (
+            synthetic.create_period(
+                random.Random(persons),
+                self.user,
+                f"period {persons}",
+                persons=persons,
+                purchases=purchases,
+            )
+            for persons, purchases in ((4, 3), (30, 300))
+        )
+        queries = self.count_queries("get", f"/v1/api/purchases/{small.pk}/")
+        with self.assertNumQueries(queries):
+            response = self.client.get(
+                f"/v1/api/purchases/{large.pk}/", {"page_size": 100}
+            )
+        self.assertEqual(len(response.data["results"]), 100)
+        self.assertIsNotNone(response.data["next"])
+
+
+class PeriodDetailRenderTests(TestCase):
+    """the flat read path renders the period detail byte for byte like the nested model serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(
+            username="owner", email="owner@example.com"
+        )
+        cls.period = synthetic.create_period(
+            random.Random(0), cls.user, "period", persons=8, purchases=60
+        )
+        persons = list(cls.period.persons.order_by("name"))
+        persons[0].user = cls.user
+        persons[0].save()
+        # a person who left the period keeps their purchases, another one has none.
+        cls.period.persons.remove(persons[1])
+        cls.period.persons.add(Person.objects.create(name="newcomer", owner=cls.user))
+
+    def assertSameRender(self, backend: str):
+        with mock.patch("api.read_serializers.SETTLEMENT_BACKEND", backend), mock.patch(
+            "api.utils.SETTLEMENT_BACKEND", backend
+        ):
+            expected = JSONRenderer().render(serialize_period_detail(self.period))
+            self.assertEqual(
+                JSONRenderer().render(render_period_detail(self.period)), expected
+            )
+            self.assertEqual(
+                JSONRenderer().render(
+                    async_to_sync(arender_period_detail)(self.period)
+                ),
+                expected,
+            )
+
+    def test_python_backend(self):
+        self.assertSameRender("python")
+
+    def test_ledger_backend(self):
+        self.assertSameRender("ledger")
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_numpy_backend(self):
+        self.assertSameRender("numpy")
+
+
+class SnapshotTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period()
+        self.client.post(
+            "/v1/api/purchase/", self.purchase_data(self.period), format="json"
+        )
+        self.expires_at = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.client.post(
+            "/v1/api/share/period/",
+            {
+                "period": self.period.pk,
+                "expires_at": self.expires_at,
+                "is_snapshot": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.share = PeriodShare.objects.get(pk=response.data["id"])
+        self.url = f"/v1/api/share/{self.share.sharing_id}/"
+        self.visitor = APIClient()
+
+    def live_detail(self) -> bytes:
+        return self.client.get(f"/v1/api/period/{self.period.pk}/").content
+
+    def test_take_and_drop(self):
+        self.assertIsNotNone(self.share.snapshot_at)
+        self.assertEqual(self.visitor.get(self.url).content, self.live_detail())
+        with self.assertNumQueries(1):
+            self.visitor.get(self.url)
+
+        response = self.client.put(
+            f"/v1/api/share/period/{self.share.pk}/",
+            {
+                "period": self.period.pk,
+                "expires_at": self.expires_at,
+                "is_snapshot": False,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.share.refresh_from_db()
+        self.assertIsNone(self.share.snapshot)
+        self.assertIsNone(self.share.snapshot_at)
+        # served live again.
+        response = self.visitor.get(self.url)
+        self.assertNotIn("Content-Encoding", response)
+        self.period.refresh_from_db()
+        self.assertEqual(response["ETag"], get_validators(self.period)[0])
+
+    def test_encoding(self):
+        response = self.visitor.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), self.live_detail())
+
+        response = self.visitor.get(self.url, HTTP_ACCEPT_ENCODING="br")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response.content, self.live_detail())
+
+    def test_frozen(self):
+        frozen = self.visitor.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/v1/api/purchase/",
+                self.purchase_data(self.period, name="another purchase"),
+                format="json",
+            )
+            self.client.put(
+                f"/v1/api/period/{self.period.pk}/",
+                {
+                    "name": "renamed",
+                    "persons": list(self.period.persons.values_list("pk", flat=True)),
+                },
+                format="json",
+            )
+
+        response = self.visitor.get(self.url)
+        self.assertEqual(response.content, frozen.content)
+        self.assertEqual(response["ETag"], frozen["ETag"])
+        self.assertNotEqual(self.live_detail(), frozen.content)
+        response = self.visitor.get(self.url, HTTP_IF_NONE_MATCH=frozen["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        # a new snapshot catches up with the period.
+        response = self.client.post(f"/v1/api/share/period/{self.share.pk}/snapshot/")
+        self.assertEqual(response.status_code, 200)
+        response = self.visitor.get(self.url)
+        self.assertEqual(response.content, self.live_detail())
+        self.assertNotEqual(response["ETag"], frozen["ETag"])
+
+
+class ExportImportTests(OwnerAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = self.create_period(4)
+        persons = list(self.period.persons.order_by("name"))
+        started = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        for index, (buyer, coefficients) in enumerate(
+            ((0, (1, 2, 0, 1)), (1, (1, 1, 1, 1)), (3, (0, 3, 1, 0)), (2, (2, 0, 0, 1)))
+        ):
+            response = self.client.post(
+                "/v1/api/purchase/",
+                self.purchase_data(
+                    self.period,
+                    name=f"purchase, {index}",
+                    expense=1000 + 7 * index,
+                    buyer=persons[buyer].pk,
+                    date_and_time=(started + timedelta(hours=index)).isoformat(),
+                    purchased_for_users=[
+                        {"person": person.pk, "coefficient": coefficient}
+                        for person, coefficient in zip(persons, coefficients)
+                        if coefficient
+                    ],
+                ),
+                format="json",
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+
+    def export(self, period: Period, export_format: str) -> bytes:
+        response = self.client.get(
+            f"/v1/api/period/{period.pk}/export/{export_format}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def records(self, period: Period) -> tuple[list, list]:
+        """
+        the purchases of the export with their memberships, and the balances. purchase ids differ between copies and
+        memberships are exported in the order of their random ids, so both are left out of the comparison.
+        """
+        purchases, balances = [], []
+        for line in self.export(period, "ndjson").splitlines():
+            record = json.loads(line)
+            record.pop("purchase_id", None)
+            if record["type"] == "purchase":
+                purchases.append((record, []))
+            elif record["type"] == "membership":
+                purchases[-1][1].append(record)
+            else:
+                balances.append(record)
+        for _, memberships in purchases:
+            memberships.sort(key=lambda record: record["person_id"])
+        balances.sort(key=lambda record: record["person_id"])
+        return purchases, balances
+
+    def test_round_trip(self):
+        for export_format in ("csv", "ndjson"):
+            copy = Period.objects.create(name=f"copy {export_format}", owner=self.user)
+            copy.persons.set(self.period.persons.all())
+
+            response = self.client.post(
+                f"/v1/api/period/{copy.pk}/import/{export_format}/",
+                {
+                    "file": SimpleUploadedFile(
+                        f"period.{export_format}",
+                        self.export(self.period, export_format),
+                    )
+                },
+                format="multipart",
+            )
+
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(
+                response.data,
+                {"rows": 4, "created": 4, "error_count": 0, "errors": []},
+            )
+            self.assertEqual(self.records(copy), self.records(self.period))
+
+
+class AsyncViewTests(TransactionTestCase):
+    """the async read views, through the async test client. async views can not share the connection of a TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        caches[PERIOD_DETAIL_CACHE_ALIAS].clear()
+        owner, other = (
+            get_user_model().objects.create(username=name, email=f"{name}@example.com")
+            for name in ("owner", "other")
+        )
+        self.period = synthetic.create_period(
+            random.Random(0), owner, "period", persons=3, purchases=5
+        )
+        self.other_period = synthetic.create_period(
+            random.Random(1), other, "other", persons=2, purchases=1
+        )
+        self.headers = {
+            "Authorization": f"Bearer {RefreshToken.for_user(owner).access_token}"
+        }
+        self.url = f"/v1/api/async/period/{self.period.pk}/"
+
+    async def test_authentication(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+        response = await self.async_client.get(
+            self.url, headers={"Authorization": "Bearer invalid"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_other_owner(self):
+        for url in (
+            f"/v1/api/async/period/{self.other_period.pk}/",
+            f"/v1/api/async/purchases/{self.other_period.pk}/",
+        ):
+            response = await self.async_client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 404, url)
+
+    async def test_not_modified(self):
+        response = await self.async_client.get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)["general_information"]["purchase_count"], 5
+        )
+
+        response = await self.async_client.get(
+            self.url, headers={**self.headers, "If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    async def test_pagination(self):
+        url = f"/v1/api/async/purchases/{self.period.pk}/?page_size=3"
+        names = []
+        while url is not None:
+            response = await self.async_client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.content)
+            names += [purchase["name"] for purchase in page["results"]]
+            url = page["next"]
+            if url is not None:
+                self.assertTrue(url.startswith("http://testserver/v1/api/async/"))
+                self.assertIn("page_size=3", url)
+        self.assertEqual(len(names), 5)
+        self.assertEqual(len(set(names)), 5)
+
+    async def test_share(self):
+        share = await PeriodShare.objects.acreate(
+            period=self.period, expires_at=timezone.now() + timedelta(days=1)
+        )
+        url = f"/v1/api/async/share/{share.sharing_id}/"
+        # share links are public.
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)["general_information"]["purchase_count"], 5
+        )
+        await self.period.arefresh_from_db()
+        self.assertEqual(response["ETag"], get_validators(self.period)[0])
+
+        response = await self.async_client.get(
+            url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        expired = await PeriodShare.objects.acreate(
+            period=self.period, expires_at=timezone.now() - timedelta(days=1)
+        )
+        response = await self.async_client.get(
+            f"/v1/api/async/share/{expired.sharing_id}/"
+        )
+        self.assertEqual(response.status_code, 401)
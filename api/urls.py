@@ -1,9 +1,16 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
-from .views import (PeriodShareViewSet, PeriodShareViewSetRetrieve,
-                    PeriodViewSet, PersonViewSet, PurchaseViewSet,
-                    RetrievePurchaseViewSet)
+from .async_views import period_detail, period_purchases, period_share_detail
+from .views import (
+    MetricsView,
+    PeriodShareViewSet,
+    PeriodShareViewSetRetrieve,
+    PeriodViewSet,
+    PersonViewSet,
+    PurchaseViewSet,
+    RetrievePurchaseViewSet,
+)
 
 app_name = "api"
 
@@ -11,10 +18,16 @@ router = SimpleRouter()
 router.register("period", PeriodViewSet)
 router.register("person", PersonViewSet)
 router.register("purchase", PurchaseViewSet)
-router.register("purchases", RetrievePurchaseViewSet)
+# the basenames default to the model name, routes sharing a model need their own to keep the url names unique.
+router.register("purchases", RetrievePurchaseViewSet, basename="period-purchases")
 router.register("share/period", PeriodShareViewSet)
-router.register("share", PeriodShareViewSetRetrieve)
+router.register("share", PeriodShareViewSetRetrieve, basename="shared-period")
 
 urlpatterns = [
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    # async versions of the read paths, for deployments served over ASGI.
+    path("async/period/<str:pk>/", period_detail, name="async-period-detail"),
+    path("async/purchases/<str:pk>/", period_purchases, name="async-purchases-detail"),
+    path("async/share/<str:pk>/", period_share_detail, name="async-share-detail"),
     path("", include(router.urls)),
 ]
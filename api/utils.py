@@ -1,10 +1,25 @@
 from typing import TYPE_CHECKING
 
 from django.apps import apps  # type: ignore
-from django.db.models import Sum  # type: ignore
-
-from .serializers import (DetailSerializer, GeneralInformationSerializer,
-                          PeriodSerializer, PurchaseSerializerForRead)
+from django.db.models import QuerySet  # type: ignore
+from django.db.models import Prefetch, prefetch_related_objects
+
+from config.settings import SETTLEMENT_BACKEND
+
+from .caching import aget_cached_period_detail, get_cached_period_detail
+from .instrumentation import stage
+from .ledger import period_ledger_detail
+from .read_serializers import arender_period_detail, render_period_detail
+from .serializers import (
+    DetailSerializer,
+    GeneralInformationSerializer,
+    PeriodSerializer,
+    PersonBalanceSerializer,
+    PurchaseSerializerForRead,
+    TransferSerializer,
+)
+from .settlement import minimum_transfers, person_balances, settle
+from .vectorized import settle_period
 
 if TYPE_CHECKING:
     from .models import Purchase
@@ -51,159 +66,184 @@ def purchase_detail_calculator(purchase: "Purchase") -> list:
                 "creditor_of": creditor_of
     """
     PurchaseMembership = apps.get_model("api", "PurchaseMembership")
-    data = []
-    purchased_for_users_purchase_membership = PurchaseMembership.objects.filter(
-        purchase=purchase
-    )
-    coefficient_sum = purchased_for_users_purchase_membership.aggregate(
-        Sum("coefficient")
-    )["coefficient__sum"]
-    each_coefficient_share = purchase.expense / coefficient_sum
-    creditor_of = []
-    for purchased_for_user in purchased_for_users_purchase_membership.exclude(
-        person=purchase.buyer
-    ):
-        user_payment_share = each_coefficient_share * purchased_for_user.coefficient
-        creditor_of.append(
-            {"person": purchased_for_user.person, "amount": user_payment_share}
-        )
-        data.append(
-            purchase_detail_data_generator(
-                person=purchased_for_user.person,
-                owe_to=[{"person": purchase.buyer, "amount": user_payment_share}],
-                direct_cost=0,
-                final_cost=user_payment_share,
-                creditor_of=[],
-            )
-        )
-    buyer_purchase_membership = PurchaseMembership.objects.filter(
-        person=purchase.buyer, purchase=purchase
+    # no-op when the memberships are already loaded with get_purchase_queryset.
+    prefetch_related_objects(
+        [purchase],
+        Prefetch(
+            "purchased_for_users",
+            queryset=PurchaseMembership.objects.select_related("person"),
+        ),
     )
-    final_cost = 0
-    if buyer_purchase_membership.exists():
-        final_cost = (
-            each_coefficient_share * buyer_purchase_membership.first().coefficient
-        )
-    data.append(
-        purchase_detail_data_generator(
-            person=purchase.buyer,
-            owe_to=[],
-            direct_cost=purchase.expense,
-            final_cost=final_cost,
-            creditor_of=creditor_of,
+    memberships = [
+        (membership.person, membership.coefficient)
+        for membership in purchase.purchased_for_users.all()
+    ]
+    with stage("settlement"):
+        return settle([(purchase.buyer, purchase.expense, memberships)])
+
+
+def get_period_purchases(period) -> QuerySet:
+    """
+    Returns the purchases of the given period with their buyers, memberships and membership persons loaded up front,
+    so the settlement calculation and the read serializers run in a fixed number of queries no matter how many
+    purchases the period holds.
+
+    Args:
+        period (Period): The period to load the purchases of.
+
+    Returns:
+        QuerySet: The purchases of the period.
+    """
+    PurchaseMembership = apps.get_model("api", "PurchaseMembership")
+    return period.purchase_set.select_related("buyer").prefetch_related(
+        Prefetch(
+            "purchased_for_users",
+            queryset=PurchaseMembership.objects.select_related("person"),
         )
     )
-    return data
 
 
-def get_dict_index(lst: list, key: str, value: object) -> int:
+def get_purchase_queryset(queryset: QuerySet) -> QuerySet:
     """
-    Returns the index of the dictionary in the given list which contains the given key-value pair.
+    Loads everything :class:`api.serializers.PurchaseSerializer` shows next to the given purchases: their buyers,
+    periods with the period persons, and memberships with their persons. serializing any number of purchases then
+    takes a fixed number of queries.
 
     Args:
-        lst (list): The list of dictionaries to search through.
-        key (str): The key to search for in the dictionaries.
-        value (object): The value associated with the given key.
+        queryset (QuerySet): The purchases to serialize.
 
     Returns:
-        int: The index of the dictionary containing the given key-value pair, or -1 if not found.
+        QuerySet: The purchases with their relations loaded.
     """
-    for index, dic in enumerate(lst):
-        if dic[key] == value:
-            return index
-    return False
+    PurchaseMembership = apps.get_model("api", "PurchaseMembership")
+    return queryset.select_related("buyer", "period__owner").prefetch_related(
+        "period__persons",
+        Prefetch(
+            "purchased_for_users",
+            queryset=PurchaseMembership.objects.select_related("person"),
+        ),
+    )
 
 
-def owe_and_credit_calculator(
-    owe_or_credits: list[dict[str, object | int]]
-) -> list[dict[str, object | int]]:
-    """Calculates the total amount owed or credited by each person in a given list of transactions.
+def settle_purchases(purchases) -> list:
+    """
+    Replays the given purchases through the settlement engine.
 
     Args:
-        owe_or_credits (list[dict[str, object | int]]): A list of dictionaries containing information about each transaction.
-        Each dictionary should contain two keys: "person" and "amount".
+        purchases (QuerySet): Purchases loaded with :func:`get_period_purchases`.
 
     Returns:
-        list[dict[str, object | int]]: A list of dictionaries containing the total amount owed or credited by each person.
-        Each dictionary contains two keys: "person" and "amount".
-    """
-    data: list[dict[str, object | int]] = []
-    for owe_or_credit in owe_or_credits:
-        if any(
-            element["person"] == owe_or_credit["person"] for element in data
-        ):  # should be implemented somewhere around here
-            index: int = get_dict_index(data, "person", owe_or_credit["person"])
-            data[index].update(
-                {"amount": data[index]["amount"] + owe_or_credit["amount"]}
-            )
-        else:
-            data.append(owe_or_credit)
-    return data
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+    """
+    return settle(
+        (
+            purchase.buyer,
+            purchase.expense,
+            [
+                (membership.person, membership.coefficient)
+                for membership in purchase.purchased_for_users.all()
+            ],
+        )
+        for purchase in purchases
+    )
 
 
 def calculate_period_detail(period):
-    all_periods_purchases = period.purchase_set.all()
-    period_detail: list[dict[str, object | int | dict[str, int | object]]] = []
+    """
+    Calculates the detail of the period: the period itself, general information, every purchase and the expenses
+    detail of each person. the response is built from plain rows by :func:`api.read_serializers.render_period_detail`.
+
+    Args:
+        period (Period): The period to calculate the detail of.
+
+    Returns:
+        dict: The period detail.
+    """
+    return render_period_detail(period)
+
+
+def serialize_period_detail(period):
+    """
+    the period detail built with the nested model serializers. it is the reference the fast read path has to
+    match, the api tests compare their renders and the benchmark_period_detail command their timings.
+    """
+    prefetch_related_objects([period], "persons")
+    all_periods_purchases = get_period_purchases(period)
     total_expenses = 0
     for purchase in all_periods_purchases:
         total_expenses += purchase.expense
-        purchase_detail_calculator_result = purchase_detail_calculator(
-            purchase=purchase
-        )
-        for person_detail in purchase_detail_calculator_result:
-            if any(
-                element["person"] == person_detail["person"]
-                for element in period_detail
-            ):  # True when person exist in period_detail (update())
-                index = get_dict_index(period_detail, "person", person_detail["person"])
-                period_detail[index].update(
-                    {
-                        "direct_cost": period_detail[index]["direct_cost"]
-                        + person_detail["direct_cost"],
-                        "final_cost": period_detail[index]["final_cost"]
-                        + person_detail["final_cost"],
-                        "owe_to": period_detail[index]["owe_to"]
-                        + person_detail["owe_to"],
-                        "creditor_of": period_detail[index]["creditor_of"]
-                        + person_detail["creditor_of"],
-                    }
-                )
-            else:
-                period_detail.append(person_detail)
-    for detail in period_detail:
-        owe_tos = owe_and_credit_calculator(detail["owe_to"])
-        creditor_ofs = owe_and_credit_calculator(detail["creditor_of"])
-        period_detail[period_detail.index(detail)].update({"owe_to": owe_tos})
-        period_detail[period_detail.index(detail)].update({"creditor_of": creditor_ofs})
-
-    for i, detail in enumerate(period_detail):
-        for owe_index, owe in enumerate(detail["owe_to"]):
-            credit_index = get_dict_index(detail["creditor_of"], "person", owe["person"])
-            if credit_index is not False:
-                amount = detail["creditor_of"][credit_index]["amount"] - owe["amount"]
-                if amount > 0:
-                    period_detail[i]["owe_to"].pop(owe_index)
-                    period_detail[i]["creditor_of"][credit_index]["amount"] = amount
-                elif amount < 0:
-                    period_detail[i]["owe_to"][owe_index]["amount"] = amount
-                    period_detail[i]["creditor_of"].pop(credit_index)
-                else:
-                    period_detail[i]["owe_to"].pop(owe_index)
-                    period_detail[i]["creditor_of"].pop(credit_index)
-    person_count = period.persons.count()
+    with stage("settlement"):
+        if SETTLEMENT_BACKEND == "ledger":
+            period_detail = period_ledger_detail(period)
+        elif SETTLEMENT_BACKEND == "numpy":
+            period_detail = settle_period(period)
+        else:
+            period_detail = settle_purchases(all_periods_purchases)
+    person_count = len(period.persons.all())
     general_information = {
         "person_count": person_count,
         "total_expenses": total_expenses,
         "average_cost_per_person": total_expenses / person_count,
-        "purchase_count": period.purchase_set.count(),
+        "purchase_count": len(all_periods_purchases),
     }
     detail_serializer = DetailSerializer(period_detail, many=True)
     period_serializer = PeriodSerializer(period)
     purchase_serializer = PurchaseSerializerForRead(all_periods_purchases, many=True)
     general_information_serializer = GeneralInformationSerializer(general_information)
-    return {
-        "period": period_serializer.data,
-        "general_information": general_information_serializer.data,
-        "all_purchases": purchase_serializer.data,
-        "detail": detail_serializer.data,
-    }
+    with stage("serialize"):
+        return {
+            "period": period_serializer.data,
+            "general_information": general_information_serializer.data,
+            "all_purchases": purchase_serializer.data,
+            "detail": detail_serializer.data,
+        }
+
+
+def get_period_detail(period):
+    """
+    Returns the detail of the period from the period detail cache, calculating it on a miss. the cached payload is
+    dropped whenever the period, its persons, purchases or memberships change.
+
+    Args:
+        period (Period): The period to get the detail of.
+
+    Returns:
+        dict: The same data as :func:`calculate_period_detail` returns.
+    """
+    return get_cached_period_detail(period, calculate_period_detail)
+
+
+async def aget_period_detail(period):
+    """async version of :func:`get_period_detail`, see :func:`api.read_serializers.arender_period_detail`."""
+    return await aget_cached_period_detail(period, arender_period_detail)
+
+
+def calculate_period_settlement(period):
+    """
+    Calculates the exact net balance of each person in the period and the short list of transfers that settles
+    all of them.
+
+    Args:
+        period (Period): The period to settle.
+
+    Returns:
+        dict: The serialized balances and transfers.
+    """
+    with stage("settlement"):
+        balances = person_balances(
+            (
+                purchase.buyer,
+                purchase.expense,
+                [
+                    (membership.person, membership.coefficient)
+                    for membership in purchase.purchased_for_users.all()
+                ],
+            )
+            for purchase in get_period_purchases(period)
+        )
+        transfers = minimum_transfers(balances)
+    with stage("serialize"):
+        return {
+            "balances": PersonBalanceSerializer(balances.values(), many=True).data,
+            "transfers": TransferSerializer(transfers, many=True).data,
+        }
@@ -0,0 +1,199 @@
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Person, Purchase
+
+SettlementRow = tuple[str, str, int, str | None, int | None]
+
+
+def period_rows(period) -> list[SettlementRow]:
+    """
+    Loads the purchases of a period joined with their memberships in a single query. purchases without any
+    membership are returned once with an empty person and coefficient.
+
+    Returns:
+        list[SettlementRow]: (purchase_id, buyer_id, expense, person_id, coefficient) rows.
+    """
+    return list(
+        Purchase.objects.filter(period=period).values_list(
+            "id",
+            "buyer_id",
+            "expense",
+            "purchased_for_users__person_id",
+            "purchased_for_users__coefficient",
+        )
+    )
+
+
+def settle_rows(rows: list[SettlementRow], persons: dict[str, object]) -> list[dict]:
+    """
+    Calculates the expenses detail from joined purchase/membership rows with array operations, the vectorized
+    counterpart of :func:`api.settlement.settle` used by the "numpy" settlement backend.
+
+    The rows form a sparse purchase x person coefficient matrix. shares, costs and the pairwise debts are summed
+    in the same order as the Python engine, so both return identical amounts for the same rows.
+
+    Args:
+        rows (list[SettlementRow]): (purchase_id, buyer_id, expense, person_id, coefficient) rows, as returned by
+            :func:`period_rows`.
+        persons (dict[str, Person]): The persons referenced by the rows, keyed by id. every buyer and member of the
+            rows has to be in it.
+
+    Returns:
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+    """
+    if np is None:
+        raise ImproperlyConfigured(
+            'numpy has to be installed to use the "numpy" settlement backend.'
+        )
+    if not rows:
+        return []
+    row_count = len(rows)
+    purchase_ids = list(map(itemgetter(0), rows))
+    purchase_codes = {
+        purchase_id: code
+        for code, purchase_id in enumerate(dict.fromkeys(purchase_ids))
+    }
+    person_codes = {person_id: code for code, person_id in enumerate(persons)}
+    person_codes[None] = -1
+
+    def column(index: int, codes: dict | None = None):
+        values = map(itemgetter(index), rows)
+        if codes is not None:
+            values = map(codes.__getitem__, values)
+        return np.fromiter(values, dtype=np.int64, count=row_count)
+
+    purchase = np.fromiter(
+        map(purchase_codes.__getitem__, purchase_ids), dtype=np.int64, count=row_count
+    )
+    # rows of the same purchase have to be next to each other, keeping the query order otherwise.
+    order = np.argsort(purchase, kind="stable")
+    purchase = purchase[order]
+    buyer = column(1, person_codes)[order]
+    expense = column(2)[order]
+    person = column(3, person_codes)[order]
+    has_person = person >= 0
+    # purchases without memberships have an empty coefficient, which numpy reads as nan.
+    coefficient = np.where(
+        has_person,
+        np.array(list(map(itemgetter(4), rows)), dtype=np.float64)[order],
+        0,
+    )
+    person_count = len(persons)
+    purchase_count = len(purchase_codes)
+    row_index = np.arange(len(purchase))
+
+    # one entry per purchase, taken from its first row.
+    first_rows = np.flatnonzero(np.r_[True, purchase[1:] != purchase[:-1]])
+    last_rows = np.r_[first_rows[1:] - 1, len(purchase) - 1]
+    purchase_buyer = buyer[first_rows]
+    purchase_expense = expense[first_rows]
+
+    coefficient_sum = np.bincount(
+        purchase, weights=coefficient, minlength=purchase_count
+    )
+    each_coefficient_share = np.divide(
+        purchase_expense,
+        coefficient_sum,
+        out=np.zeros(purchase_count),
+        where=coefficient_sum != 0,
+    )
+    share = each_coefficient_share[purchase] * coefficient
+
+    is_buyer = has_person & (person == buyer)
+    is_member = has_person & ~is_buyer
+    # only the first membership of the buyer in a purchase counts, like the Python engine.
+    buyer_rows = row_index[is_buyer]
+    buyer_rows = buyer_rows[np.unique(purchase[buyer_rows], return_index=True)[1]]
+    counted = is_member.copy()
+    counted[buyer_rows] = True
+
+    direct_cost = np.zeros(person_count, dtype=np.int64)
+    np.add.at(direct_cost, purchase_buyer, purchase_expense)
+    final_cost = np.bincount(
+        person[counted], weights=share[counted], minlength=person_count
+    )
+
+    # the pairwise debts are kept sparse, one entry per (debtor, creditor) pair that occurs.
+    pair = person[is_member] * person_count + buyer[is_member]
+    pairs, first_seen, pair_index = np.unique(
+        pair, return_index=True, return_inverse=True
+    )
+    debt = np.bincount(pair_index, weights=share[is_member], minlength=len(pairs))
+    pair_debtors = pairs // person_count
+    pair_creditors = pairs % person_count
+    reverse = np.searchsorted(pairs, pair_creditors * person_count + pair_debtors)
+    reverse = np.minimum(reverse, len(pairs) - 1)
+    both = pairs[reverse] == pair_creditors * person_count + pair_debtors
+    net = debt - debt[reverse]
+    owe = np.where(both, net, debt)
+    # the reverse pair carries the negative nets, zero amounts of zero coefficients are dropped.
+    owes = owe > 0
+
+    # persons are listed in order of appearance: the other members of a purchase, then its buyer.
+    appearance = np.full(person_count, np.iinfo(np.int64).max)
+    np.minimum.at(appearance, person[is_member], 2 * row_index[is_member])
+    np.minimum.at(appearance, purchase_buyer, 2 * last_rows + 1)
+    person_order = np.argsort(appearance, kind="stable")
+    person_order = person_order[appearance[person_order] != np.iinfo(np.int64).max]
+
+    # owe/credit relations are listed in the order the pair first appeared.
+    pair_order = np.argsort(first_seen, kind="stable")
+    pair_order = pair_order[owes[pair_order]]
+    pair_debtors = pair_debtors[pair_order].tolist()
+    pair_creditors = pair_creditors[pair_order].tolist()
+    pair_amounts = owe[pair_order].tolist()
+
+    code_persons = list(persons.values())
+    owe_to: list[list] = [[] for _ in range(person_count)]
+    creditor_of: list[list] = [[] for _ in range(person_count)]
+    for debtor_code, creditor_code, amount in zip(
+        pair_debtors, pair_creditors, pair_amounts
+    ):
+        owe_to[debtor_code].append(
+            {"person": code_persons[creditor_code], "amount": amount}
+        )
+        creditor_of[creditor_code].append(
+            {"person": code_persons[debtor_code], "amount": amount}
+        )
+    direct_cost = direct_cost.tolist()
+    final_cost = final_cost.tolist()
+    return [
+        {
+            "person": code_persons[code],
+            "owe_to": owe_to[code],
+            "direct_cost": direct_cost[code],
+            "final_cost": final_cost[code],
+            "creditor_of": creditor_of[code],
+        }
+        for code in person_order.tolist()
+    ]
+
+
+def settle_period(period) -> list[dict]:
+    """
+    Calculates the expenses detail of a period with the vectorized backend.
+
+    Args:
+        period (Period): The period to calculate the detail of, ideally with its persons prefetched.
+
+    Returns:
+        list: A list of person detail data, in the format :class:`api.serializers.DetailSerializer` consumes.
+    """
+    rows = period_rows(period)
+    persons = {person.pk: person for person in period.persons.all()}
+    missing = {
+        row_person_id
+        for _, buyer_id, _, person_id, _ in rows
+        for row_person_id in (buyer_id, person_id)
+        if row_person_id is not None and row_person_id not in persons
+    }
+    if missing:
+        persons.update(Person.objects.in_bulk(missing))
+    return settle_rows(rows, persons)
@@ -1,16 +1,45 @@
+import io
+
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, status, viewsets
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
-
-from .models import Period, PeriodShare, Person, Purchase
+from rest_framework.views import APIView
+
+from . import metrics
+from .conditional import conditional_response, set_validators
+from .export import EXPORT_FORMATS, export_records
+from .importing import IMPORT_FORMATS, PurchaseImporter
+from .instrumentation import stage
+from .models import Period, PeriodShare, Person, Purchase, PurchaseMembership
+from .pagination import (
+    PeriodPagination,
+    PeriodSharePagination,
+    PersonPagination,
+    PurchasePagination,
+)
 from .permissions import IsOwner, IsThroughPeriodRelatedOwner
 from .responses import ERROR_MESSAGES, RESPONSE_MESSAGES
-from .serializers import (DetailSerializer, PeriodSerializer,
-                          PeriodShareSerializer, PersonSerializer,
-                          PurchaseSerializer)
-from .utils import calculate_period_detail, purchase_detail_calculator
+from .serializers import (
+    BulkPurchaseSerializer,
+    DetailSerializer,
+    PeriodSerializer,
+    PeriodShareSerializer,
+    PersonSerializer,
+    PurchaseSerializer,
+)
+from .snapshots import drop_snapshot, snapshot_response, take_snapshot
+from .utils import (
+    calculate_period_settlement,
+    get_period_detail,
+    get_purchase_queryset,
+    purchase_detail_calculator,
+)
 
 
 class PeriodViewSet(
@@ -26,8 +55,13 @@ class PeriodViewSet(
     queryset = Period.objects.all()
     permission_classes = (IsAuthenticated, IsOwner)
     serializer_class = PeriodSerializer
+    pagination_class = PeriodPagination
     http_method_names = ["get", "post", "delete", "put"]
 
+    def get_queryset(self):
+        """periods of the user only, the periods of others are not found rather than forbidden."""
+        return super().get_queryset().filter(owner=self.request.user)
+
     def perform_create(self, serializer):
         """creates a new period with the given data"""
         serializer.save()
@@ -47,16 +81,109 @@ class PeriodViewSet(
 
     def list(self, request: Request) -> Response:
         """list all periods of user"""
-        periods = Period.objects.filter(owner=request.user)  # type: ignore
+        periods = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(periods, many=True)
-        return Response(status=status.HTTP_200_OK, data=serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """return detailed data about the period with the given id. including period info, purchases info and expenses detail."""
-        period = get_object_or_404(Period, pk=pk)
-        data = calculate_period_detail(period)
+        period = self.get_object()
+        not_modified = conditional_response(request, period)
+        if not_modified is not None:
+            return not_modified
+        data = get_period_detail(period)
+        return set_validators(Response(status=status.HTTP_200_OK, data=data), period)
+
+    @action(detail=True, methods=["get"])
+    def settle(self, request, pk=None):
+        """return the net balance of each person in the period and the minimum transfers that settle them."""
+        period = self.get_object()
+        data = calculate_period_settlement(period)
         return Response(status=status.HTTP_200_OK, data=data)
 
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"export/(?P<export_format>csv|ndjson)",
+    )
+    def export(self, request, pk=None, export_format=None):
+        """stream the purchases, memberships and final balances of the period as CSV or JSON lines."""
+        period = self.get_object()
+        lines, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            lines(export_records(period)), content_type=content_type
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="period-{period.pk}.{export_format}"'
+        return response
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path=r"import/(?P<import_format>csv|ndjson)",
+        parser_classes=[MultiPartParser],
+    )
+    def import_purchases(self, request, pk=None, import_format=None):
+        """
+        import purchases into the period from an uploaded CSV or JSON lines "file", or from an export of a period.
+        persons are referred to by name and invalid rows are reported by their row number while the valid ones are
+        created.
+        """
+        period = self.get_object()
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"file": [ERROR_MESSAGES["required_field"]]},
+            )
+        prefetch_related_objects([period], "persons")
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        importer = PurchaseImporter(period)
+        summary = importer.run(IMPORT_FORMATS[import_format](stream))
+        if importer.malformed:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"detail": ERROR_MESSAGES["malformed_import_file"], **summary},
+            )
+        return Response(status=status.HTTP_200_OK, data=summary)
+
+    @action(detail=True, methods=["post"], url_path="purchases")
+    def bulk_purchases(self, request, pk=None):
+        """
+        create many purchases of the period in one request. with "partial" set to true the valid purchases are
+        created and the errors of the others are returned next to them.
+        """
+        period = self.get_object()
+        prefetch_related_objects([period], "persons")
+        serializer = BulkPurchaseSerializer(
+            data=request.data, context={"request": request, "period": period}
+        )
+        serializer.is_valid(raise_exception=True)
+        errors = serializer.validated_data["errors"]
+        if errors and not serializer.validated_data["partial"]:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"detail": ERROR_MESSAGES["bulk_item_invalid"], "errors": errors},
+            )
+        purchases = serializer.save()
+        prefetch_related_objects(
+            purchases,
+            Prefetch(
+                "purchased_for_users",
+                queryset=PurchaseMembership.objects.select_related("person"),
+            ),
+        )
+        return Response(
+            status=(
+                status.HTTP_201_CREATED if purchases else status.HTTP_400_BAD_REQUEST
+            ),
+            data={
+                "created": PurchaseSerializer(purchases, many=True).data,
+                "errors": errors,
+            },
+        )
+
 
 class PersonViewSet(
     viewsets.GenericViewSet,
@@ -68,8 +195,12 @@ class PersonViewSet(
     queryset = Person.objects.all()
     permission_classes = (IsAuthenticated, IsOwner)
     serializer_class = PersonSerializer
+    pagination_class = PersonPagination
     http_method_names = ["get", "post", "delete"]
 
+    def get_queryset(self):
+        return super().get_queryset().filter(owner=self.request.user)
+
     def perform_create(self, serializer):
         serializer.save()
 
@@ -87,9 +218,9 @@ class PersonViewSet(
         )
 
     def list(self, request):
-        persons = Person.objects.filter(owner=request.user)
+        persons = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(persons, many=True)
-        return Response(status=status.HTTP_200_OK, data=serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
 class PurchaseViewSet(
@@ -104,6 +235,11 @@ class PurchaseViewSet(
     serializer_class = PurchaseSerializer
     http_method_names = ["post", "get", "delete", "put"]
 
+    def get_queryset(self):
+        return get_purchase_queryset(
+            super().get_queryset().filter(period__owner=self.request.user)
+        )
+
     def perform_create(self, serializer):
         serializer.save()
 
@@ -125,38 +261,45 @@ class PurchaseViewSet(
         """Retrieve a purchase and its details from the database.
         retrieves a purchase object with the given primary key (pk) and calculates the details of the purchase using the purchase_detail_calculator function.
         """
-        purchase = get_object_or_404(Purchase, pk=pk)
+        purchase = self.get_object()
+        not_modified = conditional_response(request, purchase)
+        if not_modified is not None:
+            return not_modified
         data = purchase_detail_calculator(purchase=purchase)
-        purchase_serializer = self.get_serializer(self.get_object())
+        purchase_serializer = self.get_serializer(purchase)
         purchase_detail_serializer = DetailSerializer(data, many=True)
-        return Response(
-            status=status.HTTP_200_OK,
-            data={
+        with stage("serialize"):
+            data = {
                 "purchase": purchase_serializer.data,
                 "detail": purchase_detail_serializer.data,
-            },
-        )
+            }
+        response = Response(status=status.HTTP_200_OK, data=data)
+        return set_validators(response, purchase)
 
 
 class RetrievePurchaseViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = Purchase.objects.all()
     permission_classes = (IsAuthenticated, IsThroughPeriodRelatedOwner)
     serializer_class = PurchaseSerializer
+    pagination_class = PurchasePagination
     http_method_names = ["get"]
 
     def retrieve(self, request, pk=None):
         """
-        function is used to list all purchases associated with a given period.
+        function is used to list the purchases associated with a given period, page by page in the order they were
+        made.
         """
-        period = get_object_or_404(Period, pk=pk)
-        if period.owner != request.user:
-            return Response(
-                status=status.HTTP_403_FORBIDDEN,
-                data=ERROR_MESSAGES["permission_denied"],
-            )
-        purchases = Purchase.objects.filter(period=period)
+        period = get_object_or_404(Period.objects.filter(owner=request.user), pk=pk)
+        not_modified = conditional_response(request, period)
+        if not_modified is not None:
+            return not_modified
+        purchases = self.paginate_queryset(
+            get_purchase_queryset(Purchase.objects.filter(period=period))
+        )
         serializer = PurchaseSerializer(purchases, many=True)
-        return Response(status=status.HTTP_200_OK, data=serializer.data)
+        with stage("serialize"):
+            data = serializer.data
+        return set_validators(self.get_paginated_response(data), period)
 
 
 class PeriodShareViewSet(
@@ -169,18 +312,47 @@ class PeriodShareViewSet(
     queryset = PeriodShare.objects.all()
     permission_classes = [IsAuthenticated, IsThroughPeriodRelatedOwner]
     serializer_class = PeriodShareSerializer
+    pagination_class = PeriodSharePagination
     http_method_names = ["get", "put", "post", "delete"]
 
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(owner=self.request.user)
+            .select_related("period")
+            .defer("snapshot")
+        )
+
     def perform_create(self, serializer) -> None:
-        serializer.save()
+        share = serializer.save()
+        if share.is_snapshot:
+            take_snapshot(share)
 
     def perform_update(self, serializer) -> None:
-        serializer.save()
+        """
+        a share turned to snapshot mode, or moved to another period, takes a new snapshot. a share turned back to
+        live mode drops its snapshot.
+        """
+        period_id = serializer.instance.period_id
+        share = serializer.save()
+        if not share.is_snapshot:
+            if share.snapshot_at is not None:
+                drop_snapshot(share)
+        elif share.snapshot_at is None or share.period_id != period_id:
+            take_snapshot(share)
+
+    @action(detail=True, methods=["post"])
+    def snapshot(self, request: Request, pk=None) -> Response:
+        """freeze the current detail of the period into the share, visitors get it until the next snapshot."""
+        share = self.get_object()
+        take_snapshot(share)
+        return Response(status=status.HTTP_200_OK, data=self.get_serializer(share).data)
 
     def list(self, request: Request) -> Response:
-        period_share = PeriodShare.objects.filter(period__owner=request.user)
+        period_share = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(period_share, many=True)
-        return Response(status=status.HTTP_200_OK, data=serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     def destroy(self, request: Request, pk=None) -> Response:
         instance = self.get_object()
@@ -199,11 +371,18 @@ class PeriodShareViewSetRetrieve(viewsets.GenericViewSet, mixins.RetrieveModelMi
 
     def retrieve(self, request: Request, pk=None) -> Response:
         try:
-            instance = PeriodShare.objects.get(sharing_id=pk)
+            instance = PeriodShare.objects.select_related("period").get(sharing_id=pk)
             if instance.is_expired():
                 raise PeriodShare.DoesNotExist
-            data = calculate_period_detail(instance.period)
-            return Response(status=status.HTTP_200_OK, data=data)
+            if instance.is_snapshot and instance.snapshot_at is not None:
+                return snapshot_response(request, instance)
+            not_modified = conditional_response(request, instance.period)
+            if not_modified is not None:
+                return not_modified
+            data = get_period_detail(instance.period)
+            return set_validators(
+                Response(status=status.HTTP_200_OK, data=data), instance.period
+            )
         except PeriodShare.DoesNotExist:
             return Response(
                 status=status.HTTP_401_UNAUTHORIZED,
@@ -212,3 +391,14 @@ class PeriodShareViewSetRetrieve(viewsets.GenericViewSet, mixins.RetrieveModelMi
 
     # TODO: LOCALIZATION TRANSLATION
     # TODO: TEST
+
+
+class MetricsView(APIView):
+    """request, latency, query and cache metrics of all worker processes in the Prometheus text format."""
+
+    permission_classes = (IsAuthenticated, IsAdminUser)
+
+    def get(self, request: Request) -> HttpResponse:
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.instrumentation.ServerTimingMiddleware",
+    "api.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -96,6 +98,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # rendered period details, works with the locmem and the file based backend.
+    "period_detail": {
+        "BACKEND": os.environ.get(
+            "PERIOD_DETAIL_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("PERIOD_DETAIL_CACHE_LOCATION", "period-detail"),
+        "TIMEOUT": int(os.environ.get("PERIOD_DETAIL_CACHE_TIMEOUT", 300)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("PERIOD_DETAIL_CACHE_MAX_ENTRIES", 300)),
+            "CULL_FREQUENCY": int(
+                os.environ.get("PERIOD_DETAIL_CACHE_CULL_FREQUENCY", 3)
+            ),
+        },
+    },
+}
+
+PERIOD_DETAIL_CACHE_ALIAS = "period_detail"
+
+# users of authenticated requests are cached for AUTH_USER_CACHE_TIMEOUT seconds in this cache and for
+# AUTH_USER_LOCAL_CACHE_TIMEOUT seconds in an LRU of AUTH_USER_LOCAL_CACHE_SIZE users in every process. a saved
+# user is dropped from both in the process that saved it, other processes see the change once their local entry
+# expires.
+AUTH_USER_CACHE_ALIAS = os.environ.get("AUTH_USER_CACHE_ALIAS", "default")
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get("AUTH_USER_CACHE_TIMEOUT", 300))
+AUTH_USER_LOCAL_CACHE_TIMEOUT = float(
+    os.environ.get("AUTH_USER_LOCAL_CACHE_TIMEOUT", 5)
+)
+AUTH_USER_LOCAL_CACHE_SIZE = int(os.environ.get("AUTH_USER_LOCAL_CACHE_SIZE", 1024))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -128,6 +168,8 @@ USE_L10N = True
 
 USE_TZ = True
 
+DEFAULT_CHARSET = "utf-8"
+
 LOCALE_PATHS = (os.path.join(BASE_DIR, "locale"),)
 
 # Static files (CSS, JavaScript, Images)
@@ -149,19 +191,37 @@ LANGUAGES = [
     ("es", _("Spanish")),
 ]
 
+# "stdlib" renders and parses the API JSON with DRF's json module based classes, "orjson" with the faster
+# api.renderers.ORJSONRenderer and api.parsers.ORJSONParser (requires orjson), which produce equivalent JSON for the
+# API's payloads. they differ on floats in exponent notation, written as 1e-7 instead of 1e-07, and on NaN and
+# Infinity, which orjson renders as null where the standard renderer rejects them.
+API_JSON_BACKEND = os.environ.get("API_JSON_BACKEND", "stdlib")
+
+# (renderer, parser) of each API_JSON_BACKEND.
+API_JSON_CLASSES = {
+    "stdlib": (
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.parsers.JSONParser",
+    ),
+    "orjson": ("api.renderers.ORJSONRenderer", "api.parsers.ORJSONParser"),
+}
+
 REST_FRAMEWORK = {
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
-    # 'DEFAULT_RENDERER_CLASSES': [
-    #     'rest_framework.renderers.JSONRenderer',
-    # ],
-    # 'DEFAULT_PARSER_CLASSES': [
-    #     'rest_framework.parsers.JSONParser',
-    # ],
+    "DEFAULT_RENDERER_CLASSES": [
+        API_JSON_CLASSES[API_JSON_BACKEND][0],
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        API_JSON_CLASSES[API_JSON_BACKEND][1],
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAdminUser",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "customauth.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
@@ -179,11 +239,19 @@ SIMPLE_JWT = {
 }
 
 AUTH_CODE_EXPIRES_IN = timedelta(minutes=10)
+# expired magic link codes are kept for VERIFICATION_RETENTION more, so an old link still gets the "expired"
+# answer, and then deleted VERIFICATION_PURGE_BATCH_SIZE rows at a time, by `python manage.py
+# purge_verifications` or by a magic link request at most once every VERIFICATION_PURGE_INTERVAL.
+VERIFICATION_RETENTION = AUTH_CODE_EXPIRES_IN
+VERIFICATION_PURGE_BATCH_SIZE = 500
+VERIFICATION_PURGE_INTERVAL = timedelta(minutes=1)
 
 VERIFICATION_PATH = os.environ.get("VERIFICATION_PATH")
 
 APP_NAME = os.environ.get("APP_NAME")
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
 EMAIL_USE_TLS = True
 EMAIL_HOST = os.environ.get("EMAIL_SMTP")
 EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 587))
@@ -193,7 +261,57 @@ EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 EMAIL_PLAINTEXT_TEMPLATE_NAME = "email.txt"
 EMAIL_HTML_TEMPLATE_NAME = "email.html"
 
+# emails are queued in the OutboxEmail table and sent by `python manage.py send_outbox`. each of the
+# OUTBOX_THREADS threads keeps its SMTP connection open and sends its part of every batch over it.
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_THREADS = int(os.environ.get("OUTBOX_THREADS", 4))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 1))
+# an email that could not be sent is tried again after OUTBOX_RETRY_DELAY, doubled on every attempt, and given
+# up after OUTBOX_MAX_ATTEMPTS attempts. claimed emails that are not sent within OUTBOX_LEASE are claimed again.
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = timedelta(seconds=30)
+OUTBOX_LEASE = timedelta(minutes=5)
+
 
 PERIOD_OBJECT_LIMIT = 30
 
+# default page size of the listings and the maximum clients can ask for with the "page_size" query parameter.
+LIST_PAGE_SIZE = 50
+LIST_PAGE_SIZE_LIMIT = 500
+
+# maximum number of purchases a single bulk purchase request can create.
+BULK_PURCHASE_LIMIT = 500
+
+# number of rows the period exports read from the database at once.
+EXPORT_CHUNK_SIZE = 2000
+
+# number of invalid rows a purchase import reports in detail, the rest are only counted.
+IMPORT_ERROR_LIMIT = 1000
+
+# "python" replays the purchases of a period on every detail request, "numpy" does the same with
+# array operations (requires numpy) and "ledger" reads the balances kept up to date in the
+# PeriodBalance and PeriodDebt tables.
+# run `python manage.py rebuild_ledger` before switching an existing database to "ledger".
+SETTLEMENT_BACKEND = os.environ.get("SETTLEMENT_BACKEND", "python")
+
+# send the query count, database time and stage timings of each request in the Server-Timing header. they tell
+# every client how the server spends its time, so it is opt-in, set SERVER_TIMING=true for local profiling.
+# they are logged to the "api.instrumentation" logger either way.
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false") == "true"
+
+# share of the requests that run under cProfile, 0 turns profiling off. the profiles of the sampled requests
+# slower than REQUEST_PROFILE_THRESHOLD_MS are written to REQUEST_PROFILE_DIR.
+REQUEST_PROFILE_SAMPLE_RATE = float(os.environ.get("REQUEST_PROFILE_SAMPLE_RATE", 0))
+REQUEST_PROFILE_THRESHOLD_MS = float(
+    os.environ.get("REQUEST_PROFILE_THRESHOLD_MS", 1000)
+)
+REQUEST_PROFILE_DIR = os.environ.get(
+    "REQUEST_PROFILE_DIR", os.path.join(BASE_DIR, "profiles")
+)
+
+# every worker process writes its metrics to a file of this directory at most every METRICS_FLUSH_INTERVAL
+# seconds, the metrics endpoint adds them up. empty it when all workers are restarted.
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1))
+
 CORS_ALLOW_ALL_ORIGINS = True
@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import OutboxEmail
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status",)
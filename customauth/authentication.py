@@ -0,0 +1,137 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from config.settings import (
+    AUTH_USER_CACHE_ALIAS,
+    AUTH_USER_CACHE_TIMEOUT,
+    AUTH_USER_LOCAL_CACHE_SIZE,
+    AUTH_USER_LOCAL_CACHE_TIMEOUT,
+)
+
+
+class LocalUserCache:
+    """a thread safe LRU of users in this process, whose entries expire after ``timeout`` seconds."""
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, user) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalUserCache(AUTH_USER_LOCAL_CACHE_SIZE, AUTH_USER_LOCAL_CACHE_TIMEOUT)
+
+
+def _cache():
+    return caches[AUTH_USER_CACHE_ALIAS]
+
+
+def _user_key(user_id) -> str:
+    return f"auth-user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Returns the user with the given id from the local cache, then the shared cache, then the database, and
+    caches it on the way back.
+
+    Returns:
+        customauth.User | None: A copy of the cached user, so a request changing it does not change the one
+            other requests get. None when the user does not exist.
+    """
+    key = _user_key(user_id)
+    user = local_cache.get(key)
+    if user is None:
+        user = _cache().get(key)
+        if user is None:
+            user_model = get_user_model()
+            try:
+                user = user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except user_model.DoesNotExist:
+                return None
+            _cache().set(key, user, AUTH_USER_CACHE_TIMEOUT)
+        local_cache.set(key, user)
+    return copy.copy(user)
+
+
+def drop_cached_user(user_id) -> None:
+    key = _user_key(user_id)
+    local_cache.delete(key)
+    _cache().delete(key)
+
+
+def invalidate_user(user_id) -> None:
+    """
+    drops the cached user once the current transaction commits. the local caches of other processes keep it for
+    up to ``AUTH_USER_LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+    local_cache.delete(_user_key(user_id))
+    transaction.on_commit(lambda: drop_cached_user(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    :class:`JWTAuthentication` that looks the user of the token up with :func:`get_cached_user` instead of
+    querying the database on every request. users are dropped from the cache when they are saved or deleted, see
+    :mod:`customauth.signals`.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
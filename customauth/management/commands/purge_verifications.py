@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.settings import VERIFICATION_PURGE_BATCH_SIZE
+from customauth.utils import purge_expired_verifications
+
+
+class Command(BaseCommand):
+    help = (
+        "delete the magic link codes that expired more than VERIFICATION_RETENTION ago, in batches so other "
+        "writers are not blocked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=VERIFICATION_PURGE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="seconds to wait between batches, lets other writers take the lock on SQLite.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while count := purge_expired_verifications(
+            options["batch_size"], max_batches=1
+        ):
+            deleted += count
+            time.sleep(options["pause"])
+        self.stdout.write(f"{deleted} expired codes deleted")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.settings import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_THREADS
+from customauth.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "send the queued emails with a pool of threads that keep their SMTP connections open. runs until "
+        "interrupted, polling the outbox every OUTBOX_POLL_INTERVAL seconds, unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="send what is due and exit."
+        )
+        parser.add_argument("--threads", type=int, default=OUTBOX_THREADS)
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(options["threads"], options["batch_size"])
+        try:
+            while True:
+                sent = worker.drain()
+                if sent:
+                    self.stdout.write(f"{sent} emails claimed")
+                if options["once"]:
+                    break
+                time.sleep(OUTBOX_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
@@ -40,6 +40,15 @@ class Verification(models.Model):
     created_time = models.DateTimeField()
     expire_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "expire_at"], name="verification_user_expire_idx"
+            ),
+            # the purge of expired codes.
+            models.Index(fields=["expire_at"], name="verification_expire_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         self.created_time = timezone.now()
         self.expire_at = self.created_time + AUTH_CODE_EXPIRES_IN
@@ -48,3 +57,38 @@ class Verification(models.Model):
 
     def is_expired(self):
         return self.expire_at < timezone.now()
+
+
+class OutboxEmail(models.Model):
+    """an email waiting to be sent by the outbox worker, see :mod:`customauth.outbox`."""
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # pending emails are sent once this time has passed. claiming an email moves it forward by the lease, so an
+    # email of a worker that died is sent again.
+    available_at = models.DateTimeField(default=timezone.now)
+    # random token of the last claim, a worker only reads and updates the emails that still hold its own token.
+    claim_token = models.CharField(max_length=32, blank=True, editable=False)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"], name="outbox_status_available_idx"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} to {', '.join(self.to)}"
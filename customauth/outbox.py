@@ -0,0 +1,192 @@
+import secrets
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import select_template
+from django.utils import timezone, translation
+
+from config.settings import (
+    EMAIL_HOST_USER,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_LEASE,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_DELAY,
+    OUTBOX_THREADS,
+)
+
+from .models import OutboxEmail
+
+
+@lru_cache(maxsize=None)
+def get_email_template(template_name: str, language: str):
+    """
+    Returns the compiled template used for emails in the given language. a template under a directory named after
+    the language, like "fa/email.html", is preferred over the shared one. the lookup and the compilation happen
+    once per template and language.
+    """
+    return select_template([f"{language}/{template_name}", template_name])
+
+
+def render_email(template_name: str, context: dict, language: str) -> str:
+    with translation.override(language):
+        return get_email_template(template_name, language).render(context)
+
+
+def enqueue_email(
+    subject: str, body: str, to: list[str], html_body: str = "", from_email=None
+) -> OutboxEmail:
+    """queues an email for the outbox worker instead of sending it while the request waits."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or EMAIL_HOST_USER or "",
+        to=to,
+    )
+
+
+def _due_email_ids(limit: int, now) -> list[int]:
+    return list(
+        OutboxEmail.objects.filter(status=OutboxEmail.PENDING, available_at__lte=now)
+        .order_by("available_at", "id")
+        .values_list("pk", flat=True)[:limit]
+    )
+
+
+def claim_emails(limit: int) -> list[OutboxEmail]:
+    """
+    Claims up to ``limit`` emails that are due. claimed emails are not due again until the lease passes, so other
+    workers skip them and the emails of a worker that died are sent again later.
+
+    the claim is a single UPDATE that checks again that the emails are due, so two workers that picked the same
+    emails can not both claim them, on every database. row locks are not used, SQLite ignores them.
+    """
+    now = timezone.now()
+    ids = _due_email_ids(limit, now)
+    if not ids:
+        return []
+    token = secrets.token_hex(16)
+    OutboxEmail.objects.filter(
+        pk__in=ids, status=OutboxEmail.PENDING, available_at__lte=now
+    ).update(
+        claim_token=token,
+        attempts=F("attempts") + 1,
+        available_at=now + OUTBOX_LEASE,
+    )
+    return list(OutboxEmail.objects.filter(claim_token=token).order_by("id"))
+
+
+def _message(email: OutboxEmail, connection) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+class OutboxWorker:
+    """
+    Sends the outbox with a pool of threads. every thread opens one connection of the email backend and keeps it
+    open between batches, instead of connecting to the mail server for every email.
+
+    Args:
+        threads (int): Number of sending threads, and so of open connections.
+        batch_size (int): Emails claimed at once, they are split between the threads.
+    """
+
+    def __init__(
+        self, threads: int = OUTBOX_THREADS, batch_size: int = OUTBOX_BATCH_SIZE
+    ):
+        self.threads = threads
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="outbox"
+        )
+        self.local = threading.local()
+        self.connections: list = []
+        self.lock = threading.Lock()
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = get_connection(fail_silently=False)
+            with self.lock:
+                self.connections.append(connection)
+        connection.open()
+        return connection
+
+    def close_connection(self) -> None:
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+
+    def send_chunk(self, emails: list[OutboxEmail]) -> list[tuple[int, str]]:
+        """sends the emails over the connection of the current thread and returns the errors by email id."""
+        errors = []
+        for email in emails:
+            try:
+                try:
+                    _message(email, self.connection()).send()
+                except smtplib.SMTPServerDisconnected:
+                    # the server closed the idle connection, connect again once.
+                    self.close_connection()
+                    _message(email, self.connection()).send()
+            except Exception as error:
+                self.close_connection()
+                errors.append((email.pk, repr(error)))
+        return errors
+
+    def send_batch(self) -> int:
+        """
+        Claims and sends one batch.
+
+        Returns:
+            int: The number of emails claimed, 0 once the outbox has nothing due.
+        """
+        emails = claim_emails(self.batch_size)
+        if not emails:
+            return 0
+        chunks = [emails[index :: self.threads] for index in range(self.threads)]
+        errors = dict(
+            error
+            for chunk in self.executor.map(self.send_chunk, filter(None, chunks))
+            for error in chunk
+        )
+        now = timezone.now()
+        for email in emails:
+            if email.pk not in errors:
+                email.status, email.sent_at = OutboxEmail.SENT, now
+                email.last_error = ""
+                continue
+            email.last_error = errors[email.pk]
+            if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+                email.status = OutboxEmail.FAILED
+            else:
+                delay = OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+                email.available_at = now + delay
+        # an email whose lease ran out meanwhile belongs to the worker that claimed it again.
+        OutboxEmail.objects.filter(claim_token=emails[0].claim_token).bulk_update(
+            emails, ["status", "sent_at", "last_error", "available_at"]
+        )
+        return len(emails)
+
+    def drain(self) -> int:
+        """sends batches until nothing is due and returns the number of emails claimed."""
+        total = 0
+        while count := self.send_batch():
+            total += count
+        return total
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        for connection in self.connections:
+            connection.close()
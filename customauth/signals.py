@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """
+    a saved user, from :meth:`customauth.serializers.UserSerializer.update`, the admin or a deactivation, is
+    looked up again by the next request. ``QuerySet.update()`` sends no signal, call :func:`invalidate_user`
+    after it.
+    """
+    invalidate_user(instance.pk)
@@ -1,3 +1,233 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config.settings import (
+    AUTH_CODE_EXPIRES_IN,
+    OUTBOX_MAX_ATTEMPTS,
+    VERIFICATION_RETENTION,
+)
+
+from .authentication import local_cache
+from .models import OutboxEmail, User, Verification
+from .outbox import OutboxWorker, claim_emails, enqueue_email
+from .utils import purge_expired_verifications
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("mail server is down")
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        if not getattr(self, "is_open", False):
+            CountingBackend.opened += 1
+            self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+
+@mock.patch("customauth.utils.VERIFICATION_PATH", "https://example.com/verify/")
+class OutboxTests(TestCase):
+    """the tests run against the locmem email backend the test runner sets up."""
+
+    def setUp(self):
+        cache.clear()
+
+    def drain(self, **kwargs) -> int:
+        worker = OutboxWorker(**kwargs)
+        try:
+            return worker.drain()
+        finally:
+            worker.close()
+
+    def test_magic_link_is_queued_not_sent(self):
+        response = self.client.post(
+            reverse("customauth:auth_magic_login"), {"email": "user@example.com"}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.to, ["user@example.com"])
+        self.assertIn("user@example.com", email.body)
+        self.assertIn("user@example.com", email.html_body)
+
+    def test_worker_sends_queued_magic_link(self):
+        user = User.objects.create(username="user", email="user@example.com")
+        self.client.post(reverse("customauth:auth_magic_login"), {"email": user.email})
+
+        self.assertEqual(self.drain(threads=2), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, [user.email])
+        self.assertEqual(message.alternatives[0][1], "text/html")
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(self.drain(), 0)
+
+    @override_settings(EMAIL_BACKEND="customauth.tests.CountingBackend")
+    def test_connections_are_reused(self):
+        CountingBackend.opened = 0
+        for index in range(20):
+            enqueue_email("subject", "body", [f"user{index}@example.com"])
+
+        self.assertEqual(self.drain(threads=2, batch_size=5), 20)
+
+        self.assertEqual(CountingBackend.opened, 2)
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+    def test_claim_is_atomic(self):
+        ids = [
+            enqueue_email("subject", "body", ["user@example.com"]).pk for _ in range(3)
+        ]
+
+        # both workers found the same emails due before either claimed them.
+        with mock.patch("customauth.outbox._due_email_ids", return_value=ids):
+            first = claim_emails(10)
+            second = claim_emails(10)
+
+        self.assertEqual([email.pk for email in first], ids)
+        self.assertEqual(second, [])
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list("attempts", "claim_token")),
+            {(1, first[0].claim_token)},
+        )
+        # the lease keeps them from being claimed again.
+        self.assertEqual(claim_emails(10), [])
+
+    @override_settings(EMAIL_BACKEND="customauth.tests.FailingBackend")
+    def test_failed_email_is_retried_then_given_up(self):
+        email = enqueue_email("subject", "body", ["user@example.com"])
+
+        self.assertEqual(self.drain(), 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("mail server is down", email.last_error)
+        self.assertGreater(email.available_at, timezone.now())
+        # not due until the retry delay passes.
+        self.assertEqual(self.drain(), 0)
+
+        for _ in range(OUTBOX_MAX_ATTEMPTS - 1):
+            OutboxEmail.objects.update(available_at=timezone.now())
+            self.drain()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertEqual(email.attempts, OUTBOX_MAX_ATTEMPTS)
+
+
+@mock.patch("customauth.utils.VERIFICATION_PATH", "https://example.com/verify/")
+class VerificationPurgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="user", email="user@example.com")
+
+    def create_codes(self, count: int, age) -> None:
+        ids = [Verification.objects.create(user=self.user).pk for _ in range(count)]
+        Verification.objects.filter(pk__in=ids).update(expire_at=timezone.now() - age)
+
+    def test_purge_in_batches(self):
+        self.create_codes(5, VERIFICATION_RETENTION * 2)
+        # expired, but still within the retention.
+        self.create_codes(1, VERIFICATION_RETENTION / 2)
+        Verification.objects.create(user=self.user)
+
+        self.assertEqual(purge_expired_verifications(batch_size=2, max_batches=2), 4)
+        self.assertEqual(purge_expired_verifications(batch_size=2), 1)
+        self.assertEqual(Verification.objects.count(), 2)
+
+    def test_magic_link_request_purges_once_per_interval(self):
+        self.create_codes(3, VERIFICATION_RETENTION + AUTH_CODE_EXPIRES_IN)
+        url = reverse("customauth:auth_magic_login")
+
+        self.client.post(url, {"email": self.user.email})
+        self.assertEqual(Verification.objects.count(), 1)
+
+        self.create_codes(1, VERIFICATION_RETENTION * 2)
+        self.client.post(url, {"email": "other@example.com"})
+        # the stale code waits for the next interval.
+        self.assertEqual(Verification.objects.count(), 3)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create(username="user", email="user@example.com")
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.url = reverse("customauth:user-list")
+        self.detail_url = reverse("customauth:user-detail", args=[self.user.pk])
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, headers=self.headers)
+        return response, len(queries)
+
+    def test_user_lookup_is_cached(self):
+        response, uncached = self.get()
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(3):
+            response, cached = self.get()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(cached, uncached - 1)
+
+        # the shared cache answers once the local entry is gone.
+        local_cache.clear()
+        self.assertEqual(self.get()[1], uncached - 1)
+
+    def test_update_invalidates(self):
+        self.assertEqual(self.get()[0].data["preferred_language"], "en")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                self.detail_url,
+                {
+                    "username": "user",
+                    "email": "user@example.com",
+                    "preferred_language": "fa",
+                },
+                content_type="application/json",
+                headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+
+        response, queries = self.get()
+        self.assertEqual(response.data["preferred_language"], "fa")
+        self.assertEqual(self.get()[1], queries - 1)
+
+    def test_deactivation_invalidates(self):
+        self.assertEqual(self.get()[0].status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_request_changes_do_not_leak(self):
+        self.get()
+        response = self.client.get(self.url, headers=self.headers)
+        response.wsgi_request.user.preferred_language = "de"
+        self.assertEqual(self.get()[0].data["preferred_language"], "en")
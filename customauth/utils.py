@@ -1,19 +1,65 @@
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import get_template
+from django.core.cache import cache
 from django.utils import timezone
 from rest_framework import status
 
 from api.responses import ERROR_MESSAGES, RESPONSE_MESSAGES
-from config.settings import (APP_NAME, AUTH_CODE_EXPIRES_IN, EMAIL_HOST_USER,
-                             EMAIL_HTML_TEMPLATE_NAME,
-                             EMAIL_PLAINTEXT_TEMPLATE_NAME, VERIFICATION_PATH)
+from config.settings import (
+    APP_NAME,
+    AUTH_CODE_EXPIRES_IN,
+    EMAIL_HOST_USER,
+    EMAIL_HTML_TEMPLATE_NAME,
+    EMAIL_PLAINTEXT_TEMPLATE_NAME,
+    VERIFICATION_PATH,
+    VERIFICATION_PURGE_BATCH_SIZE,
+    VERIFICATION_PURGE_INTERVAL,
+    VERIFICATION_RETENTION,
+)
 
 from .models import Verification
+from .outbox import enqueue_email, render_email
+
+
+def purge_expired_verifications(
+    batch_size: int = VERIFICATION_PURGE_BATCH_SIZE, max_batches: int | None = None
+) -> int:
+    """
+    Deletes the codes that expired more than ``VERIFICATION_RETENTION`` ago. every batch of ``batch_size`` rows
+    is deleted in a statement of its own, so the write lock, which covers the whole database on SQLite, is never
+    held for long.
+
+    Args:
+        batch_size (int): Rows deleted per statement.
+        max_batches (int | None): Stop after this many batches, None deletes everything expired.
+
+    Returns:
+        int: The number of deleted codes.
+    """
+    cutoff = timezone.now() - VERIFICATION_RETENTION
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(
+            Verification.objects.filter(expire_at__lt=cutoff).values_list(
+                "pk", flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            break
+        count, _ = Verification.objects.filter(pk__in=ids).delete()
+        deleted += count
+        batches += 1
+    return deleted
+
+
+def purge_expired_verifications_lazily() -> None:
+    """deletes one batch of expired codes, at most once every ``VERIFICATION_PURGE_INTERVAL`` per process."""
+    if cache.add(
+        "verification_purge", True, VERIFICATION_PURGE_INTERVAL.total_seconds()
+    ):
+        purge_expired_verifications(max_batches=1)
 
 
 def send_magic_link_email(user):
-    plaintext = get_template(EMAIL_PLAINTEXT_TEMPLATE_NAME)
-    html = get_template(EMAIL_HTML_TEMPLATE_NAME)
+    """queues the magic link email of the user, it is sent by the outbox worker."""
     subject = f"Verify its you in '{APP_NAME}'"
     if Verification.objects.filter(user=user, expire_at__gt=timezone.now()).exists():
         return status.HTTP_408_REQUEST_TIMEOUT, {
@@ -21,17 +67,19 @@ def send_magic_link_email(user):
         }
 
     code = Verification.objects.create(user=user).code
+    purge_expired_verifications_lazily()
     context = {
         "username": user.email,
         "url": VERIFICATION_PATH + code,
         "expire_in_minutes": AUTH_CODE_EXPIRES_IN.total_seconds() / 60,
     }
 
-    text_context = plaintext.render(context)
-    html_context = html.render(context)
-    msg = EmailMultiAlternatives(
-        subject=subject, body=text_context, from_email=EMAIL_HOST_USER, to=[user.email]
+    language = user.preferred_language
+    enqueue_email(
+        subject=subject,
+        body=render_email(EMAIL_PLAINTEXT_TEMPLATE_NAME, context, language),
+        html_body=render_email(EMAIL_HTML_TEMPLATE_NAME, context, language),
+        from_email=EMAIL_HOST_USER,
+        to=[user.email],
     )
-    msg.attach_alternative(html_context, "text/html")
-    msg.send(fail_silently=False)
     return status.HTTP_200_OK, {"detail": RESPONSE_MESSAGES["magic_link_sent"]}